@@ -4,21 +4,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, select
 from typing import Optional, List
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.models.database import User, Prediction, Feedback
-from app.api.auth import require_admin
+from app.api.auth import require_admin, hash_password
 from app.schemas.prediction import PredictionListResponse
 from app.services.export_service import export_service
+from app.services.class_index import class_index
+from app.services.partition_service import partition_service
+from app.services.feedback_search import feedback_search
+from app.services.report_cache import report_cache
+from app.services.password_hasher import password_hasher
+from app.services.resource_manager import resource_manager
+from app.services.vector_store import vector_store
+from app.services.knowledge_ingest import knowledge_ingestor
+from app.services.answer_cache import answer_cache
+from app.services.llm_pool import llm_pool
+from app.core.redis_client import redis_client, StoreUnavailableError
+from app.core.rate_limit import rate_limiter
 import io
 import os
 
 router = APIRouter(prefix="/api/admin", tags=["管理端"])
 
 
+def parse_date_range(start_date: Optional[str], end_date: Optional[str]):
+    """解析日期筛选参数（归档分区按时间范围裁剪，需要 datetime）"""
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式错误，请使用 YYYY-MM-DD")
+    return start, end
+
+
 @router.get("/predictions", response_model=PredictionListResponse)
 def get_all_predictions(
     skip: int = Query(0, ge=0),
@@ -30,22 +53,24 @@ def get_all_predictions(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """获取所有识别记录（管理员）"""
-    query = db.query(Prediction)
+    """获取所有识别记录（管理员，时间范围涉及已归档月份时合并查询归档分区）"""
+    start, end = parse_date_range(start_date, end_date)
+    P = partition_service.prediction_source(start, end)
+    query = db.query(P)
 
     # 按用户筛选
     if user_id:
-        query = query.filter(Prediction.user_id == user_id)
+        query = query.filter(P.user_id == user_id)
 
-    # 按分类筛选
+    # 按分类筛选（先解析为类别ID，走 predicted_class_id 索引）
     if predicted_class:
-        query = query.filter(Prediction.predicted_class.like(f"%{predicted_class}%"))
+        query = query.filter(P.predicted_class_id.in_(class_index.search(predicted_class)))
 
     # 按日期筛选
-    if start_date:
-        query = query.filter(Prediction.created_at >= start_date)
-    if end_date:
-        query = query.filter(Prediction.created_at <= end_date)
+    if start:
+        query = query.filter(P.created_at >= start)
+    if end:
+        query = query.filter(P.created_at <= end)
 
     # 查询总数
     total = query.count()
@@ -53,7 +78,7 @@ def get_all_predictions(
     # 查询记录
     predictions = (
         query
-        .order_by(desc(Prediction.created_at))
+        .order_by(desc(P.created_at))
         .offset(skip)
         .limit(limit)
         .all()
@@ -161,6 +186,37 @@ def get_all_users(
     }
 
 
+@router.get("/online-users")
+async def get_online_users(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_admin)
+):
+    """获取在线用户列表（管理员）"""
+    total = await redis_client.get_online_users_count()
+    members = await redis_client.get_online_users_with_expiry(skip, limit)
+
+    usernames = {}
+    if members:
+        result = await db.execute(
+            select(User.id, User.username).where(User.id.in_([user_id for user_id, _ in members]))
+        )
+        usernames = dict(result.all())
+
+    return {
+        "total": total,
+        "items": [
+            {
+                "user_id": user_id,
+                "username": usernames.get(user_id),
+                "expires_at": datetime.fromtimestamp(expire_at)
+            }
+            for user_id, expire_at in members
+        ]
+    }
+
+
 @router.put("/users/{user_id}/status")
 def update_user_status(
     user_id: int,
@@ -220,10 +276,19 @@ def delete_user(
             os.remove(prediction.image_path)
         db.delete(prediction)
 
+    # 删除用户在归档分区中的识别记录
+    archived_images = partition_service.delete_user_rows(db, user_id)
+
     # 删除用户
     db.delete(user)
     db.commit()
 
+    if archived_images:
+        for image_path in archived_images:
+            if os.path.exists(image_path):
+                os.remove(image_path)
+        report_cache.invalidate("predictions", datetime.min)
+
     return {"message": "用户删除成功"}
 
 
@@ -233,14 +298,14 @@ class PasswordResetRequest(BaseModel):
 
 
 @router.put("/users/{user_id}/password")
-def reset_user_password(
+async def reset_user_password(
     user_id: int,
     password_data: PasswordResetRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(require_admin)
 ):
     """重置用户密码（管理员）"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
 
     if not user:
         raise HTTPException(
@@ -248,12 +313,10 @@ def reset_user_password(
             detail="用户不存在"
         )
 
-    # 加密新密码
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    user.password_hash = pwd_context.hash(password_data.new_password)
+    # 加密新密码（在密码哈希线程池中执行）
+    user.password_hash = await hash_password(password_data.new_password)
 
-    db.commit()
+    await db.commit()
 
     return {"message": "密码重置成功"}
 
@@ -263,6 +326,7 @@ def get_all_feedbacks(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     status_filter: Optional[str] = Query(None, alias="status"),
+    keyword: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -273,6 +337,10 @@ def get_all_feedbacks(
     if status_filter:
         query = query.filter(Feedback.status == status_filter)
 
+    # 按备注/正确类别关键词检索
+    if keyword:
+        query = query.filter(feedback_search.keyword_filter(keyword))
+
     # 查询总数
     total = query.count()
 
@@ -356,21 +424,24 @@ def export_all_predictions(
     导出所有识别记录为 CSV 文件（管理员）
     支持筛选条件
     """
+    start, end = parse_date_range(start_date, end_date)
     try:
-        query = db.query(Prediction)
+        # 时间范围涉及已归档月份时合并查询归档分区
+        P = partition_service.prediction_source(start, end)
+        query = db.query(P)
 
         # 应用筛选条件
         if user_id:
-            query = query.filter(Prediction.user_id == user_id)
+            query = query.filter(P.user_id == user_id)
         if predicted_class:
-            query = query.filter(Prediction.predicted_class.like(f"%{predicted_class}%"))
-        if start_date:
-            query = query.filter(Prediction.created_at >= start_date)
-        if end_date:
-            query = query.filter(Prediction.created_at <= end_date)
+            query = query.filter(P.predicted_class_id.in_(class_index.search(predicted_class)))
+        if start:
+            query = query.filter(P.created_at >= start)
+        if end:
+            query = query.filter(P.created_at <= end)
 
         # 查询所有记录
-        predictions = query.order_by(desc(Prediction.created_at)).all()
+        predictions = query.order_by(desc(P.created_at)).all()
 
         # 准备导出数据
         export_data = []
@@ -425,3 +496,59 @@ def export_all_predictions(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"导出失败: {str(e)}"
         )
+
+
+@router.get("/metrics")
+async def get_metrics(current_user: User = Depends(require_admin)):
+    """获取服务运行指标（管理员）"""
+    return {
+        "report_cache": report_cache.stats(),
+        "store": redis_client.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "resources": resource_manager.stats(),
+        "embedding_cache": vector_store.query_cache.stats(),
+        "knowledge_base": knowledge_ingestor.stats(),
+        "answer_cache": await answer_cache.stats(),
+        "llm": llm_pool.stats()
+    }
+
+
+@router.get("/answer-cache")
+async def get_answer_cache(
+    keyword: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(require_admin)
+):
+    """查看 AI 聊天答案缓存（管理员，所有服务进程共享）"""
+    try:
+        items = await answer_cache.list_entries(keyword=keyword, limit=limit)
+    except StoreUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="缓存存储暂不可用，请稍后重试"
+        )
+    return {
+        "stats": await answer_cache.stats(),
+        "items": items
+    }
+
+
+@router.delete("/answer-cache")
+async def purge_answer_cache(
+    entry_id: Optional[int] = None,
+    keyword: Optional[str] = None,
+    all: bool = False,
+    current_user: User = Depends(require_admin)
+):
+    """清除 AI 聊天答案缓存（管理员），可按条目ID或问题关键字清除，清空全部需指定 all=true"""
+    try:
+        removed = await answer_cache.purge(entry_id=entry_id, keyword=keyword, all_entries=all)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except StoreUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="缓存存储暂不可用，请稍后重试"
+        )
+    return {"message": f"已清除 {removed} 条缓存", "removed": removed}
@@ -3,11 +3,14 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security.http import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import Optional
-from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token, decode_access_token
-from app.core.redis_client import redis_client
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Tuple
+from app.core.database import get_async_db
+from app.core.security import create_access_token
+from app.core.redis_client import redis_client, StoreUnavailableError
+from app.services.user_cache import user_cache
+from app.services.password_hasher import password_hasher, PasswordHasherBusyError
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token, PasswordUpdate
 from app.models.database import User
 from datetime import timedelta
@@ -17,40 +20,49 @@ router = APIRouter(prefix="/api/auth", tags=["认证"])
 security = HTTPBearer()
 
 
+async def load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """按ID获取用户（优先读取进程内缓存）"""
+    user = user_cache.get(user_id)
+    if user is None:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        if user is not None:
+            # 脱离会话后缓存，供后续请求只读使用
+            db.expunge(user)
+            user_cache.set(user)
+    return user
+
+
 # 依赖项：获取当前用户
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """获取当前登录用户"""
     token = credentials.credentials
 
-    # 1. 先检查 Redis 中 token 是否有效
-    if not redis_client.is_token_valid(token):
+    # 1. 校验 token、获取 user_id 并延长过期时间（活跃用户自动续期），一次 Redis 往返
+    try:
+        user_id = await redis_client.validate_token(token)
+    except StoreUnavailableError:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token已过期或无效，请重新登录"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="认证服务暂不可用，请稍后重试"
         )
-
-    # 2. 从 Redis 获取 user_id
-    user_id = redis_client.get_user_id_by_token(token)
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证"
+            detail="Token已过期或无效，请重新登录"
         )
 
-    # 3. 从数据库获取用户信息
-    user = db.query(User).filter(User.id == user_id).first()
+    # 2. 获取用户信息
+    user = await load_user(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户不存在"
         )
 
-    # 4. 延长 token 过期时间（活跃用户自动续期）
-    redis_client.extend_token_expire(token)
-
     return user
 
 
@@ -74,9 +86,9 @@ def require_admin(current_user: User = Depends(get_current_active_user)) -> User
     return current_user
 
 
-def get_current_user_optional(
+async def get_current_user_optional(
     credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[User]:
     """获取当前用户（可选，不强制登录）"""
     if credentials is None:
@@ -85,33 +97,46 @@ def get_current_user_optional(
     try:
         token = credentials.credentials
 
-        # 检查 Redis 中 token 是否有效
-        if not redis_client.is_token_valid(token):
-            return None
-
-        # 从 Redis 获取 user_id
-        user_id = redis_client.get_user_id_by_token(token)
+        # 校验 token 并延长过期时间
+        user_id = await redis_client.validate_token(token)
         if user_id is None:
             return None
 
-        # 从数据库获取用户信息
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
-            return None
-
-        # 延长 token 过期时间
-        redis_client.extend_token_expire(token)
-
-        return user
+        # 获取用户信息
+        return await load_user(db, user_id)
     except Exception:
         return None
 
 
+async def hash_password(password: str) -> str:
+    """在密码哈希线程池中生成哈希，排队已满时返回 503"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "1"}
+        )
+
+
+async def check_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """在密码哈希线程池中验证密码，返回 (是否匹配, 升级后的新哈希或 None)，排队已满时返回 503"""
+    try:
+        return await password_hasher.verify_and_update(password, password_hash)
+    except PasswordHasherBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "1"}
+        )
+
+
 @router.post("/register", response_model=UserResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """用户注册"""
     # 检查用户名是否已存在
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -120,7 +145,7 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
     # 检查邮箱是否已存在
     if user_data.email:
-        existing_email = db.query(User).filter(User.email == user_data.email).first()
+        existing_email = await db.scalar(select(User).where(User.email == user_data.email))
         if existing_email:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -131,22 +156,22 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await hash_password(user_data.password),
         role="user"
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """用户登录"""
     # 查找用户
-    user = db.query(User).filter(User.username == user_data.username).first()
+    user = await db.scalar(select(User).where(User.username == user_data.username))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -154,7 +179,8 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
         )
 
     # 验证密码
-    if not verify_password(user_data.password, user.password_hash):
+    verified, new_hash = await check_password(user_data.password, user.password_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误"
@@ -167,17 +193,28 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="账号已被禁用"
         )
 
+    # 哈希参数已调整，用本次验证通过的明文重新生成哈希
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+
     # 生成JWT token
     access_token = create_access_token(
         data={"sub": str(user.id), "username": user.username, "role": user.role}
     )
 
     # 将 token 存储到 Redis
-    redis_client.set_token(
-        token=access_token,
-        user_id=user.id,
-        expire_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
-    )
+    try:
+        await redis_client.set_token(
+            token=access_token,
+            user_id=user.id,
+            expire_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        )
+    except StoreUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="认证服务暂不可用，请稍后重试"
+        )
 
     return {
         "access_token": access_token,
@@ -187,12 +224,18 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/logout")
-def logout(current_user: User = Depends(get_current_user), credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def logout(current_user: User = Depends(get_current_user), credentials: HTTPAuthorizationCredentials = Depends(security)):
     """用户登出"""
     token = credentials.credentials
 
     # 从 Redis 删除 token
-    redis_client.delete_token(token, current_user.id)
+    try:
+        await redis_client.delete_token(token, current_user.id)
+    except StoreUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="认证服务暂不可用，请稍后重试"
+        )
 
     return {"message": "登出成功"}
 
@@ -204,21 +247,23 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
 
 
 @router.put("/password")
-def update_password(
+async def update_password(
     password_data: PasswordUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """修改密码"""
     # 验证旧密码
-    if not verify_password(password_data.old_password, current_user.password_hash):
+    verified, _ = await check_password(password_data.old_password, current_user.password_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="旧密码错误"
         )
 
-    # 更新密码
-    current_user.password_hash = get_password_hash(password_data.new_password)
-    db.commit()
+    # 更新密码（current_user 可能来自缓存，需在当前会话中重新加载后再修改）
+    user = await db.get(User, current_user.id)
+    user.password_hash = await hash_password(password_data.new_password)
+    await db.commit()
 
     return {"message": "密码修改成功"}
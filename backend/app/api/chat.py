@@ -1,46 +1,107 @@
 """
 AI聊天API路由
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import json
+import time
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
 from app.schemas.chat import (
     ChatRequest,
+    ChatStreamRequest,
     ChatResponse,
     ConversationCreate,
     ConversationUpdate,
-    ConversationResponse
+    ConversationResponse,
+    MessagesAppend,
+    MessagePage
 )
 from app.services.ai_service import ai_service
+from app.services.llm_pool import LLMPoolError
 from app.core.logger import logger
-from app.core.database import get_db
-from app.models.database import ChatConversation, User
-from app.api.auth import get_current_user
+from app.core.database import get_async_db, AsyncSessionLocal
+from app.models.database import ChatConversation, ChatMessage, User
+from app.api.auth import get_current_user, get_current_user_optional
 
 router = APIRouter(prefix="/api/chat", tags=["AI聊天"])
 
+# 等待回复期间检查客户端是否断开的间隔秒数
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# 对话列表中最后一条消息预览的长度
+PREVIEW_LENGTH = 100
+
+
+class ClientDisconnectedError(Exception):
+    """客户端在回复生成前断开"""
+    pass
+
+
+async def run_until_disconnected(http_request: Request, coro):
+    """
+    执行协程，客户端断开时取消，不再为无人接收的回复占用连接和排队名额
+
+    Raises:
+        ClientDisconnectedError: 客户端已断开
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ClientDisconnectedError()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """格式化为 Server-Timing 响应头（各阶段耗时，毫秒）"""
+    return ", ".join(f"{stage};dur={duration:.1f}" for stage, duration in timings.items())
+
 
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
     """
     AI聊天接口
 
-    支持多轮对话，前端需要传递完整的对话历史
+    支持多轮对话，前端需要传递完整的对话历史；登录用户传入已保存的 conversation_id 时，较早的对话折叠为摘要。
+    各阶段耗时通过 Server-Timing 响应头返回
     """
+    timings: Dict[str, float] = {}
     try:
         # 将Pydantic模型转换为字典列表
         messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
 
         logger.info(f"收到聊天请求，消息数量: {len(messages)}")
 
-        # 调用AI服务
-        reply = ai_service.chat(messages)
+        # 调用AI服务（客户端断开时取消）
+        user_id = current_user.id if current_user else None
+        reply = await run_until_disconnected(
+            http_request,
+            ai_service.chat(messages, timings, user_id=user_id, conversation_id=request.conversation_id)
+        )
+        response.headers["Server-Timing"] = server_timing(timings)
 
         return ChatResponse(
             reply=reply,
             success=True
         )
 
+    except ClientDisconnectedError:
+        logger.info("客户端已断开，取消聊天请求")
+        return ChatResponse(reply="", success=False, error="客户端已断开")
     except Exception as e:
         logger.error(f"聊天接口异常: {str(e)}", exc_info=True)
         return ChatResponse(
@@ -50,21 +111,180 @@ async def chat(request: ChatRequest):
         )
 
 
+def message_rows(conversation_id: int, messages: List[Dict[str, str]]) -> List[ChatMessage]:
+    """构建消息行（同一批消息时间相同，顺序以 id 为准）"""
+    now = datetime.now()
+    return [
+        ChatMessage(conversation_id=conversation_id, role=msg["role"], content=msg["content"], created_at=now)
+        for msg in messages
+    ]
+
+
+async def append_messages(db: AsyncSession, conversation: ChatConversation, messages: List[Dict[str, str]]):
+    """
+    追加消息（只插入新行，不改写已有消息），同时更新对话的消息数和最后一条消息预览
+
+    新建的对话先写入以获得ID；调用方负责提交
+    """
+    if conversation.id is None:
+        db.add(conversation)
+        await db.flush()
+    db.add_all(message_rows(conversation.id, messages))
+    # 以 SQL 表达式累加，并发追加时计数不丢失
+    conversation.message_count = ChatConversation.message_count + len(messages)
+    if messages:
+        conversation.last_message = messages[-1]["content"][:PREVIEW_LENGTH]
+    conversation.updated_at = datetime.now()
+
+
+async def replace_messages(db: AsyncSession, conversation: ChatConversation, messages: List[Dict[str, str]]):
+    """替换对话的全部消息（清空或改写对话时使用），历史摘要随之作废；调用方负责提交"""
+    await db.execute(delete(ChatMessage).where(ChatMessage.conversation_id == conversation.id))
+    db.add_all(message_rows(conversation.id, messages))
+    conversation.message_count = len(messages)
+    conversation.last_message = messages[-1]["content"][:PREVIEW_LENGTH] if messages else None
+    conversation.summary = None
+    conversation.summary_message_count = 0
+
+
+async def get_user_conversation(db: AsyncSession, conversation_id: int, user: User) -> ChatConversation:
+    """读取当前用户的对话，不存在时返回 404"""
+    conversation = (await db.execute(
+        select(ChatConversation).where(
+            ChatConversation.id == conversation_id,
+            ChatConversation.user_id == user.id
+        )
+    )).scalar_one_or_none()
+    if not conversation:
+        raise HTTPException(status_code=404, detail="对话不存在")
+    return conversation
+
+
+def sse_event(data: Dict) -> str:
+    """格式化一条 SSE 事件"""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def save_transcript(
+    user: User,
+    conversation_id: Optional[int],
+    messages: List[Dict[str, str]],
+    reply: str
+) -> Optional[int]:
+    """
+    把流式对话保存到对话历史，返回对话ID（对话不存在时返回 None）
+
+    新对话保存完整记录；已有对话只追加本次的用户消息和回复
+    """
+    reply_message = {"role": "assistant", "content": reply}
+    # 依赖注入的会话在响应开始发送前就已关闭，这里单独打开会话
+    async with AsyncSessionLocal() as db:
+        if conversation_id is None:
+            first_question = next((msg["content"] for msg in messages if msg["role"] == "user"), "新对话")
+            conversation = ChatConversation(user_id=user.id, title=first_question[:30], message_count=0)
+            await append_messages(db, conversation, messages + [reply_message])
+        else:
+            conversation = (await db.execute(
+                select(ChatConversation).where(
+                    ChatConversation.id == conversation_id,
+                    ChatConversation.user_id == user.id
+                )
+            )).scalar_one_or_none()
+            if conversation is None:
+                return None
+            new_messages = [msg for msg in messages[-1:] if msg["role"] == "user"]
+            await append_messages(db, conversation, new_messages + [reply_message])
+        await db.commit()
+        return conversation.id
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatStreamRequest,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    流式AI聊天接口（Server-Sent Events）
+
+    检索参考文档在响应开始前完成，之后逐段推送模型输出：
+    - {"type": "delta", "content": "..."}：新增的回复文本
+    - {"type": "done", "conversation_id": ..., "timings": {...}}：回复结束（persist 时附带保存到的对话ID，timings 为各阶段耗时）
+    - {"type": "error", "message": "..."}：生成失败
+    """
+    messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    logger.info(f"收到流式聊天请求，消息数量: {len(messages)}")
+
+    if request.persist and current_user is None:
+        raise HTTPException(status_code=401, detail="保存对话需要登录")
+
+    try:
+        prepared = await ai_service.prepare(
+            messages,
+            user_id=current_user.id if current_user else None,
+            conversation_id=request.conversation_id
+        )
+    except Exception as e:
+        logger.error(f"流式聊天准备失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=503, detail="抱歉，服务暂时不可用，请稍后再试。")
+
+    async def event_stream():
+        parts = []
+        try:
+            async for delta in ai_service.stream(prepared):
+                parts.append(delta)
+                yield sse_event({"type": "delta", "content": delta})
+        except asyncio.CancelledError:
+            # 客户端断开：StreamingResponse 取消本生成器，执行器随之关闭上游连接
+            logger.info(f"客户端已断开，停止流式回复（已生成 {sum(len(part) for part in parts)} 字）")
+            raise
+        except LLMPoolError as e:
+            logger.warning(f"流式聊天未完成: {str(e)}")
+            yield sse_event({"type": "error", "message": f"抱歉，{str(e)}"})
+            return
+        except Exception as e:
+            logger.error(f"流式聊天异常: {str(e)}", exc_info=True)
+            yield sse_event({"type": "error", "message": "抱歉，服务暂时不可用，请稍后再试。"})
+            return
+
+        conversation_id = None
+        if request.persist:
+            started = time.perf_counter()
+            try:
+                conversation_id = await save_transcript(current_user, request.conversation_id, messages, "".join(parts))
+            except Exception as e:
+                logger.error(f"保存流式对话失败: {str(e)}", exc_info=True)
+            prepared.timings["persist"] = (time.perf_counter() - started) * 1000
+        timings = {stage: round(duration, 1) for stage, duration in prepared.timings.items()}
+        yield sse_event({"type": "done", "conversation_id": conversation_id, "timings": timings})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            # 响应头发送时只有响应开始前的阶段（检索、缓存查询、构建提示词）已完成，其余耗时在 done 事件中
+            "Server-Timing": server_timing(prepared.timings),
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭 Nginx 缓冲，保证逐段推送
+        }
+    )
+
+
 @router.get("/health")
 async def health_check():
     """
     检查AI服务是否可用
     """
-    from app.core.config import settings
-
-    if settings.DASHSCOPE_API_KEY:
+    provider = ai_service.provider.name
+    if ai_service.provider.configured:
         return {
             "status": "ok",
+            "provider": provider,
             "message": "AI聊天服务已配置"
         }
     else:
         return {
             "status": "unavailable",
+            "provider": provider,
             "message": "AI聊天服务未配置 API Key"
         }
 
@@ -73,16 +293,23 @@ async def health_check():
 
 @router.get("/conversations", response_model=List[ConversationResponse])
 async def get_conversations(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    获取当前用户的所有对话历史
+    获取当前用户的对话列表（只含标题、消息数和最后一条消息预览，消息通过 /messages 分页读取）
     """
     try:
-        conversations = db.query(ChatConversation).filter(
-            ChatConversation.user_id == current_user.id
-        ).order_by(ChatConversation.updated_at.desc()).all()
+        result = await db.execute(
+            select(ChatConversation)
+            .where(ChatConversation.user_id == current_user.id)
+            .order_by(ChatConversation.updated_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        conversations = result.scalars().all()
 
         return conversations
 
@@ -95,21 +322,13 @@ async def get_conversations(
 async def get_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取指定对话的详情
     """
     try:
-        conversation = db.query(ChatConversation).filter(
-            ChatConversation.id == conversation_id,
-            ChatConversation.user_id == current_user.id
-        ).first()
-
-        if not conversation:
-            raise HTTPException(status_code=404, detail="对话不存在")
-
-        return conversation
+        return await get_user_conversation(db, conversation_id, current_user)
 
     except HTTPException:
         raise
@@ -118,11 +337,39 @@ async def get_conversation(
         raise HTTPException(status_code=500, detail="获取对话详情失败")
 
 
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePage)
+async def get_conversation_messages(
+    conversation_id: int,
+    before_id: Optional[int] = Query(None, description="只返回ID小于该值的消息（加载更早的消息）"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    分页获取对话消息：默认返回最近的 limit 条，传入上一页第一条消息的ID继续向前翻页
+    """
+    try:
+        await get_user_conversation(db, conversation_id, current_user)
+
+        query = select(ChatMessage).where(ChatMessage.conversation_id == conversation_id)
+        if before_id is not None:
+            query = query.where(ChatMessage.id < before_id)
+        rows = (await db.execute(query.order_by(ChatMessage.id.desc()).limit(limit + 1))).scalars().all()
+
+        return MessagePage(messages=list(reversed(rows[:limit])), has_more=len(rows) > limit)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取对话消息失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="获取对话消息失败")
+
+
 @router.post("/conversations", response_model=ConversationResponse)
 async def create_conversation(
     conversation: ConversationCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     创建新对话
@@ -134,53 +381,76 @@ async def create_conversation(
         new_conversation = ChatConversation(
             user_id=current_user.id,
             title=conversation.title,
-            messages=messages_dict
+            message_count=0
         )
+        await append_messages(db, new_conversation, messages_dict)
 
-        db.add(new_conversation)
-        db.commit()
-        db.refresh(new_conversation)
+        await db.commit()
+        await db.refresh(new_conversation)
 
         logger.info(f"用户 {current_user.username} 创建了新对话: {new_conversation.id}")
 
         return new_conversation
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"创建对话失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="创建对话失败")
 
 
+@router.post("/conversations/{conversation_id}/messages", response_model=ConversationResponse)
+async def add_conversation_messages(
+    conversation_id: int,
+    payload: MessagesAppend,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    向对话追加消息（每轮对话只写入新增的消息）
+    """
+    try:
+        conversation = await get_user_conversation(db, conversation_id, current_user)
+
+        messages_dict = [{"role": msg.role, "content": msg.content} for msg in payload.messages]
+        await append_messages(db, conversation, messages_dict)
+
+        await db.commit()
+        await db.refresh(conversation)
+
+        return conversation
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"追加对话消息失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="追加对话消息失败")
+
+
 @router.put("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def update_conversation(
     conversation_id: int,
     conversation_update: ConversationUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    更新对话
+    更新对话（修改标题；传入 messages 时替换全部消息，用于清空或改写对话）
     """
     try:
-        conversation = db.query(ChatConversation).filter(
-            ChatConversation.id == conversation_id,
-            ChatConversation.user_id == current_user.id
-        ).first()
-
-        if not conversation:
-            raise HTTPException(status_code=404, detail="对话不存在")
+        conversation = await get_user_conversation(db, conversation_id, current_user)
 
         # 更新标题
         if conversation_update.title is not None:
             conversation.title = conversation_update.title
 
-        # 更新消息
+        # 替换消息
         if conversation_update.messages is not None:
             messages_dict = [{"role": msg.role, "content": msg.content} for msg in conversation_update.messages]
-            conversation.messages = messages_dict
+            await replace_messages(db, conversation, messages_dict)
 
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
+        await db.refresh(conversation)
 
         logger.info(f"用户 {current_user.username} 更新了对话: {conversation_id}")
 
@@ -189,7 +459,7 @@ async def update_conversation(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"更新对话失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="更新对话失败")
 
@@ -198,22 +468,18 @@ async def update_conversation(
 async def delete_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     删除对话
     """
     try:
-        conversation = db.query(ChatConversation).filter(
-            ChatConversation.id == conversation_id,
-            ChatConversation.user_id == current_user.id
-        ).first()
-
-        if not conversation:
-            raise HTTPException(status_code=404, detail="对话不存在")
+        conversation = await get_user_conversation(db, conversation_id, current_user)
 
-        db.delete(conversation)
-        db.commit()
+        # SQLite 默认不启用外键级联，显式删除消息
+        await db.execute(delete(ChatMessage).where(ChatMessage.conversation_id == conversation.id))
+        await db.delete(conversation)
+        await db.commit()
 
         logger.info(f"用户 {current_user.username} 删除了对话: {conversation_id}")
 
@@ -222,6 +488,6 @@ async def delete_conversation(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"删除对话失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="删除对话失败")
@@ -7,6 +7,7 @@ from sqlalchemy import func, desc
 from app.core.database import get_db
 from app.models.database import Prediction, Feedback
 from app.api.auth import require_admin
+from app.services.model_stats import model_stats_service
 from datetime import datetime, timedelta
 import os
 import shutil
@@ -227,11 +228,12 @@ def get_model_performance(
     current_config = get_current_model_config()
     current_model = current_config.get("model_file", "best_model.pth")
 
-    # 只统计当前模型的数据
-    total_predictions = db.query(Prediction).filter(Prediction.model_name == current_model).count()
-    avg_confidence = db.query(func.avg(Prediction.confidence)).filter(Prediction.model_name == current_model).scalar() or 0
-    high_confidence_count = db.query(Prediction).filter(Prediction.model_name == current_model, Prediction.confidence >= 80).count()
-    low_confidence_count = db.query(Prediction).filter(Prediction.model_name == current_model, Prediction.confidence < 60).count()
+    # 只统计当前模型的数据（读取按模型物化的汇总统计）
+    stats = model_stats_service.get_stats(db).get(current_model) or model_stats_service.combine([])
+    total_predictions = stats["total"]
+    avg_confidence = stats["confidence_sum"] / total_predictions if total_predictions > 0 else 0
+    high_confidence_count = stats["high_count"]
+    low_confidence_count = stats["low_count"]
 
     category_distribution = db.query(
         Prediction.predicted_class,
@@ -303,18 +305,18 @@ def compare_models(
     admin_user = Depends(require_admin)
 ):
     """对比所有模型的性能"""
-    # 获取所有使用过的模型名称
-    model_names = db.query(Prediction.model_name).distinct().all()
-    model_names = [name[0] for name in model_names if name[0]]
-    
+    # 一次读取所有模型的汇总统计（忽略未记录模型名称的历史数据）
+    all_stats = model_stats_service.get_stats(db)
+
     comparison_data = []
-    
-    for model_name in model_names:
-        # 统计每个模型的数据
-        total = db.query(Prediction).filter(Prediction.model_name == model_name).count()
-        avg_conf = db.query(func.avg(Prediction.confidence)).filter(Prediction.model_name == model_name).scalar() or 0
-        high_conf = db.query(Prediction).filter(Prediction.model_name == model_name, Prediction.confidence >= 80).count()
-        
+
+    for model_name, stats in all_stats.items():
+        if not model_name:
+            continue
+        total = stats["total"]
+        avg_conf = stats["confidence_sum"] / total if total > 0 else 0
+        high_conf = stats["high_count"]
+
         comparison_data.append({
             "model_name": model_name,
             "total_predictions": total,
@@ -322,7 +324,7 @@ def compare_models(
             "high_confidence_count": high_conf,
             "high_confidence_rate": round(high_conf / total * 100, 2) if total > 0 else 0
         })
-    
+
     # 按总识别次数排序
     comparison_data.sort(key=lambda x: x["total_predictions"], reverse=True)
     
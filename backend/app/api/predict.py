@@ -3,20 +3,26 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.schemas.prediction import PredictionResponse, PredictionListResponse
 from app.schemas.feedback import FeedbackCreate, FeedbackResponse
 from app.models.database import User, Prediction, Feedback
 from app.services.model_service import model_service
 from app.services.export_service import export_service
+from app.services.prediction_writer import prediction_writer
+from app.services.partition_service import partition_service
+from app.services.class_index import class_index
+from app.services.report_cache import report_cache
 from app.api.auth import get_current_user, get_current_user_optional
 from app.api.model import get_current_model_config
 import os
 import uuid
 import io
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.core.config import settings
 
 router = APIRouter(prefix="/api/predict", tags=["识别"])
@@ -49,7 +55,6 @@ def save_upload_file(upload_file: UploadFile) -> str:
 @router.post("/single", response_model=PredictionResponse)
 async def predict_single(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -61,27 +66,23 @@ async def predict_single(
         file_path = save_upload_file(file)
 
         # 模型推理
-        class_id, confidence, top3_results = model_service.predict(file_path)
+        class_id, confidence, top3_results = await model_service.apredict(file_path)
         class_name = model_service.get_class_name(class_id)
 
         # 获取当前使用的模型名称
         current_model_config = get_current_model_config()
         model_name = current_model_config.get("model_file", "best_model.pth")
 
-        # 创建识别记录
-        prediction = Prediction(
-            user_id=current_user.id if current_user else None,
-            image_path=file_path,
-            predicted_class=class_name,
-            predicted_class_id=class_id,
-            confidence=confidence,
-            top3_results=top3_results,
-            model_name=model_name
-        )
-
-        db.add(prediction)
-        db.commit()
-        db.refresh(prediction)
+        # 创建识别记录（由写入队列与其他请求合并为一个事务提交）
+        prediction = await prediction_writer.submit({
+            "user_id": current_user.id if current_user else None,
+            "image_path": file_path,
+            "predicted_class": class_name,
+            "predicted_class_id": class_id,
+            "confidence": confidence,
+            "top3_results": top3_results,
+            "model_name": model_name
+        })
 
         return prediction
 
@@ -117,7 +118,7 @@ async def predict_batch(
             file_path = save_upload_file(file)
 
             # 模型推理
-            class_id, confidence, top3_results = model_service.predict(file_path)
+            class_id, confidence, top3_results = await model_service.apredict(file_path)
             class_name = model_service.get_class_name(class_id)
 
             # 创建识别记录
@@ -145,43 +146,83 @@ async def predict_batch(
 
 
 @router.get("/history", response_model=PredictionListResponse)
-def get_prediction_history(
+async def get_prediction_history(
     skip: int = 0,
     limit: int = 20,
     predicted_class: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """获取用户识别历史（需要登录，支持筛选）"""
-    # 构建查询
-    query = db.query(Prediction).filter(Prediction.user_id == current_user.id)
-
-    # 添加分类筛选
-    if predicted_class:
-        query = query.filter(Prediction.predicted_class.like(f"%{predicted_class}%"))
-
-    # 添加日期范围筛选
-    if start_date:
-        query = query.filter(Prediction.created_at >= start_date)
-    if end_date:
+    # 解析日期范围（asyncpg 不做隐式类型转换，先解析为 datetime）
+    try:
+        start_datetime = datetime.fromisoformat(start_date) if start_date else None
         # 结束日期包含当天，所以加一天
-        from datetime import datetime, timedelta
-        end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1)
-        query = query.filter(Prediction.created_at < end_datetime)
+        end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式错误，请使用 YYYY-MM-DD")
+
+    class_ids = class_index.search(predicted_class) if predicted_class else None
+
+    def filters(P):
+        """构建查询条件（热表和归档分区共用）"""
+        conditions = [P.user_id == current_user.id]
+        # 添加分类筛选（先解析为类别ID，走 predicted_class_id 索引）
+        if class_ids is not None:
+            conditions.append(P.predicted_class_id.in_(class_ids))
+        # 添加日期范围筛选
+        if start_datetime:
+            conditions.append(P.created_at >= start_datetime)
+        if end_datetime:
+            conditions.append(P.created_at < end_datetime)
+        return conditions
+
+    # 时间范围涉及的已归档月份（用请求的会话加载分区信息）
+    partitions = partition_service.partitions_in_range(
+        await partition_service.aget_partitions(db), start_datetime, end_datetime
+    )
 
-    # 查询总数
-    total = query.count()
+    if not partitions:
+        total = await db.scalar(select(func.count()).select_from(Prediction).where(*filters(Prediction)))
+        result = await db.execute(
+            select(Prediction)
+            .where(*filters(Prediction))
+            .order_by(Prediction.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return {"total": total, "items": result.scalars().all()}
+
+    # 归档分区之后的记录都在热表中：当前页落在这部分时只查热表，不扫描归档分区
+    boundary = max(p.end_at for p in partitions)
+    hot_total, hot_recent = (await db.execute(
+        select(func.count(), func.count().filter(Prediction.created_at >= boundary))
+        .select_from(Prediction)
+        .where(*filters(Prediction))
+    )).one()
+    archived_total = await partition_service.count_archived(
+        db, partitions, (current_user.id, predicted_class, start_datetime, end_datetime), filters
+    )
+    total = hot_total + archived_total
+
+    if skip + limit <= hot_recent:
+        P = Prediction
+        conditions = filters(P) + [P.created_at >= boundary]
+    else:
+        P = partition_service.prediction_source(start_datetime, end_datetime, partitions)
+        conditions = filters(P)
 
     # 查询记录
-    predictions = (
-        query
-        .order_by(Prediction.created_at.desc())
+    result = await db.execute(
+        select(P)
+        .where(*conditions)
+        .order_by(P.created_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
     )
+    predictions = result.scalars().all()
 
     return {
         "total": total,
@@ -202,10 +243,21 @@ def delete_prediction(
     ).first()
 
     if not prediction:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="记录不存在"
-        )
+        # 历史记录中可见的已归档记录
+        archived = partition_service.find_archived(db, prediction_id, current_user.id)
+        if not archived:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="记录不存在"
+            )
+        table, row = archived
+        if os.path.exists(row["image_path"]):
+            os.remove(row["image_path"])
+        # 有反馈的记录不会被归档，无需处理反馈
+        partition_service.delete_archived(db, table, row)
+        db.commit()
+        report_cache.invalidate("predictions", row["created_at"])
+        return {"message": "删除成功"}
 
     # 删除图片文件
     if os.path.exists(prediction.image_path):
@@ -234,11 +286,18 @@ def submit_feedback(
         Prediction.user_id == current_user.id
     ).first()
 
+    restored_at = None
     if not prediction:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="识别记录不存在或无权访问"
-        )
+        archived = partition_service.find_archived(db, feedback_data.prediction_id, current_user.id)
+        if not archived:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="识别记录不存在或无权访问"
+            )
+        # 有反馈关联的记录需要在热表中，先把已归档的记录移回热表（保留原 id）
+        table, row = archived
+        partition_service.restore(db, table, row)
+        restored_at = row["created_at"]
 
     # 检查是否已经提交过反馈
     existing_feedback = db.query(Feedback).filter(
@@ -264,6 +323,8 @@ def submit_feedback(
     db.add(feedback)
     db.commit()
     db.refresh(feedback)
+    if restored_at is not None:
+        report_cache.invalidate("predictions", restored_at)
 
     return feedback
 
@@ -277,11 +338,12 @@ def export_predictions(
     导出用户识别历史为 CSV 文件（需要登录）
     """
     try:
-        # 查询用户的所有识别记录
+        # 查询用户的所有识别记录（含已归档的记录）
+        P = partition_service.prediction_source()
         predictions = (
-            db.query(Prediction)
-            .filter(Prediction.user_id == current_user.id)
-            .order_by(Prediction.created_at.desc())
+            db.query(P)
+            .filter(P.user_id == current_user.id)
+            .order_by(P.created_at.desc())
             .all()
         )
 
@@ -6,8 +6,10 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from app.core.database import get_db
-from app.models.database import User, Prediction, Feedback
+from app.models.database import User, Feedback
 from app.api.auth import require_admin
+from app.services.partition_service import partition_service
+from app.services.report_cache import report_cache
 from datetime import datetime, timedelta
 from typing import Optional
 import io
@@ -17,17 +19,25 @@ router = APIRouter(prefix="/api/reports", tags=["报表"])
 
 
 @router.get("/weekly")
-def get_weekly_report(
+async def get_weekly_report(
     db: Session = Depends(get_db),
     admin_user: User = Depends(require_admin)
 ):
     """生成周报数据"""
+    return await report_cache.get_or_compute(
+        "reports.weekly", {}, lambda: build_weekly_report(db), tables=("predictions", "users")
+    )
+
+
+def build_weekly_report(db: Session) -> dict:
+    """统计最近7天的周报数据"""
     # 获取最近7天的数据
     seven_days_ago = datetime.now() - timedelta(days=7)
+    P = partition_service.prediction_source(seven_days_ago)
 
     # 本周识别总数
-    total_predictions = db.query(Prediction).filter(
-        Prediction.created_at >= seven_days_ago
+    total_predictions = db.query(P).filter(
+        P.created_at >= seven_days_ago
     ).count()
 
     # 本周新增用户
@@ -37,32 +47,32 @@ def get_weekly_report(
 
     # 本周活跃用户
     active_users = db.query(
-        func.count(func.distinct(Prediction.user_id))
+        func.count(func.distinct(P.user_id))
     ).filter(
-        Prediction.created_at >= seven_days_ago,
-        Prediction.user_id.isnot(None)
+        P.created_at >= seven_days_ago,
+        P.user_id.isnot(None)
     ).scalar() or 0
 
     # 每日识别趋势
     daily_stats = db.query(
-        func.date(Prediction.created_at).label('date'),
-        func.count(Prediction.id).label('count')
+        func.date(P.created_at).label('date'),
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.created_at >= seven_days_ago
+        P.created_at >= seven_days_ago
     ).group_by(
-        func.date(Prediction.created_at)
+        func.date(P.created_at)
     ).all()
 
     # 分类统计
     category_stats = db.query(
-        Prediction.predicted_class,
-        func.count(Prediction.id).label('count')
+        P.predicted_class,
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.created_at >= seven_days_ago
+        P.created_at >= seven_days_ago
     ).group_by(
-        Prediction.predicted_class
+        P.predicted_class
     ).order_by(
-        func.count(Prediction.id).desc()
+        func.count(P.id).desc()
     ).limit(10).all()
 
     return {
@@ -86,17 +96,25 @@ def get_weekly_report(
 
 
 @router.get("/monthly")
-def get_monthly_report(
+async def get_monthly_report(
     db: Session = Depends(get_db),
     admin_user: User = Depends(require_admin)
 ):
     """生成月报数据"""
+    return await report_cache.get_or_compute(
+        "reports.monthly", {}, lambda: build_monthly_report(db), tables=("predictions", "users")
+    )
+
+
+def build_monthly_report(db: Session) -> dict:
+    """统计最近30天的月报数据"""
     # 获取最近30天的数据
     thirty_days_ago = datetime.now() - timedelta(days=30)
+    P = partition_service.prediction_source(thirty_days_ago)
 
     # 本月识别总数
-    total_predictions = db.query(Prediction).filter(
-        Prediction.created_at >= thirty_days_ago
+    total_predictions = db.query(P).filter(
+        P.created_at >= thirty_days_ago
     ).count()
 
     # 本月新增用户
@@ -106,32 +124,32 @@ def get_monthly_report(
 
     # 本月活跃用户
     active_users = db.query(
-        func.count(func.distinct(Prediction.user_id))
+        func.count(func.distinct(P.user_id))
     ).filter(
-        Prediction.created_at >= thirty_days_ago,
-        Prediction.user_id.isnot(None)
+        P.created_at >= thirty_days_ago,
+        P.user_id.isnot(None)
     ).scalar() or 0
 
     # 每日识别趋势
     daily_stats = db.query(
-        func.date(Prediction.created_at).label('date'),
-        func.count(Prediction.id).label('count')
+        func.date(P.created_at).label('date'),
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.created_at >= thirty_days_ago
+        P.created_at >= thirty_days_ago
     ).group_by(
-        func.date(Prediction.created_at)
+        func.date(P.created_at)
     ).all()
 
     # 分类统计
     category_stats = db.query(
-        Prediction.predicted_class,
-        func.count(Prediction.id).label('count')
+        P.predicted_class,
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.created_at >= thirty_days_ago
+        P.created_at >= thirty_days_ago
     ).group_by(
-        Prediction.predicted_class
+        P.predicted_class
     ).order_by(
-        func.count(Prediction.id).desc()
+        func.count(P.id).desc()
     ).all()
 
     return {
@@ -155,7 +173,7 @@ def get_monthly_report(
 
 
 @router.get("/custom")
-def get_custom_report(
+async def get_custom_report(
     start_date: str = Query(..., description="开始日期 YYYY-MM-DD"),
     end_date: str = Query(..., description="结束日期 YYYY-MM-DD"),
     db: Session = Depends(get_db),
@@ -168,10 +186,25 @@ def get_custom_report(
     except ValueError:
         raise HTTPException(status_code=400, detail="日期格式错误，请使用 YYYY-MM-DD")
 
+    # 参数规范化为日期，避免同一时间段因写法不同产生多份缓存
+    return await report_cache.get_or_compute(
+        "reports.custom",
+        {"start": start.date().isoformat(), "end": end.date().isoformat()},
+        lambda: build_custom_report(db, start, end),
+        tables=("predictions", "users"),
+        end=end
+    )
+
+
+def build_custom_report(db: Session, start: datetime, end: datetime) -> dict:
+    """统计 [start, end) 时间段的报表数据"""
+    # 时间段涉及已归档月份时，自动合并查询归档分区
+    P = partition_service.prediction_source(start, end)
+
     # 时间段识别总数
-    total_predictions = db.query(Prediction).filter(
-        Prediction.created_at >= start,
-        Prediction.created_at < end
+    total_predictions = db.query(P).filter(
+        P.created_at >= start,
+        P.created_at < end
     ).count()
 
     # 时间段新增用户
@@ -182,41 +215,41 @@ def get_custom_report(
 
     # 时间段活跃用户
     active_users = db.query(
-        func.count(func.distinct(Prediction.user_id))
+        func.count(func.distinct(P.user_id))
     ).filter(
-        Prediction.created_at >= start,
-        Prediction.created_at < end,
-        Prediction.user_id.isnot(None)
+        P.created_at >= start,
+        P.created_at < end,
+        P.user_id.isnot(None)
     ).scalar() or 0
 
     # 每日识别趋势
     daily_stats = db.query(
-        func.date(Prediction.created_at).label('date'),
-        func.count(Prediction.id).label('count')
+        func.date(P.created_at).label('date'),
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.created_at >= start,
-        Prediction.created_at < end
+        P.created_at >= start,
+        P.created_at < end
     ).group_by(
-        func.date(Prediction.created_at)
+        func.date(P.created_at)
     ).all()
 
     # 分类统计
     category_stats = db.query(
-        Prediction.predicted_class,
-        func.count(Prediction.id).label('count')
+        P.predicted_class,
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.created_at >= start,
-        Prediction.created_at < end
+        P.created_at >= start,
+        P.created_at < end
     ).group_by(
-        Prediction.predicted_class
+        P.predicted_class
     ).order_by(
-        func.count(Prediction.id).desc()
+        func.count(P.id).desc()
     ).all()
 
     return {
         "period": "custom",
-        "start_date": start_date,
-        "end_date": end_date,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": (end - timedelta(days=1)).strftime("%Y-%m-%d"),
         "summary": {
             "total_predictions": total_predictions,
             "new_users": new_users,
@@ -5,8 +5,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
 from app.core.database import get_db
-from app.models.database import User, Prediction, Feedback
+from app.models.database import User
 from app.api.auth import get_current_user, require_admin
+from app.services.report_cache import report_cache
+from app.services.partition_service import partition_service
+from app.services.model_stats import model_stats_service, CONFIDENCE_BUCKETS
 from typing import Dict, List
 from datetime import datetime, timedelta
 
@@ -18,39 +21,42 @@ def get_user_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Dict:
-    """获取用户个人统计数据"""
+    """获取用户个人统计数据（含已归档的识别记录）"""
+    P = partition_service.prediction_source()
+
     # 总识别次数
-    total_predictions = db.query(Prediction).filter(
-        Prediction.user_id == current_user.id
-    ).count()
+    total_predictions = db.query(func.count(P.id)).filter(
+        P.user_id == current_user.id
+    ).scalar()
 
     # 各类垃圾识别次数
     category_stats = db.query(
-        Prediction.predicted_class,
-        func.count(Prediction.id).label('count')
+        P.predicted_class,
+        func.count(P.id).label('count')
     ).filter(
-        Prediction.user_id == current_user.id
+        P.user_id == current_user.id
     ).group_by(
-        Prediction.predicted_class
+        P.predicted_class
     ).all()
 
     # 最近7天的识别趋势
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    R = partition_service.prediction_source(seven_days_ago)
     daily_stats = db.query(
-        func.date(Prediction.created_at).label('date'),
-        func.count(Prediction.id).label('count')
+        func.date(R.created_at).label('date'),
+        func.count(R.id).label('count')
     ).filter(
-        Prediction.user_id == current_user.id,
-        Prediction.created_at >= seven_days_ago
+        R.user_id == current_user.id,
+        R.created_at >= seven_days_ago
     ).group_by(
-        func.date(Prediction.created_at)
+        func.date(R.created_at)
     ).all()
 
     # 平均置信度
     avg_confidence = db.query(
-        func.avg(Prediction.confidence)
+        func.avg(P.confidence)
     ).filter(
-        Prediction.user_id == current_user.id
+        P.user_id == current_user.id
     ).scalar() or 0
 
     return {
@@ -68,45 +74,55 @@ def get_user_stats(
 
 
 @router.get("/global")
-def get_global_stats(
+async def get_global_stats(
     db: Session = Depends(get_db),
     admin_user: User = Depends(require_admin)
 ) -> Dict:
     """获取全局统计数据（管理员）"""
+    return await report_cache.get_or_compute(
+        "stats.global", {}, lambda: build_global_stats(db), tables=("predictions", "users")
+    )
+
+
+def build_global_stats(db: Session) -> Dict:
+    """统计全局数据（含已归档的识别记录）"""
+    P = partition_service.prediction_source()
+
     # 总用户数
     total_users = db.query(User).count()
 
     # 总识别次数
-    total_predictions = db.query(Prediction).count()
+    total_predictions = db.query(func.count(P.id)).scalar()
 
     # 各类垃圾识别次数
     category_stats = db.query(
-        Prediction.predicted_class,
-        func.count(Prediction.id).label('count')
+        P.predicted_class,
+        func.count(P.id).label('count')
     ).group_by(
-        Prediction.predicted_class
+        P.predicted_class
     ).order_by(
-        func.count(Prediction.id).desc()
+        func.count(P.id).desc()
     ).limit(10).all()
 
     # 最近30天的识别趋势
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    R = partition_service.prediction_source(thirty_days_ago)
     daily_stats = db.query(
-        func.date(Prediction.created_at).label('date'),
-        func.count(Prediction.id).label('count')
+        func.date(R.created_at).label('date'),
+        func.count(R.id).label('count')
     ).filter(
-        Prediction.created_at >= thirty_days_ago
+        R.created_at >= thirty_days_ago
     ).group_by(
-        func.date(Prediction.created_at)
+        func.date(R.created_at)
     ).all()
 
     # 活跃用户数（最近7天有识别记录）
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
     active_users = db.query(
-        func.count(func.distinct(Prediction.user_id))
+        func.count(func.distinct(R.user_id))
     ).filter(
-        Prediction.created_at >= seven_days_ago,
-        Prediction.user_id.isnot(None)
+        R.created_at >= seven_days_ago,
+        R.user_id.isnot(None)
     ).scalar() or 0
 
     return {
@@ -125,36 +141,44 @@ def get_global_stats(
 
 
 @router.get("/user-activity")
-def get_user_activity_stats(
+async def get_user_activity_stats(
     db: Session = Depends(get_db),
     admin_user: User = Depends(require_admin)
 ) -> Dict:
     """获取用户活跃度分析数据（管理员）"""
+    return await report_cache.get_or_compute(
+        "stats.user-activity", {}, lambda: build_user_activity_stats(db), tables=("predictions", "users")
+    )
+
+
+def build_user_activity_stats(db: Session) -> Dict:
+    """统计最近30天用户活跃度"""
     # 最近30天每日活跃用户数
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    P = partition_service.prediction_source(thirty_days_ago)
     daily_active_users = db.query(
-        func.date(Prediction.created_at).label('date'),
-        func.count(func.distinct(Prediction.user_id)).label('active_users')
+        func.date(P.created_at).label('date'),
+        func.count(func.distinct(P.user_id)).label('active_users')
     ).filter(
-        Prediction.created_at >= thirty_days_ago,
-        Prediction.user_id.isnot(None)
+        P.created_at >= thirty_days_ago,
+        P.user_id.isnot(None)
     ).group_by(
-        func.date(Prediction.created_at)
+        func.date(P.created_at)
     ).all()
 
     # 活跃用户排行榜（Top 10）
     top_active_users = db.query(
         User.id,
         User.username,
-        func.count(Prediction.id).label('prediction_count')
+        func.count(P.id).label('prediction_count')
     ).join(
-        Prediction, User.id == Prediction.user_id
+        P, User.id == P.user_id
     ).filter(
-        Prediction.created_at >= thirty_days_ago
+        P.created_at >= thirty_days_ago
     ).group_by(
         User.id, User.username
     ).order_by(
-        func.count(Prediction.id).desc()
+        func.count(P.id).desc()
     ).limit(10).all()
 
     return {
@@ -174,44 +198,36 @@ def get_user_activity_stats(
 
 
 @router.get("/accuracy")
-def get_accuracy_stats(
+async def get_accuracy_stats(
     db: Session = Depends(get_db),
     admin_user: User = Depends(require_admin)
 ) -> Dict:
     """获取识别准确率分析数据（基于置信度估算）"""
-    # 总识别次数
-    total_predictions = db.query(Prediction).count()
+    return await report_cache.get_or_compute(
+        "stats.accuracy", {}, lambda: build_accuracy_stats(db), tables=("predictions",)
+    )
+
 
-    # 按置信度区间统计
-    confidence_ranges = [
-        {"range": "90-100%", "min": 90, "max": 100},
-        {"range": "80-90%", "min": 80, "max": 90},
-        {"range": "70-80%", "min": 70, "max": 80},
-        {"range": "60-70%", "min": 60, "max": 70},
-        {"range": "0-60%", "min": 0, "max": 60}
-    ]
+def build_accuracy_stats(db: Session) -> Dict:
+    """按置信度统计识别准确率"""
+    # 所有模型的汇总统计之和（按置信度区间的计数已在汇总中一次算出）
+    stats = model_stats_service.combine(model_stats_service.get_stats(db).values())
+    total_predictions = stats["total"]
 
     confidence_distribution = []
-    for range_info in confidence_ranges:
-        count = db.query(Prediction).filter(
-            Prediction.confidence >= range_info["min"],
-            Prediction.confidence < range_info["max"]
-        ).count()
+    for range_label, field, _, _ in CONFIDENCE_BUCKETS:
+        count = stats[field]
         confidence_distribution.append({
-            "range": range_info["range"],
+            "range": range_label,
             "count": count,
             "percentage": round(count / total_predictions * 100, 2) if total_predictions > 0 else 0
         })
 
     # 高置信度识别数量（>=80%）
-    high_confidence_count = db.query(Prediction).filter(
-        Prediction.confidence >= 80
-    ).count()
+    high_confidence_count = stats["high_count"]
 
     # 平均置信度
-    avg_confidence = db.query(
-        func.avg(Prediction.confidence)
-    ).scalar() or 0
+    avg_confidence = stats["confidence_sum"] / total_predictions if total_predictions > 0 else 0
 
     # 预估准确率（基于置信度的经验公式）
     # 高置信度(>=80%)的识别通常准确率较高
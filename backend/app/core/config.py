@@ -15,17 +15,54 @@ class Settings(BaseSettings):
 
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./trash_classify.db"
+    DB_ENGINE_PROFILE: str = "production"  # production: 启用下方调优参数; default: 使用 SQLAlchemy 默认设置
+    # SQLite 连接参数（每个连接建立时通过 PRAGMA 设置）
+    DB_SQLITE_JOURNAL_MODE: str = "WAL"  # WAL 模式下读写互不阻塞
+    DB_SQLITE_SYNCHRONOUS: str = "NORMAL"
+    DB_SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 256MB
+    DB_SQLITE_CACHE_SIZE: int = -64000  # 负数表示 KB，即 64MB
+    DB_SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # 连接池配置（PostgreSQL 等服务端数据库）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800  # 秒
+    # 识别记录批量写入（write-behind）配置
+    PREDICTION_WRITE_BATCH_SIZE: int = 100  # 单个事务最多插入的记录数
+    PREDICTION_WRITE_INTERVAL_MS: int = 20  # 攒批最长等待时间
+    PREDICTION_WRITE_MAX_PENDING: int = 1000  # 缓冲队列上限
+    # 识别记录归档配置
+    PREDICTION_HOT_MONTHS: int = 6  # predictions 表保留的月数（含当月），更早的整月数据迁移到月分区
+    PREDICTION_ARCHIVE_DIR: str = "./archive"  # 压缩冷备份文件目录
 
     # Redis配置
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: Optional[str] = None
+    REDIS_BACKEND: str = "redis"  # redis / memory（进程内存储，仅适用于单进程部署和测试）
+    REDIS_MAX_CONNECTIONS: int = 50  # 连接池上限
+    REDIS_SOCKET_TIMEOUT: float = 1.0  # 单次命令超时秒数
+    REDIS_CONNECT_TIMEOUT: float = 1.0  # 建立连接超时秒数
+    REDIS_RETRY_ATTEMPTS: int = 2  # 连接错误/超时的重试次数
+    REDIS_BREAKER_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    REDIS_BREAKER_COOLDOWN: float = 10  # 熔断持续秒数
+
+    # 报表缓存配置
+    REPORT_CACHE_OPEN_TTL: int = 60  # 包含当天的统计窗口缓存秒数
+    REPORT_CACHE_CLOSED_TTL: int = 24 * 3600  # 已结束历史时间段的缓存秒数
+    REPORT_CACHE_MAX_ENTRIES: int = 256
+    REPORT_CACHE_REDIS: bool = False  # 多进程部署时启用 Redis 二级缓存
 
     # JWT配置
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天
+    TOKEN_REFRESH_THRESHOLD: float = 0.5  # 剩余有效期低于该比例时才滑动续期
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # bcrypt 轮数，调整后旧哈希在用户登录时自动升级
+    PASSWORD_HASH_WORKERS: int = 2  # 密码哈希线程数
+    PASSWORD_HASH_MAX_PENDING: int = 32  # 密码哈希排队上限，超出时返回 503
+    USER_CACHE_TTL: int = 30  # 认证用户信息的进程内缓存秒数，0 表示禁用
 
     # 文件上传配置
     UPLOAD_DIR: str = "./uploads"
@@ -37,15 +74,75 @@ class Settings(BaseSettings):
     NUM_CLASSES: int = 265
     IMG_SIZE: int = 224
 
+    # 模型资源管理：各模型首次使用时加载，空闲超时后卸载（0 表示常驻）
+    RESOURCE_MEMORY_BUDGET_MB: int = 0  # 每个进程的内存预算，超出时先卸载最久未使用的模型，0 表示不限制
+    CLASSIFIER_IDLE_TIMEOUT: int = 0  # 垃圾分类模型空闲卸载秒数
+    EMBEDDER_IDLE_TIMEOUT: int = 1800  # RAG 嵌入模型空闲卸载秒数
+
+    # RAG 查询向量缓存
+    EMBEDDING_CACHE_SIZE: int = 1024  # 进程内缓存的查询向量数，0 表示禁用
+    EMBEDDING_CACHE_REDIS: bool = False  # 启用 Redis 二级缓存（float16 压缩存储，多进程共享）
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600  # Redis 中查询向量的保存秒数
+
+    # RAG 向量库后端：chroma（ChromaDB）或 numpy（内存映射矩阵，适合几万条以内的知识库）
+    VECTOR_STORE_BACKEND: str = "chroma"
+    VECTOR_INDEX_DTYPE: str = "float16"  # numpy 后端的向量存储精度（float16 / float32）
+    VECTOR_INDEX_IVF_THRESHOLD: int = 20000  # numpy 后端文档数达到该值后启用 IVF 分区检索，0 表示始终精确检索
+    VECTOR_INDEX_IVF_NPROBE: int = 8  # IVF 检索时扫描的分区数
+
+    # AI 聊天语义答案缓存（仅单轮提问）：最多条目数（0 表示禁用）、有效秒数、命中所需的最低余弦相似度
+    ANSWER_CACHE_SIZE: int = 500
+    ANSWER_CACHE_TTL: int = 24 * 3600
+    ANSWER_CACHE_THRESHOLD: float = 0.92
+
+    # AI 聊天上下文预算（token 数为估算值）：消息总预算、参考文档预算、原样保留的最近对话轮数、历史摘要的最大长度
+    CHAT_CONTEXT_MAX_TOKENS: int = 3000
+    CHAT_CONTEXT_DOC_TOKENS: int = 1200
+    CHAT_HISTORY_TURNS: int = 6
+    CHAT_SUMMARY_MAX_TOKENS: int = 300
+
+    # 启动时在后台检查知识库与文档是否一致，不一致时增量重建（一致时不加载嵌入模型）
+    RAG_STARTUP_CHECK: bool = True
+    # 是否把旧系统遗留的 knowledge 表（见 scripts/migrate_knowledge.py，需有 id、title、content 列）中已发布的文章导入知识库
+    RAG_INCLUDE_KNOWLEDGE_TABLE: bool = False
+
+    # RAG 知识库导入：分批编码和写入，内存占用不随语料规模增长
+    EMBEDDING_BATCH_SIZE: int = 64  # 每次送入嵌入模型的文本数
+    VECTOR_UPSERT_BATCH_SIZE: int = 512  # 每批写入向量数据库的文档块数
+    EMBEDDING_WORKERS: int = 0  # 导入时并行编码的进程数，0 表示在当前进程中编码
+
     # CORS配置
     CORS_ORIGINS: list = [
         "http://localhost:5173",  # Vue开发服务器
         "http://localhost:3000",
     ]
 
-    # AI配置 - 通义千问
+    # 限流配置（令牌桶）：{"方法 路径": {"角色": "请求数/秒数"}}，角色为 anonymous / user / admin，未配置的角色不限流
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_TRUST_PROXY: bool = False  # 部署在反向代理之后时，按 X-Forwarded-For 识别匿名客户端
+    RATE_LIMITS: dict = {
+        "POST /api/predict/single": {"anonymous": "10/60", "user": "60/60"},
+        "POST /api/predict/batch": {"user": "10/60"},
+        "POST /api/chat/": {"anonymous": "5/60", "user": "20/60"},
+        "POST /api/chat/stream": {"anonymous": "5/60", "user": "20/60"},
+    }
+
+    # AI配置 - 大模型提供方：dashscope（通义千问）或 stub（本地模拟，压测和离线环境使用）
+    LLM_PROVIDER: str = "dashscope"
     DASHSCOPE_API_KEY: Optional[str] = None
 
+    # 本地模拟大模型：首字延迟毫秒数、每秒输出 token 数（0 为不限速）、报错概率、预设回答 JSON 文件
+    LLM_STUB_LATENCY_MS: float = 300
+    LLM_STUB_TOKENS_PER_SECOND: float = 50
+    LLM_STUB_ERROR_RATE: float = 0.0
+    LLM_STUB_ANSWERS_FILE: Optional[str] = None
+
+    # 大模型调用：并发上限、等待并发名额的秒数、单次调用（流式为首段输出）超时秒数、流式输出两段之间的超时秒数
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_QUEUE_TIMEOUT: float = 10.0
+    LLM_TIMEOUT: float = 60.0
+    LLM_STREAM_IDLE_TIMEOUT: float = 30.0
+
     class Config:
         env_file = ".env"
 
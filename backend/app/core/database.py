@@ -1,19 +1,123 @@
 """
 数据库连接和会话管理
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from typing import Optional
 from app.core.config import settings
 
+
+def get_async_database_url(url: str) -> str:
+    """
+    将同步数据库连接串转换为异步驱动连接串
+
+    Args:
+        url: 同步连接串，如 sqlite:///./trash_classify.db
+
+    Returns:
+        异步连接串（SQLite 使用 aiosqlite，PostgreSQL 使用 asyncpg）
+    """
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def get_engine_options(url: str, profile: Optional[str] = None) -> dict:
+    """
+    根据数据库类型和配置档生成 create_engine 参数
+
+    Args:
+        url: 数据库连接串
+        profile: 配置档（production / default），默认读取 DB_ENGINE_PROFILE
+
+    Returns:
+        create_engine / create_async_engine 的关键字参数
+    """
+    profile = profile or settings.DB_ENGINE_PROFILE
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        if profile == "production":
+            # 与 busy_timeout 保持一致，驱动层等待写锁的秒数
+            options["connect_args"]["timeout"] = settings.DB_SQLITE_BUSY_TIMEOUT_MS / 1000
+        return options
+
+    if profile != "production":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine, profile: Optional[str] = None):
+    """
+    为 SQLite 引擎注册连接事件，在每个新连接上设置 PRAGMA
+
+    Args:
+        engine: 同步引擎（异步引擎传入 async_engine.sync_engine）
+        profile: 配置档（production / default），默认读取 DB_ENGINE_PROFILE
+    """
+    profile = profile or settings.DB_ENGINE_PROFILE
+    if engine.dialect.name != "sqlite" or profile != "production":
+        return
+
+    pragmas = [
+        f"PRAGMA journal_mode={settings.DB_SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.DB_SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={settings.DB_SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={settings.DB_SQLITE_CACHE_SIZE}",
+        f"PRAGMA busy_timeout={settings.DB_SQLITE_BUSY_TIMEOUT_MS}",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: str, profile: Optional[str] = None) -> Engine:
+    """创建按配置档调优的同步引擎"""
+    db_engine = create_engine(url, **get_engine_options(url, profile))
+    apply_sqlite_pragmas(db_engine, profile)
+    return db_engine
+
+
 # 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = create_db_engine(settings.DATABASE_URL)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎（供 async 路由使用，避免阻塞事件循环）
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL),
+    **get_engine_options(settings.DATABASE_URL)
+)
+apply_sqlite_pragmas(async_engine.sync_engine)
+
+# 创建异步会话工厂
+# expire_on_commit=False：提交后仍可直接读取对象属性，避免在异步上下文中触发隐式加载
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 
 def get_db():
     """获取数据库会话"""
@@ -22,3 +126,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,171 @@
+"""
+令牌桶限流中间件
+按用户ID（已登录）或客户端IP（匿名）限制识别、AI 聊天等高开销接口的请求频率
+
+- 在路由之前执行：不解析请求体、不打开数据库会话，被拒绝的请求几乎没有开销
+- 身份只通过本地校验 JWT 签名得到（不查 Redis 和数据库），token 无效时按匿名处理
+- 令牌桶存储在 Redis（Lua 脚本原子扣减），Redis 不可用时退回进程内令牌桶
+- 响应携带 RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset / RateLimit-Policy，
+  被拒绝时返回 429 和 Retry-After
+"""
+import json
+import math
+import threading
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis_client import redis_client, MemoryStore, StoreUnavailableError
+from app.core.security import decode_access_token
+
+
+def parse_limit(spec: str) -> Tuple[int, float]:
+    """
+    解析限流规则
+
+    Args:
+        spec: "请求数/秒数"，如 "10/60" 表示每 60 秒 10 次（同时也是允许的突发数）
+
+    Returns:
+        (桶容量, 每秒补充的令牌数)
+    """
+    count, seconds = spec.split("/")
+    capacity = int(count)
+    return capacity, capacity / float(seconds)
+
+
+class RateLimiter:
+    """限流器：限流规则、身份识别与令牌桶扣减"""
+
+    def __init__(self, limits: Dict[str, Dict[str, str]] = None, enabled: bool = None):
+        """
+        初始化限流器
+
+        Args:
+            limits: {"方法 路径": {"角色": "请求数/秒数"}}，角色为 anonymous / user / admin，
+                    未配置的角色不限流；默认读取 RATE_LIMITS 配置
+            enabled: 是否启用，默认读取 RATE_LIMIT_ENABLED 配置
+        """
+        self.enabled = settings.RATE_LIMIT_ENABLED if enabled is None else enabled
+        self.limits = {
+            route: {role: parse_limit(spec) for role, spec in roles.items()}
+            for route, roles in (settings.RATE_LIMITS if limits is None else limits).items()
+        }
+        # Redis 不可用时使用的进程内令牌桶
+        self._fallback = MemoryStore()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def get_limit(self, route: str, role: str) -> Optional[Tuple[int, float]]:
+        """返回接口对该角色的 (桶容量, 每秒补充数)，不限流时返回 None"""
+        return self.limits.get(route, {}).get(role)
+
+    def identify(self, scope) -> Tuple[str, str]:
+        """返回 (限流主体, 角色)：有效 JWT 按用户ID，否则按客户端IP"""
+        headers = dict(scope.get("headers") or [])
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.lower().startswith("bearer "):
+            payload = decode_access_token(authorization[7:].strip())
+            if payload and payload.get("sub"):
+                return f"user:{payload['sub']}", payload.get("role") or "user"
+
+        return f"ip:{self._client_ip(scope, headers)}", "anonymous"
+
+    @staticmethod
+    def _client_ip(scope, headers) -> str:
+        if settings.RATE_LIMIT_TRUST_PROXY:
+            forwarded = headers.get(b"x-forwarded-for")
+            if forwarded:
+                return forwarded.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def take(self, route: str, identity: str, capacity: int, refill_rate: float) -> Tuple[bool, float, float]:
+        """
+        从 (接口, 主体) 对应的令牌桶中取一个令牌
+
+        Returns:
+            (是否允许, 剩余令牌数, 需等待的秒数)
+        """
+        key = f"rate_limit:{route}:{identity}"
+        try:
+            result = await redis_client.take_token(key, capacity, refill_rate)
+        except StoreUnavailableError as e:
+            logger.warning(f"限流存储不可用，使用进程内令牌桶: {str(e)}")
+            self._record(route, "fallback")
+            result = await self._fallback.take_token(key, capacity, refill_rate)
+
+        self._record(route, "allowed" if result[0] else "rejected")
+        return result
+
+    def _record(self, route: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(route, {"allowed": 0, "rejected": 0, "fallback": 0})
+            stats[field] += 1
+
+    def stats(self) -> Dict:
+        """各接口放行/拒绝次数"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "routes": {route: dict(values) for route, values in self._stats.items()}
+            }
+
+
+# 全局限流器实例
+rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """限流中间件（ASGI）"""
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if not self.limiter.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{scope['method']} {scope['path']}"
+        if route not in self.limiter.limits:
+            await self.app(scope, receive, send)
+            return
+
+        identity, role = self.limiter.identify(scope)
+        limit = self.limiter.get_limit(route, role)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        capacity, refill_rate = limit
+        allowed, remaining, retry_after = await self.limiter.take(route, identity, capacity, refill_rate)
+
+        headers = [
+            (b"ratelimit-limit", str(capacity).encode()),
+            (b"ratelimit-remaining", str(int(remaining)).encode()),
+            # 桶重新补满还需的秒数
+            (b"ratelimit-reset", str(math.ceil((capacity - remaining) / refill_rate)).encode()),
+            (b"ratelimit-policy", f"{capacity};w={round(capacity / refill_rate)}".encode()),
+        ]
+
+        if not allowed:
+            body = json.dumps({"detail": "请求过于频繁，请稍后重试"}, ensure_ascii=False).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"retry-after", str(math.ceil(retry_after)).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
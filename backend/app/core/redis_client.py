@@ -1,25 +1,193 @@
 """
 Redis 工具类
-用于管理 token 和在线用户
+用于管理 token、在线用户及各类缓存数据
+
+提供两种可替换的存储实现，接口一致：
+- RedisClient: 基于 redis.asyncio 连接池的异步客户端，带超时、重试和熔断
+- MemoryStore: 进程内存储，用于单机部署和测试环境（无需 Redis 服务）
+通过 REDIS_BACKEND 配置选择。
 """
-import redis
-from typing import Optional
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError, RedisError
 from app.core.config import settings
+from app.core.logger import logger
+
+# 在线用户索引：有序集合，成员为 user_id，分数为 token 过期时间戳
+ONLINE_USERS_KEY = "online_users"
+
+# 校验 token 并按需滑动续期：剩余有效期低于 ARGV[3] 秒时才续期（EXPIRE 两个键 + 更新在线索引），
+# 一次往返返回 {user_id, 续期后的剩余秒数}
+VALIDATE_TOKEN_SCRIPT = """
+local user_id = redis.call('GET', KEYS[1])
+if not user_id then
+    return false
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl < tonumber(ARGV[3]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    redis.call('EXPIRE', 'user:' .. user_id .. ':token', ARGV[1])
+    redis.call('ZADD', KEYS[2], ARGV[2], user_id)
+    ttl = tonumber(ARGV[1])
+end
+return {user_id, ttl}
+"""
+
+
+# 令牌桶限流：按经过时间补充令牌后尝试扣减，一次往返返回 {是否允许, 剩余令牌, 需等待秒数}
+# ARGV: 容量, 每秒补充数, 当前时间戳, 本次消耗
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class StoreUnavailableError(Exception):
+    """存储服务不可用（连接失败、超时或熔断中）"""
+    pass
+
+
+class KeyValueStore(ABC):
+    """
+    键值存储基类
 
+    子类实现基础读写操作（get/set/有序集合等），token 与在线用户管理在此基础上实现。
+    """
 
-class RedisClient:
-    """Redis 客户端"""
+    backend = "base"
+
+    # 本地记录的 token 续期时间最多条数，超出时清空
+    MAX_TRACKED_TOKENS = 10000
 
     def __init__(self):
-        self.client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=settings.REDIS_DB,
-            password=settings.REDIS_PASSWORD,
-            decode_responses=True  # 自动解码为字符串
-        )
+        # token -> 最近一次续期的时间戳（本进程所知），用于跳过不必要的续期写入
+        self._token_refreshed_at: Dict[str, float] = {}
+        self._token_validations = 0
+        self._token_refreshes = 0
+
+    # ---------- 基础操作（由子类实现） ----------
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ex: int = None):
+        ...
 
-    def set_token(self, token: str, user_id: int, expire_seconds: int = None):
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def expire(self, key: str, seconds: int):
+        ...
+
+    @abstractmethod
+    async def ttl(self, key: str) -> int:
+        """剩余过期秒数，键不存在返回 -2，未设置过期返回 -1"""
+
+    @abstractmethod
+    async def zadd(self, key: str, mapping: Dict[str, float]):
+        ...
+
+    @abstractmethod
+    async def zrem(self, key: str, member: str):
+        ...
+
+    @abstractmethod
+    async def zremrangebyscore(self, key: str, min_score, max_score) -> int:
+        ...
+
+    @abstractmethod
+    async def zcount(self, key: str, min_score, max_score) -> int:
+        ...
+
+    @abstractmethod
+    async def zrangebyscore(
+        self, key: str, min_score, max_score, offset: int = 0, limit: int = None
+    ) -> List[Tuple[str, float]]:
+        ...
+
+    @abstractmethod
+    async def take_token(
+        self, key: str, capacity: int, refill_rate: float, cost: int = 1
+    ) -> Tuple[bool, float, float]:
+        """
+        令牌桶限流：尝试从桶中取出 cost 个令牌
+
+        Args:
+            key: 桶的键
+            capacity: 桶容量（允许的突发请求数）
+            refill_rate: 每秒补充的令牌数
+            cost: 本次消耗的令牌数
+
+        Returns:
+            (是否允许, 剩余令牌数, 需等待的秒数)
+        """
+
+    async def close(self):
+        """释放连接（应用关闭时调用）"""
+        pass
+
+    def stats(self) -> Dict:
+        """存储运行状态"""
+        return {
+            "backend": self.backend,
+            "token_validations": self._token_validations,
+            "token_refreshes": self._token_refreshes
+        }
+
+    # ---------- 续期时间本地记录 ----------
+
+    def _remember_refresh(self, token: str, refreshed_at: float):
+        if len(self._token_refreshed_at) >= self.MAX_TRACKED_TOKENS:
+            self._token_refreshed_at.clear()
+        self._token_refreshed_at[token] = refreshed_at
+
+    def _forget_refresh(self, token: str):
+        self._token_refreshed_at.pop(token, None)
+
+    # ---------- token 管理 ----------
+
+    async def set_token(self, token: str, user_id: int, expire_seconds: int = None):
         """
         存储 token
 
@@ -32,20 +200,16 @@ class RedisClient:
             expire_seconds = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
 
         # 存储 token -> user_id 映射
-        self.client.setex(
-            f"token:{token}",
-            expire_seconds,
-            str(user_id)
-        )
+        await self.set(f"token:{token}", str(user_id), ex=expire_seconds)
 
         # 存储 user_id -> token 映射（用于单点登录）
-        self.client.setex(
-            f"user:{user_id}:token",
-            expire_seconds,
-            token
-        )
+        await self.set(f"user:{user_id}:token", token, ex=expire_seconds)
 
-    def get_user_id_by_token(self, token: str) -> Optional[int]:
+        # 更新在线用户索引
+        await self.zadd(ONLINE_USERS_KEY, {str(user_id): time.time() + expire_seconds})
+        self._remember_refresh(token, time.time())
+
+    async def get_user_id_by_token(self, token: str) -> Optional[int]:
         """
         通过 token 获取用户ID
 
@@ -55,10 +219,79 @@ class RedisClient:
         Returns:
             用户ID，如果 token 不存在或已过期则返回 None
         """
-        user_id = self.client.get(f"token:{token}")
+        user_id = await self.get(f"token:{token}")
         return int(user_id) if user_id else None
 
-    def delete_token(self, token: str, user_id: int = None):
+    async def validate_token(self, token: str, expire_seconds: int = None) -> Optional[int]:
+        """
+        校验 token，剩余有效期不足时顺带续期（滑动过期）
+
+        剩余有效期低于 TOKEN_REFRESH_THRESHOLD 比例时才续期。本进程记录了每个 token 的续期时间，
+        确定无需续期时只做一次只读查询，绝大多数请求不产生写入。
+
+        Args:
+            token: JWT token
+            expire_seconds: 续期后的过期时间（秒），默认使用配置的过期时间
+
+        Returns:
+            用户ID，如果 token 不存在或已过期则返回 None
+        """
+        if expire_seconds is None:
+            expire_seconds = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        refresh_below = expire_seconds * settings.TOKEN_REFRESH_THRESHOLD
+        self._token_validations += 1
+
+        refreshed_at = self._token_refreshed_at.get(token)
+        if refreshed_at is not None and time.time() - refreshed_at < expire_seconds - refresh_below:
+            # 剩余有效期充足：只检查 token 是否仍存在（可能已登出或被踢下线）
+            user_id = await self.get_user_id_by_token(token)
+            if user_id is None:
+                self._forget_refresh(token)
+            return user_id
+
+        return await self._refresh_token(token, expire_seconds, refresh_below)
+
+    async def _refresh_token(self, token: str, expire_seconds: int, refresh_below: float) -> Optional[int]:
+        """
+        校验 token，剩余有效期低于 refresh_below 秒时续期，并记录本地续期时间
+
+        Returns:
+            用户ID，如果 token 不存在或已过期则返回 None
+        """
+        result = await self._check_and_refresh(token, expire_seconds, refresh_below)
+        if result is None:
+            self._forget_refresh(token)
+            return None
+
+        user_id, remaining = result
+        if remaining == expire_seconds:
+            self._token_refreshes += 1
+        # 折算为"等效的最近续期时间"，之后据此判断何时需要再次续期
+        self._remember_refresh(token, time.time() - (expire_seconds - remaining))
+        return user_id
+
+    async def _check_and_refresh(
+        self, token: str, expire_seconds: int, refresh_below: float
+    ) -> Optional[Tuple[int, int]]:
+        """
+        校验 token 并按需续期
+
+        Returns:
+            (用户ID, 续期后的剩余秒数)，token 无效时返回 None
+        """
+        user_id = await self.get_user_id_by_token(token)
+        if not user_id:
+            return None
+
+        remaining = await self.ttl(f"token:{token}")
+        if remaining < refresh_below:
+            await self.expire(f"token:{token}", expire_seconds)
+            await self.expire(f"user:{user_id}:token", expire_seconds)
+            await self.zadd(ONLINE_USERS_KEY, {str(user_id): time.time() + expire_seconds})
+            remaining = expire_seconds
+        return user_id, remaining
+
+    async def delete_token(self, token: str, user_id: int = None):
         """
         删除 token（用户登出）
 
@@ -66,18 +299,20 @@ class RedisClient:
             token: JWT token
             user_id: 用户ID（可选）
         """
-        # 如果没有提供 user_id，先从 Redis 获取
+        # 如果没有提供 user_id，先从存储中获取
         if user_id is None:
-            user_id = self.get_user_id_by_token(token)
+            user_id = await self.get_user_id_by_token(token)
 
         # 删除 token
-        self.client.delete(f"token:{token}")
+        await self.delete(f"token:{token}")
+        self._forget_refresh(token)
 
-        # 删除用户的 token 映射
+        # 删除用户的 token 映射，并移出在线用户索引
         if user_id:
-            self.client.delete(f"user:{user_id}:token")
+            await self.delete(f"user:{user_id}:token")
+            await self.zrem(ONLINE_USERS_KEY, str(user_id))
 
-    def is_token_valid(self, token: str) -> bool:
+    async def is_token_valid(self, token: str) -> bool:
         """
         检查 token 是否有效
 
@@ -87,9 +322,9 @@ class RedisClient:
         Returns:
             True 如果 token 有效，否则 False
         """
-        return self.client.exists(f"token:{token}") > 0
+        return await self.exists(f"token:{token}")
 
-    def kick_user(self, user_id: int):
+    async def kick_user(self, user_id: int):
         """
         踢用户下线（管理员功能）
 
@@ -97,56 +332,391 @@ class RedisClient:
             user_id: 用户ID
         """
         # 获取用户的 token
-        token = self.client.get(f"user:{user_id}:token")
+        token = await self.get(f"user:{user_id}:token")
         if token:
             # 删除 token
-            self.delete_token(token, user_id)
+            await self.delete_token(token, user_id)
+
+    async def extend_token_expire(self, token: str, expire_seconds: int = None):
+        """
+        延长 token 过期时间
+
+        Args:
+            token: JWT token
+            expire_seconds: 新的过期时间（秒）
+        """
+        if expire_seconds is None:
+            expire_seconds = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        # 续期阈值大于过期时间，保证一定续期
+        await self._refresh_token(token, expire_seconds, expire_seconds + 1)
+
+    # ---------- 在线用户 ----------
+
+    async def prune_online_users(self) -> int:
+        """
+        清理在线用户索引中已过期的成员（惰性清理，在读取时顺带执行）
+
+        Returns:
+            清理的成员数量
+        """
+        return await self.zremrangebyscore(ONLINE_USERS_KEY, "-inf", time.time())
 
-    def get_online_users_count(self) -> int:
+    async def get_online_users_count(self) -> int:
         """
         获取在线用户数量
 
         Returns:
             在线用户数量
         """
-        # 统计所有 user:*:token 的数量
-        keys = self.client.keys("user:*:token")
-        return len(keys)
+        await self.prune_online_users()
+        return await self.zcount(ONLINE_USERS_KEY, time.time(), "+inf")
 
-    def get_online_users(self) -> list:
+    async def get_online_users(self, offset: int = 0, limit: int = None) -> list:
         """
-        获取所有在线用户ID列表
+        获取在线用户ID列表（按过期时间升序，支持分页）
+
+        Args:
+            offset: 跳过的数量
+            limit: 返回的最大数量，None 表示全部
 
         Returns:
             在线用户ID列表
         """
-        keys = self.client.keys("user:*:token")
-        user_ids = []
-        for key in keys:
-            # 从 key 中提取 user_id
-            # key 格式: user:123:token
-            parts = key.split(":")
-            if len(parts) == 3:
-                user_ids.append(int(parts[1]))
-        return user_ids
+        return [user_id for user_id, _ in await self.get_online_users_with_expiry(offset, limit)]
 
-    def extend_token_expire(self, token: str, expire_seconds: int = None):
+    async def get_online_users_with_expiry(self, offset: int = 0, limit: int = None) -> List[Tuple[int, float]]:
         """
-        延长 token 过期时间
+        获取在线用户及其 token 过期时间戳（支持分页）
 
         Args:
-            token: JWT token
-            expire_seconds: 新的过期时间（秒）
+            offset: 跳过的数量
+            limit: 返回的最大数量，None 表示全部
+
+        Returns:
+            [(用户ID, 过期时间戳), ...]
         """
-        if expire_seconds is None:
-            expire_seconds = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        await self.prune_online_users()
+        members = await self.zrangebyscore(ONLINE_USERS_KEY, time.time(), "+inf", offset, limit)
+        return [(int(user_id), expire_at) for user_id, expire_at in members]
 
-        user_id = self.get_user_id_by_token(token)
-        if user_id:
-            # 延长 token 过期时间
-            self.client.expire(f"token:{token}", expire_seconds)
-            self.client.expire(f"user:{user_id}:token", expire_seconds)
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到阈值后断开，冷却期内的调用直接失败，不再等待连接超时；
+    冷却结束后进入半开状态恢复放行，首次调用成功则关闭熔断，失败则立即重新熔断。
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """是否允许发起调用"""
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.trips += 1
+                logger.warning(f"Redis 连续失败 {self.failures} 次，熔断 {self.cooldown} 秒")
+            # 半开状态下试探失败，重新开始冷却
+            self.opened_at = time.monotonic()
+
+
+class RedisClient(KeyValueStore):
+    """Redis 客户端（异步，连接池）"""
+
+    backend = "redis"
+
+    def __init__(self):
+        super().__init__()
+        self.pool = redis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            retry=Retry(ExponentialBackoff(cap=0.5, base=0.05), settings.REDIS_RETRY_ATTEMPTS),
+            retry_on_error=[ConnectionError, TimeoutError],
+            health_check_interval=30,
+            decode_responses=True  # 自动解码为字符串
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+        self.breaker = CircuitBreaker(settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_COOLDOWN)
+        self._validate_token_script = self.client.register_script(VALIDATE_TOKEN_SCRIPT)
+        self._token_bucket_script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def _call(self, operation: Callable[[], Awaitable]):
+        """执行 Redis 调用，统一处理熔断与异常"""
+        if not self.breaker.allow():
+            raise StoreUnavailableError("Redis 熔断中")
+        try:
+            result = await operation()
+        except RedisError as e:
+            self.breaker.record_failure()
+            raise StoreUnavailableError(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._call(lambda: self.client.get(key))
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return await self._call(lambda: self.client.mget(keys))
+
+    async def set(self, key: str, value: str, ex: int = None):
+        await self._call(lambda: self.client.set(key, value, ex=ex))
+
+    async def incr(self, key: str) -> int:
+        return await self._call(lambda: self.client.incr(key))
+
+    async def delete(self, *keys: str):
+        await self._call(lambda: self.client.delete(*keys))
+
+    async def exists(self, key: str) -> bool:
+        return await self._call(lambda: self.client.exists(key)) > 0
+
+    async def expire(self, key: str, seconds: int):
+        await self._call(lambda: self.client.expire(key, seconds))
+
+    async def ttl(self, key: str) -> int:
+        return await self._call(lambda: self.client.ttl(key))
+
+    async def zadd(self, key: str, mapping: Dict[str, float]):
+        await self._call(lambda: self.client.zadd(key, mapping))
+
+    async def zrem(self, key: str, member: str):
+        await self._call(lambda: self.client.zrem(key, member))
+
+    async def zremrangebyscore(self, key: str, min_score, max_score) -> int:
+        return await self._call(lambda: self.client.zremrangebyscore(key, min_score, max_score))
+
+    async def zcount(self, key: str, min_score, max_score) -> int:
+        return await self._call(lambda: self.client.zcount(key, min_score, max_score))
+
+    async def zrangebyscore(
+        self, key: str, min_score, max_score, offset: int = 0, limit: int = None
+    ) -> List[Tuple[str, float]]:
+        return await self._call(lambda: self.client.zrangebyscore(
+            key, min_score, max_score,
+            start=offset,
+            num=limit if limit is not None else -1,
+            withscores=True
+        ))
+
+    async def _check_and_refresh(
+        self, token: str, expire_seconds: int, refresh_below: float
+    ) -> Optional[Tuple[int, int]]:
+        """校验 token 并按需续期（Lua 脚本原子执行，一次网络往返）"""
+        result = await self._call(lambda: self._validate_token_script(
+            keys=[f"token:{token}", ONLINE_USERS_KEY],
+            args=[expire_seconds, time.time() + expire_seconds, refresh_below]
+        ))
+        if not result:
+            return None
+        user_id, remaining = result
+        return int(user_id), int(remaining)
+
+    async def take_token(
+        self, key: str, capacity: int, refill_rate: float, cost: int = 1
+    ) -> Tuple[bool, float, float]:
+        allowed, tokens, retry_after = await self._call(lambda: self._token_bucket_script(
+            keys=[key],
+            args=[capacity, refill_rate, time.time(), cost]
+        ))
+        return bool(allowed), float(tokens), float(retry_after)
+
+    async def get_online_users_count(self) -> int:
+        """
+        获取在线用户数量（清理与计数在一次往返中完成）
+
+        Returns:
+            在线用户数量
+        """
+        async def count():
+            now = time.time()
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(ONLINE_USERS_KEY, "-inf", now)
+                pipe.zcount(ONLINE_USERS_KEY, now, "+inf")
+                return (await pipe.execute())[1]
+
+        return await self._call(count)
+
+    async def close(self):
+        await self.client.aclose()
+        await self.pool.disconnect()
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "breaker_trips": self.breaker.trips,
+            "max_connections": self.pool.max_connections,
+            "connections_in_use": len(self.pool._in_use_connections)
+        }
+
+
+class MemoryStore(KeyValueStore):
+    """
+    进程内存储
+
+    仅在当前进程内有效，适用于单进程部署和测试；多进程部署请使用 Redis。
+    所有操作在事件循环线程内同步完成，无需加锁。
+    """
+
+    backend = "memory"
+
+    # 每写入多少次清理一次过期键，防止从未再次访问的键一直占用内存
+    SWEEP_INTERVAL = 1000
+
+    def __init__(self):
+        super().__init__()
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._zsets: Dict[str, Dict[str, float]] = {}
+        # 令牌桶：key -> (剩余令牌, 更新时间, 补满时间)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._writes = 0
+
+    def _get_entry(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry
+
+    def _sweep(self):
+        self._writes += 1
+        if self._writes % self.SWEEP_INTERVAL:
+            return
+        now = time.monotonic()
+        expired = [key for key, (_, expire_at) in self._values.items() if expire_at is not None and expire_at <= now]
+        for key in expired:
+            del self._values[key]
+        # 已补满的令牌桶与新建桶等价，可以直接丢弃
+        full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+        for key in full:
+            del self._buckets[key]
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._get_entry(key)
+        return entry[0] if entry else None
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ex: int = None):
+        self._sweep()
+        self._values[key] = (str(value), time.monotonic() + ex if ex else None)
+
+    async def incr(self, key: str) -> int:
+        entry = self._get_entry(key)
+        value = int(entry[0]) + 1 if entry else 1
+        self._values[key] = (str(value), entry[1] if entry else None)
+        return value
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._values.pop(key, None)
+            self._zsets.pop(key, None)
+
+    async def exists(self, key: str) -> bool:
+        return self._get_entry(key) is not None or key in self._zsets
+
+    async def expire(self, key: str, seconds: int):
+        entry = self._get_entry(key)
+        if entry:
+            self._values[key] = (entry[0], time.monotonic() + seconds)
+
+    async def ttl(self, key: str) -> int:
+        entry = self._get_entry(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return int(entry[1] - time.monotonic())
+
+    async def zadd(self, key: str, mapping: Dict[str, float]):
+        self._zsets.setdefault(key, {}).update({str(m): float(s) for m, s in mapping.items()})
+
+    async def zrem(self, key: str, member: str):
+        self._zsets.get(key, {}).pop(str(member), None)
+
+    async def zremrangebyscore(self, key: str, min_score, max_score) -> int:
+        zset = self._zsets.get(key, {})
+        low, high = float(min_score), float(max_score)
+        removed = [member for member, score in zset.items() if low <= score <= high]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    async def zcount(self, key: str, min_score, max_score) -> int:
+        low, high = float(min_score), float(max_score)
+        return sum(1 for score in self._zsets.get(key, {}).values() if low <= score <= high)
+
+    async def zrangebyscore(
+        self, key: str, min_score, max_score, offset: int = 0, limit: int = None
+    ) -> List[Tuple[str, float]]:
+        low, high = float(min_score), float(max_score)
+        members = sorted(
+            ((member, score) for member, score in self._zsets.get(key, {}).items() if low <= score <= high),
+            key=lambda item: (item[1], item[0])
+        )
+        return members[offset:offset + limit if limit is not None else None]
+
+    async def take_token(
+        self, key: str, capacity: int, refill_rate: float, cost: int = 1
+    ) -> Tuple[bool, float, float]:
+        self._sweep()
+        now = time.monotonic()
+        tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * refill_rate)
+
+        allowed = tokens >= cost
+        retry_after = 0.0
+        if allowed:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / refill_rate
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+        return allowed, tokens, retry_after
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "keys": len(self._values),
+            "sorted_sets": len(self._zsets),
+            "token_buckets": len(self._buckets)
+        }
+
+
+def create_store() -> KeyValueStore:
+    """根据 REDIS_BACKEND 配置创建存储实例"""
+    if settings.REDIS_BACKEND == "memory":
+        logger.info("使用进程内存储管理 token 与缓存（单进程部署）")
+        return MemoryStore()
+    return RedisClient()
 
 
-# 全局 Redis 客户端实例
-redis_client = RedisClient()
+# 全局存储实例（默认为 Redis 客户端）
+redis_client = create_store()
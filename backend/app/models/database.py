@@ -1,7 +1,7 @@
 """
 数据库模型定义
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -36,7 +36,7 @@ class Prediction(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 可为空表示游客
     image_path = Column(String(255), nullable=False)
     predicted_class = Column(String(100), nullable=False)
-    predicted_class_id = Column(Integer, nullable=False)
+    predicted_class_id = Column(Integer, nullable=False, index=True)
     confidence = Column(Float, nullable=False)
     top3_results = Column(JSON, nullable=True)  # 存储Top3结果
     is_correct = Column(Boolean, nullable=True)  # 用户反馈是否正确
@@ -47,6 +47,11 @@ class Prediction(Base):
     user = relationship("User", back_populates="predictions")
     feedbacks = relationship("Feedback", back_populates="prediction")
 
+    __table_args__ = (
+        # 用户历史按分类筛选：user_id = ? AND predicted_class_id IN (...)
+        Index("ix_predictions_user_class", "user_id", "predicted_class_id"),
+    )
+
 
 class Feedback(Base):
     """用户反馈表"""
@@ -74,13 +79,39 @@ class ChatConversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String(200), nullable=False)  # 对话标题
-    messages = Column(JSON, nullable=False)  # 消息列表 [{"role": "user", "content": "..."}, ...]
+    messages = Column(JSON, nullable=False, default=list)  # 旧版消息列表，消息已改存 chat_messages 表，保留列以兼容旧库
+    message_count = Column(Integer, default=0)  # 消息数
+    last_message = Column(String(200), nullable=True)  # 最后一条消息预览（对话列表用）
+    summary = Column(Text, nullable=True)  # 较早对话的滚动摘要（构建大模型上下文用）
+    summary_message_count = Column(Integer, default=0)  # 摘要覆盖的消息数（前 N 条）
     created_at = Column(DateTime, default=datetime.now, index=True)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     # 关系
     user = relationship("User", back_populates="chat_conversations")
 
+    __table_args__ = (
+        # 对话列表：user_id = ? ORDER BY updated_at DESC
+        Index("ix_chat_conversations_user_updated", "user_id", "updated_at"),
+    )
+
+
+class ChatMessage(Base):
+    """AI 聊天消息表（只追加，按 id 排序即为对话顺序）"""
+    __tablename__ = "chat_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("chat_conversations.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String(20), nullable=False)  # user / assistant
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # 按对话分页读取消息：conversation_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_chat_messages_conversation_id", "conversation_id", "id"),
+    )
+
+
 class Announcement(Base):
     """系统公告表"""
     __tablename__ = "announcements"
@@ -93,3 +124,42 @@ class Announcement(Base):
     priority = Column(Integer, default=0)  # 优先级，数字越大越靠前
     created_at = Column(DateTime, default=datetime.now, index=True)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class PredictionPartition(Base):
+    """识别记录归档分区登记表（按月）"""
+    __tablename__ = "prediction_partitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(String(7), unique=True, nullable=False)  # 格式 YYYY-MM
+    table_name = Column(String(64), nullable=False)  # 存放该月归档数据的表
+    start_at = Column(DateTime, nullable=False)  # 分区起始时间（含）
+    end_at = Column(DateTime, nullable=False)  # 分区结束时间（不含）
+    row_count = Column(Integer, default=0)  # 已归档记录数
+    archive_file = Column(String(255), nullable=True)  # 压缩冷备份文件路径
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ModelStat(Base):
+    """按模型汇总的识别统计（物化汇总表，增量更新）"""
+    __tablename__ = "model_stats"
+
+    model_name = Column(String(100), primary_key=True)  # 空字符串表示未记录模型名称的历史数据
+    total = Column(Integer, default=0, nullable=False)
+    confidence_sum = Column(Float, default=0, nullable=False)
+    high_count = Column(Integer, default=0, nullable=False)  # 置信度 >= 80
+    low_count = Column(Integer, default=0, nullable=False)  # 置信度 < 60
+    bucket_90 = Column(Integer, default=0, nullable=False)  # [90, 100)
+    bucket_80 = Column(Integer, default=0, nullable=False)  # [80, 90)
+    bucket_70 = Column(Integer, default=0, nullable=False)  # [70, 80)
+    bucket_60 = Column(Integer, default=0, nullable=False)  # [60, 70)
+    bucket_0 = Column(Integer, default=0, nullable=False)  # [0, 60)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SummaryWatermark(Base):
+    """汇总表增量更新进度（已汇总到的最大识别记录ID）"""
+    __tablename__ = "summary_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(Integer, default=0, nullable=False)
@@ -15,6 +15,14 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     """聊天请求模型"""
     messages: List[Message]  # 对话历史
+    conversation_id: Optional[int] = None  # 已保存的对话（登录时历史从数据库读取，messages 只需包含新问题）
+
+
+class ChatStreamRequest(BaseModel):
+    """流式聊天请求模型"""
+    messages: List[Message]  # 对话历史
+    persist: bool = False  # 回复结束后是否保存到对话历史（需要登录）
+    conversation_id: Optional[int] = None  # 已保存的对话：历史从数据库读取，persist 时追加到该对话（为空时新建）
 
 
 class ChatResponse(BaseModel):
@@ -31,19 +39,42 @@ class ConversationCreate(BaseModel):
 
 
 class ConversationUpdate(BaseModel):
-    """更新对话模型"""
+    """更新对话模型（messages 会替换全部消息，仅用于清空或改写；正常对话请追加消息）"""
     title: Optional[str] = None
     messages: Optional[List[Message]] = None
 
 
+class MessagesAppend(BaseModel):
+    """追加消息模型"""
+    messages: List[Message]
+
+
 class ConversationResponse(BaseModel):
-    """对话响应模型"""
+    """对话响应模型（不含消息，消息分页读取）"""
     id: int
     user_id: int
     title: str
-    messages: List[dict]
+    message_count: int = 0  # 消息数
+    last_message: Optional[str] = None  # 最后一条消息预览
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class MessageResponse(BaseModel):
+    """消息响应模型"""
+    id: int
+    role: str
+    content: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class MessagePage(BaseModel):
+    """消息分页响应模型"""
+    messages: List[MessageResponse]  # 按时间正序
+    has_more: bool  # 是否还有更早的消息
@@ -1,23 +1,289 @@
 """
 AI聊天服务 - 通义千问 + RAG
+大模型通过 LLMProvider 接入：默认为通义千问（DashScope），压测和离线环境可切换为本地模拟（LLM_PROVIDER=stub）
 """
-import dashscope
-from dashscope import Generation
+import asyncio
+import json
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from contextlib import aclosing
 from app.core.config import settings
 from app.core.logger import logger
-from typing import List, Dict
+from app.services.answer_cache import answer_cache, context_hash
+from app.services.chat_context import chat_context, load_history, save_summary, truncate_tokens
+from app.services.llm_pool import llm_pool, LLMPoolError
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
+import numpy as np
 
+# 系统提示词
+SYSTEM_PROMPT = """你是一个专业的垃圾分类助手和平台向导，具有以下特点和限制：
 
-class AIService:
-    """AI聊天服务类"""
+【你的专业领域】
+1. 垃圾分类知识：可回收物、有害垃圾、厨余垃圾、其他垃圾的分类标准和识别方法
+2. 环保知识：环境保护、资源回收、减少污染、可持续发展等相关内容
+3. 垃圾处理：各类垃圾的正确处理方法、回收流程、注意事项
+4. 平台向导：本垃圾分类识别系统的功能介绍、使用教程、操作指南
+
+【回答原则】
+1. 只回答与垃圾分类、环保、本系统使用相关的问题
+2. 对于无关问题（如编程、数学、历史、娱乐等），礼貌地拒绝并引导用户提问相关话题
+3. 回答要简洁、准确、友好，使用中文
+4. 可以适当科普环保知识，提高用户的环保意识
+5. 当用户询问平台功能时，优先参考下面提供的【参考文档】中的信息，确保准确性
+6. 如果参考文档中没有相关信息，可以基于你的知识回答垃圾分类和环保问题
+
+【拒绝回答示例】
+当用户问"今天天气怎么样"、"帮我写代码"、"1+1等于几"等无关问题时，你应该回复：
+"抱歉，我是专门的垃圾分类助手和平台向导，只能回答垃圾分类、环保和本系统使用相关的问题。您可以问我：
+- 某种物品属于什么垃圾？
+- 如何正确处理某类垃圾？
+- 垃圾分类的标准是什么？
+- 如何使用本系统的识别功能？
+- 平台有哪些功能？
+等等。有什么垃圾分类或平台使用方面的问题我可以帮您解答吗？"
+"""
+
+# 模型未配置时的回复
+NOT_CONFIGURED_REPLY = "AI聊天功能未配置，请联系管理员添加 DASHSCOPE_API_KEY"
+
+
+class AIServiceError(Exception):
+    """大模型接口返回错误"""
 
-    def __init__(self):
-        """初始化AI服务"""
-        if settings.DASHSCOPE_API_KEY:
-            dashscope.api_key = settings.DASHSCOPE_API_KEY
+
+class LLMProvider(ABC):
+    """
+    大模型提供方接口
+
+    complete / stream 都是同步方法，由大模型执行器（llm_pool）在线程中调用
+    """
+
+    name = "base"
+
+    @property
+    def configured(self) -> bool:
+        """是否可用"""
+        return True
+
+    @abstractmethod
+    def complete(self, messages: List[Dict[str, str]]) -> str:
+        """
+        生成完整回复
+
+        Raises:
+            AIServiceError: 接口返回错误
+        """
+
+    @abstractmethod
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """
+        流式生成回复，逐段产出新增的文本（生成器被关闭时应结束上游请求）
+
+        Raises:
+            AIServiceError: 接口返回错误
+        """
+
+
+class DashScopeProvider(LLMProvider):
+    """通义千问（DashScope）"""
+
+    name = "dashscope"
+
+    def __init__(self, api_key: Optional[str] = settings.DASHSCOPE_API_KEY, model: str = "qwen-turbo"):
+        """
+        Args:
+            api_key: DashScope API Key
+            model: 模型名称（qwen-turbo 速度快且免费额度充足）
+        """
+        self.model = model
+        self.api_key = api_key
+        if api_key:
+            import dashscope
+            dashscope.api_key = api_key
         else:
             logger.warning("未配置 DASHSCOPE_API_KEY，AI聊天功能将不可用")
 
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _call(self, messages: List[Dict[str, str]], stream: bool):
+        """调用通义千问API"""
+        from dashscope import Generation
+        return Generation.call(
+            model=self.model,
+            messages=messages,
+            result_format='message',
+            stream=stream,
+            incremental_output=stream,  # 流式时每次只返回新增的内容
+            temperature=0.7,  # 控制回答的创造性
+            max_tokens=1500,  # 最大token数
+            request_timeout=settings.LLM_TIMEOUT,  # 让线程中的请求也在超时后结束，及时释放并发名额
+        )
+
+    @staticmethod
+    def _check(response):
+        if response.status_code != 200:
+            logger.error(f"API调用失败: {response.code} - {response.message}")
+            raise AIServiceError(response.message)
+
+    def complete(self, messages: List[Dict[str, str]]) -> str:
+        response = self._call(messages, stream=False)
+        self._check(response)
+        return response.output.choices[0].message.content
+
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        responses = self._call(messages, stream=True)
+        try:
+            for response in responses:
+                self._check(response)
+                delta = response.output.choices[0].message.content
+                if delta:
+                    yield delta
+        finally:
+            # 提前停止迭代时关闭上游连接
+            close = getattr(responses, "close", None)
+            if close is not None:
+                close()
+
+
+# 本地模拟的默认回答：{关键字: 回答}，都不匹配时使用通用回答
+STUB_ANSWERS = {
+    "电池": "废电池属于有害垃圾。请投放到有害垃圾收集容器中，不要混入其他垃圾，以免重金属污染土壤和水源。",
+    "塑料瓶": "塑料瓶属于可回收物。投放前请倒空瓶内液体、简单冲洗并压扁，瓶盖可以一起投放。",
+    "剩饭": "剩饭剩菜属于厨余垃圾。投放前请沥干水分，去除餐盒、牙签等杂物。",
+    "纸巾": "用过的纸巾属于其他垃圾。纸巾遇水即溶，不属于可回收的纸类。",
+    "识别": "在首页点击上传图片，选择要识别的垃圾照片，系统会返回分类结果和置信度，识别记录可以在历史记录中查看。",
+}
+STUB_DEFAULT_ANSWER = (
+    "这是本地模拟的回复。垃圾分类一般分为可回收物、有害垃圾、厨余垃圾和其他垃圾四类："
+    "可回收物包括废纸、塑料、玻璃、金属和布料；有害垃圾包括废电池、废灯管、过期药品等；"
+    "厨余垃圾包括剩菜剩饭、果皮菜叶等易腐垃圾；其余难以回收的垃圾属于其他垃圾。"
+    "您可以上传图片使用识别功能，或者继续问我具体物品的分类。"
+)
+
+# 模拟分词：中文按字，英文和数字按词，标点和空白单独成词
+STUB_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]|\w+|\s+|[^\w\s]")
+
+
+class StubProvider(LLMProvider):
+    """
+    本地模拟的大模型（压测和离线环境使用，不访问网络、不消耗额度）
+
+    按关键字返回预设回答，可配置首字延迟、输出速度和错误率
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms: float = settings.LLM_STUB_LATENCY_MS,
+        tokens_per_second: float = settings.LLM_STUB_TOKENS_PER_SECOND,
+        error_rate: float = settings.LLM_STUB_ERROR_RATE,
+        answers_file: Optional[str] = settings.LLM_STUB_ANSWERS_FILE
+    ):
+        """
+        Args:
+            latency_ms: 首字延迟（毫秒）
+            tokens_per_second: 输出速度，0 表示不限速
+            error_rate: 模拟接口报错的概率（0~1）
+            answers_file: 预设回答 JSON 文件（{关键字: 回答}），不提供时使用内置回答
+        """
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.answers = dict(STUB_ANSWERS)
+        if answers_file:
+            with open(answers_file, "r", encoding="utf-8") as f:
+                self.answers = json.load(f)
+        logger.info(
+            f"使用本地模拟大模型: 首字延迟 {latency_ms}ms，{tokens_per_second} token/s，错误率 {error_rate}"
+        )
+
+    def _answer(self, messages: List[Dict[str, str]]) -> str:
+        question = next((msg["content"] for msg in reversed(messages) if msg["role"] == "user"), "")
+        for keyword, answer in self.answers.items():
+            if keyword in question:
+                return answer
+        return STUB_DEFAULT_ANSWER
+
+    def _start(self, messages: List[Dict[str, str]]) -> List[str]:
+        """模拟首字延迟和随机错误，返回回答的分词结果"""
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise AIServiceError("模拟的上游接口错误")
+        return STUB_TOKEN_PATTERN.findall(self._answer(messages))
+
+    def complete(self, messages: List[Dict[str, str]]) -> str:
+        tokens = self._start(messages)
+        if self.tokens_per_second > 0:
+            time.sleep(len(tokens) / self.tokens_per_second)
+        return "".join(tokens)
+
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        tokens = self._start(messages)
+        for token in tokens:
+            if self.tokens_per_second > 0:
+                time.sleep(1 / self.tokens_per_second)
+            yield token
+
+
+def create_provider(name: str = settings.LLM_PROVIDER) -> LLMProvider:
+    """按 LLM_PROVIDER 创建大模型提供方"""
+    if name == "stub":
+        return StubProvider()
+    if name == "dashscope":
+        return DashScopeProvider()
+    raise ValueError(f"未知的大模型提供方: {name}")
+
+
+class PreparedChat:
+    """检索和缓存查询完成、可以发给大模型的一次对话"""
+
+    def __init__(
+        self,
+        messages: List[Dict[str, str]],
+        question: str,
+        question_vector: Optional[np.ndarray] = None,
+        context_key: str = "",
+        cached_reply: Optional[str] = None
+    ):
+        """
+        Args:
+            messages: 含系统提示词的完整消息列表
+            question: 最后一条用户消息
+            question_vector: 单轮提问的问题向量（用于写入答案缓存）
+            context_key: 参考文档哈希
+            cached_reply: 答案缓存命中时的回复
+        """
+        self.messages = messages
+        self.question = question
+        self.question_vector = question_vector
+        self.context_key = context_key
+        self.cached_reply = cached_reply
+        # 各阶段耗时（毫秒），用于 Server-Timing 响应头和压测分析
+        self.timings: Dict[str, float] = {}
+
+    async def remember(self, reply: str):
+        """把完整回复写入答案缓存（仅单轮提问）"""
+        if self.question_vector is not None:
+            await answer_cache.put(self.question, self.question_vector, self.context_key, reply)
+
+
+class AIService:
+    """AI聊天服务类"""
+
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        """
+        初始化AI服务
+
+        Args:
+            provider: 大模型提供方，默认按 LLM_PROVIDER 创建
+        """
+        self.provider = provider or create_provider()
+
         # 延迟加载向量数据库（避免启动时加载模型）
         self._vector_store = None
 
@@ -34,7 +300,7 @@ class AIService:
                 self._vector_store = None
         return self._vector_store
 
-    def retrieve_context(self, query: str) -> str:
+    async def retrieve_context(self, query: str) -> str:
         """
         从向量数据库检索相关上下文
 
@@ -49,18 +315,19 @@ class AIService:
                 return ""
 
             # 检索相关文档
-            results = self.vector_store.search(query, n_results=3)
+            results = await self.vector_store.asearch(query, n_results=3)
 
             if not results:
                 return ""
 
-            # 组合检索到的文档
+            # 按参考文档预算截断后组合
+            documents = chat_context.trim_documents([doc["content"] for doc in results])
             context_parts = []
-            for i, doc in enumerate(results, 1):
-                context_parts.append(f"参考文档 {i}:\n{doc['content']}\n")
+            for i, content in enumerate(documents, 1):
+                context_parts.append(f"参考文档 {i}:\n{content}\n")
 
             context = "\n".join(context_parts)
-            logger.info(f"检索到 {len(results)} 个相关文档，总长度: {len(context)}")
+            logger.info(f"检索到 {len(results)} 个相关文档，使用 {len(documents)} 个，总长度: {len(context)}")
 
             return context
 
@@ -68,94 +335,209 @@ class AIService:
             logger.error(f"检索上下文失败: {str(e)}", exc_info=True)
             return ""
 
-    def chat(self, messages: List[Dict[str, str]], stream: bool = False) -> str:
+    async def embed_question(self, messages: List[Dict[str, str]]) -> Optional[np.ndarray]:
         """
-        调用通义千问API进行对话（集成 RAG）
+        单轮提问时返回问题向量（供答案缓存使用），多轮对话或向量库不可用时返回 None
 
-        Args:
-            messages: 对话历史，格式为 [{"role": "user", "content": "..."}, ...]
-            stream: 是否使用流式输出
+        多轮对话的回答依赖前文，不参与答案缓存
+        """
+        if not answer_cache.enabled or len(messages) != 1 or messages[0]["role"] != "user":
+            return None
+        if self.vector_store is None:
+            return None
+        try:
+            # 检索时刚计算过，这里命中查询向量缓存
+            return await self.vector_store.aembed_query(messages[0]["content"])
+        except Exception as e:
+            logger.warning(f"计算问题向量失败，跳过答案缓存: {str(e)}")
+            return None
+
+    async def build_history(
+        self,
+        messages: List[Dict[str, str]],
+        user_id: Optional[int] = None,
+        conversation_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        确定原样发送的对话历史和更早对话的摘要
+
+        已保存的对话以数据库为准：读取摘要之后的消息，加上本次请求的最后一条用户消息（客户端只需发送新问题）。
+        摘要之后、最近 N 轮之前的消息累计满 N 轮时才把它们折叠进摘要，其间原样保留，平均每 N 轮只多一次模型调用。
+        未登录或未保存的对话直接使用客户端发送的历史，不生成摘要，过长的部分由预算裁剪。
 
         Returns:
-            AI的回复内容
+            (原样发送的消息, 摘要)
         """
-        if not settings.DASHSCOPE_API_KEY:
-            return "AI聊天功能未配置，请联系管理员添加 DASHSCOPE_API_KEY"
+        if user_id is None or conversation_id is None:
+            return messages, None
 
+        history, summary = messages, None
         try:
-            # 获取最后一条用户消息
-            last_user_message = ""
-            for msg in reversed(messages):
-                if msg["role"] == "user":
-                    last_user_message = msg["content"]
-                    break
+            stored = await load_history(user_id, conversation_id)
+            if stored is None:
+                return messages, None
+            summary, covered, tail = stored
+            history = tail + [msg for msg in messages[-1:] if msg["role"] == "user"]
 
-            # 从向量数据库检索相关上下文
-            context = self.retrieve_context(last_user_message)
+            recent_start = chat_context.recent_start(history)
+            pending = history[:recent_start]
+            if len(chat_context.turn_starts(pending)) < chat_context.history_turns:
+                return history, summary
 
-            # 构建系统提示词
-            system_content = """你是一个专业的垃圾分类助手和平台向导，具有以下特点和限制：
+            summary = await llm_pool.run(self.provider.complete, chat_context.summary_request(summary, pending))
+            summary = truncate_tokens(summary.strip(), chat_context.summary_tokens)
+            await save_summary(user_id, conversation_id, summary, covered + recent_start)
+            logger.info(f"对话 {conversation_id} 的前 {covered + recent_start} 条消息已折叠为摘要，长度: {len(summary)}")
+            return history[recent_start:], summary
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 摘要失败不影响回答，沿用旧摘要，其余历史由预算裁剪
+            logger.warning(f"生成对话摘要失败: {str(e)}")
+            return history, summary
 
-【你的专业领域】
-1. 垃圾分类知识：可回收物、有害垃圾、厨余垃圾、其他垃圾的分类标准和识别方法
-2. 环保知识：环境保护、资源回收、减少污染、可持续发展等相关内容
-3. 垃圾处理：各类垃圾的正确处理方法、回收流程、注意事项
-4. 平台向导：本垃圾分类识别系统的功能介绍、使用教程、操作指南
+    async def prepare(
+        self,
+        messages: List[Dict[str, str]],
+        user_id: Optional[int] = None,
+        conversation_id: Optional[int] = None
+    ) -> PreparedChat:
+        """
+        检索参考文档、查询答案缓存并按 token 预算构建完整消息列表
 
-【回答原则】
-1. 只回答与垃圾分类、环保、本系统使用相关的问题
-2. 对于无关问题（如编程、数学、历史、娱乐等），礼貌地拒绝并引导用户提问相关话题
-3. 回答要简洁、准确、友好，使用中文
-4. 可以适当科普环保知识，提高用户的环保意识
-5. 当用户询问平台功能时，优先参考下面提供的【参考文档】中的信息，确保准确性
-6. 如果参考文档中没有相关信息，可以基于你的知识回答垃圾分类和环保问题
+        Args:
+            messages: 对话历史，格式为 [{"role": "user", "content": "..."}, ...]；已保存的对话只需最后一条用户消息
+            user_id: 当前用户ID（与 conversation_id 一起用于读取已保存的对话）
+            conversation_id: 已保存的对话ID
+        """
+        # 获取最后一条用户消息
+        last_user_message = ""
+        for msg in reversed(messages):
+            if msg["role"] == "user":
+                last_user_message = msg["content"]
+                break
 
-【拒绝回答示例】
-当用户问"今天天气怎么样"、"帮我写代码"、"1+1等于几"等无关问题时，你应该回复：
-"抱歉，我是专门的垃圾分类助手和平台向导，只能回答垃圾分类、环保和本系统使用相关的问题。您可以问我：
-- 某种物品属于什么垃圾？
-- 如何正确处理某类垃圾？
-- 垃圾分类的标准是什么？
-- 如何使用本系统的识别功能？
-- 平台有哪些功能？
-等等。有什么垃圾分类或平台使用方面的问题我可以帮您解答吗？"
-"""
+        # 从向量数据库检索相关上下文
+        started = time.perf_counter()
+        context = await self.retrieve_context(last_user_message)
+        retrieved = time.perf_counter()
+
+        # 对话历史与摘要
+        history, summary = await self.build_history(messages, user_id, conversation_id)
+        history_loaded = time.perf_counter()
+
+        # 单轮提问先查语义答案缓存（参考文档也必须相同）
+        question_vector = await self.embed_question(history) if summary is None else None
+        context_key = context_hash(context)
+        cached_reply = None
+        if question_vector is not None:
+            cached_reply = await answer_cache.lookup(question_vector, context_key)
+        cache_checked = time.perf_counter()
+
+        # 如果检索到了相关文档，添加到系统提示词中
+        system_content = SYSTEM_PROMPT
+        if context:
+            system_content += f"\n\n【参考文档】\n以下是从项目文档中检索到的相关信息，请优先参考这些内容回答用户问题：\n\n{context}"
 
-            # 如果检索到了相关文档，添加到系统提示词中
-            if context:
-                system_content += f"\n\n【参考文档】\n以下是从项目文档中检索到的相关信息，请优先参考这些内容回答用户问题：\n\n{context}"
-
-            system_message = {
-                "role": "system",
-                "content": system_content
-            }
-
-            # 构建完整的消息列表
-            full_messages = [system_message] + messages
-
-            # 调用通义千问API
-            response = Generation.call(
-                model='qwen-turbo',  # 使用qwen-turbo模型，速度快且免费额度充足
-                messages=full_messages,
-                result_format='message',
-                stream=stream,
-                temperature=0.7,  # 控制回答的创造性
-                max_tokens=1500,  # 最大token数
-            )
-
-            if response.status_code == 200:
-                # 获取AI的回复
-                assistant_message = response.output.choices[0].message.content
-                logger.info(f"AI回复成功，长度: {len(assistant_message)}")
-                return assistant_message
-            else:
-                error_msg = f"API调用失败: {response.code} - {response.message}"
-                logger.error(error_msg)
-                return f"抱歉，AI服务暂时不可用。错误信息: {response.message}"
+        prepared = PreparedChat(
+            messages=chat_context.build(system_content, history, summary),
+            question=last_user_message,
+            question_vector=question_vector,
+            context_key=context_key,
+            cached_reply=cached_reply
+        )
+        prepared.timings.update({
+            "retrieval": (retrieved - started) * 1000,
+            "history": (history_loaded - retrieved) * 1000,
+            "cache": (cache_checked - history_loaded) * 1000,
+            "prompt": (time.perf_counter() - cache_checked) * 1000
+        })
+        return prepared
 
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        timings: Optional[Dict[str, float]] = None,
+        user_id: Optional[int] = None,
+        conversation_id: Optional[int] = None
+    ) -> str:
+        """
+        调用大模型进行对话（集成 RAG）
+
+        Args:
+            messages: 对话历史，格式为 [{"role": "user", "content": "..."}, ...]
+            timings: 可选，传入时写入各阶段耗时（毫秒）
+            user_id: 当前用户ID
+            conversation_id: 已保存的对话ID（从数据库读取历史，读写摘要）
+
+        Returns:
+            AI的回复内容
+        """
+        if not self.provider.configured:
+            return NOT_CONFIGURED_REPLY
+
+        prepared = None
+        try:
+            prepared = await self.prepare(messages, user_id, conversation_id)
+            if prepared.cached_reply is not None:
+                return prepared.cached_reply
+
+            # 在大模型执行器的线程中调用（受并发上限和超时约束），不阻塞事件循环
+            started = time.perf_counter()
+            try:
+                assistant_message = await llm_pool.run(self.provider.complete, prepared.messages)
+            finally:
+                prepared.timings["llm"] = (time.perf_counter() - started) * 1000
+            logger.info(f"AI回复成功，长度: {len(assistant_message)}")
+            await prepared.remember(assistant_message)
+            return assistant_message
+
+        except AIServiceError as e:
+            return f"抱歉，AI服务暂时不可用。错误信息: {str(e)}"
+        except LLMPoolError as e:
+            logger.warning(f"AI聊天请求未完成: {str(e)}")
+            return f"抱歉，{str(e)}"
         except Exception as e:
             logger.error(f"AI聊天服务异常: {str(e)}", exc_info=True)
             return f"抱歉，处理您的请求时出现错误: {str(e)}"
+        finally:
+            if timings is not None and prepared is not None:
+                timings.update(prepared.timings)
+
+    async def stream(self, prepared: PreparedChat) -> AsyncIterator[str]:
+        """
+        流式生成回复，逐段产出新增的文本
+
+        Args:
+            prepared: prepare() 的结果（检索已在第一个字节之前完成）
+
+        Raises:
+            AIServiceError: 大模型接口返回错误
+            LLMPoolError: 并发已满或响应超时
+        """
+        if not self.provider.configured:
+            yield NOT_CONFIGURED_REPLY
+            return
+        if prepared.cached_reply is not None:
+            yield prepared.cached_reply
+            return
+
+        parts = []
+        started = time.perf_counter()
+        # 发起请求和逐段读取都在大模型执行器的线程中进行；调用方停止迭代（客户端断开）时执行器会关闭上游生成器
+        try:
+            async with aclosing(llm_pool.stream(self.provider.stream, prepared.messages)) as deltas:
+                async for delta in deltas:
+                    if not parts:
+                        prepared.timings["first_token"] = (time.perf_counter() - started) * 1000
+                    parts.append(delta)
+                    yield delta
+        finally:
+            prepared.timings["llm"] = (time.perf_counter() - started) * 1000
+
+        reply = "".join(parts)
+        logger.info(f"AI流式回复完成，长度: {len(reply)}")
+        await prepared.remember(reply)
 
 
 # 创建全局AI服务实例
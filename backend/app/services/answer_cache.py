@@ -0,0 +1,298 @@
+"""
+AI 聊天语义答案缓存
+大量提问只是换了说法（"电池是什么垃圾" / "废电池属于哪类垃圾"），没必要每次都调用大模型：
+- 只缓存单轮提问（没有上下文对话历史）的回答
+- 新问题的向量与缓存问题的余弦相似度达到阈值，且检索到的参考文档相同（上下文哈希一致）时直接返回缓存答案
+- 按 TTL 过期、按 LRU 淘汰；管理员可查看和清除条目
+
+条目保存在共享存储（redis_client）中，多进程部署时所有进程共用同一份缓存，管理员的查看和清除对所有进程生效：
+- answer_cache:entry:{id}        条目内容（问题、答案、float16 压缩的问题向量），随 TTL 过期
+- answer_cache:hits:{id}         条目命中次数
+- answer_cache:index             有序集合，成员为条目ID，分数为最近使用时间（LRU 淘汰和列表排序）
+- answer_cache:ctx:{上下文哈希}  有序集合，成员为条目ID，分数为过期时间（查找候选条目）
+进程内只缓存条目的问题向量（条目创建后不变），查找时无需重复读取向量。
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis_client import redis_client
+
+KEY_PREFIX = "answer_cache"
+INDEX_KEY = f"{KEY_PREFIX}:index"
+NEXT_ID_KEY = f"{KEY_PREFIX}:next_id"
+
+
+def context_hash(context: str) -> str:
+    """参考文档内容的哈希（知识库更新后旧答案自动失配）"""
+    return hashlib.sha1(context.encode("utf-8")).hexdigest()
+
+
+def _entry_key(entry_id) -> str:
+    return f"{KEY_PREFIX}:entry:{entry_id}"
+
+
+def _hits_key(entry_id) -> str:
+    return f"{KEY_PREFIX}:hits:{entry_id}"
+
+
+def _context_key(context_key: str) -> str:
+    return f"{KEY_PREFIX}:ctx:{context_key}"
+
+
+class AnswerCache:
+    """语义答案缓存类"""
+
+    def __init__(
+        self,
+        max_entries: int = settings.ANSWER_CACHE_SIZE,
+        ttl: int = settings.ANSWER_CACHE_TTL,
+        threshold: float = settings.ANSWER_CACHE_THRESHOLD
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多缓存的答案数（所有进程共享），0 表示禁用
+            ttl: 答案有效秒数
+            threshold: 命中所需的最低余弦相似度
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # 条目ID -> 归一化后的问题向量（本进程读取过的条目）
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "purged": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    @staticmethod
+    def _encode_vector(vector: np.ndarray) -> str:
+        return base64.b64encode(vector.astype(np.float16).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode_vector(encoded: str) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(encoded), dtype=np.float16).astype(np.float32)
+
+    def _record(self, field: str, count: int = 1):
+        with self._lock:
+            self._stats[field] += count
+
+    def _remember_vector(self, entry_id: str, vector: np.ndarray):
+        with self._lock:
+            self._vectors[entry_id] = vector
+            self._vectors.move_to_end(entry_id)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def _forget_vectors(self, entry_ids: List[str]):
+        with self._lock:
+            for entry_id in entry_ids:
+                self._vectors.pop(entry_id, None)
+
+    async def _load_entries(self, entry_ids: List[str]) -> Dict[str, Dict]:
+        """批量读取条目内容，已过期或已清除的条目不在结果中"""
+        if not entry_ids:
+            return {}
+        values = await redis_client.mget([_entry_key(entry_id) for entry_id in entry_ids])
+        return {entry_id: json.loads(value) for entry_id, value in zip(entry_ids, values) if value is not None}
+
+    async def _remove(self, entries: Dict[str, Optional[Dict]]):
+        """删除条目及其索引（entries: {条目ID: 条目内容或 None}）"""
+        if not entries:
+            return
+        await redis_client.delete(*[_entry_key(entry_id) for entry_id in entries], *[_hits_key(entry_id) for entry_id in entries])
+        for entry_id, entry in entries.items():
+            await redis_client.zrem(INDEX_KEY, entry_id)
+            if entry is not None:
+                await redis_client.zrem(_context_key(entry["context_key"]), entry_id)
+        self._forget_vectors(list(entries))
+
+    async def lookup(self, vector: np.ndarray, context_key: str) -> Optional[str]:
+        """
+        查找语义相近且参考文档相同的已缓存答案
+
+        Args:
+            vector: 问题的嵌入向量
+            context_key: 参考文档哈希（context_hash 的结果）
+
+        Returns:
+            缓存的答案，未命中或存储不可用时返回 None
+        """
+        if not self.enabled:
+            return None
+        query = self._normalize(vector)
+        try:
+            now = time.time()
+            candidate_ids = [
+                entry_id for entry_id, _ in
+                await redis_client.zrangebyscore(_context_key(context_key), now, "+inf")
+            ]
+            with self._lock:
+                missing = [entry_id for entry_id in candidate_ids if entry_id not in self._vectors]
+            loaded = await self._load_entries(missing)
+            for entry_id, entry in loaded.items():
+                self._remember_vector(entry_id, self._decode_vector(entry["vector"]))
+
+            with self._lock:
+                candidates = [(entry_id, self._vectors[entry_id]) for entry_id in candidate_ids if entry_id in self._vectors]
+            best_id = None
+            if candidates:
+                scores = np.stack([candidate for _, candidate in candidates]) @ query
+                index = int(np.argmax(scores))
+                if scores[index] >= self.threshold:
+                    best_id = candidates[index][0]
+
+            entry = None
+            if best_id is not None:
+                entry = loaded.get(best_id) or (await self._load_entries([best_id])).get(best_id)
+                if entry is None:
+                    # 已被淘汰或清除
+                    await redis_client.zrem(_context_key(context_key), best_id)
+                    self._forget_vectors([best_id])
+            if entry is None:
+                self._record("misses")
+                return None
+
+            await redis_client.incr(_hits_key(best_id))
+            await redis_client.expire(_hits_key(best_id), self.ttl)
+            await redis_client.zadd(INDEX_KEY, {best_id: now})
+        except Exception as e:
+            logger.warning(f"读取答案缓存失败: {str(e)}")
+            self._record("errors")
+            return None
+
+        self._record("hits")
+        logger.info(f"答案缓存命中: '{entry['question']}'（相似度 {float(scores[index]):.3f}）")
+        return entry["answer"]
+
+    async def put(self, question: str, vector: np.ndarray, context_key: str, answer: str):
+        """缓存答案，超出容量时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+        vector = self._normalize(vector)
+        try:
+            entry_id = str(await redis_client.incr(NEXT_ID_KEY))
+            now = time.time()
+            entry = {
+                "question": question,
+                "answer": answer,
+                "context_key": context_key,
+                "vector": self._encode_vector(vector),
+                "created_at": datetime.now().isoformat(timespec="seconds")
+            }
+            await redis_client.set(_entry_key(entry_id), json.dumps(entry, ensure_ascii=False), ex=self.ttl)
+            ctx_key = _context_key(context_key)
+            await redis_client.zadd(ctx_key, {entry_id: now + self.ttl})
+            await redis_client.zremrangebyscore(ctx_key, "-inf", now)
+            await redis_client.expire(ctx_key, self.ttl)
+            await redis_client.zadd(INDEX_KEY, {entry_id: now})
+            self._remember_vector(entry_id, vector)
+            self._record("stores")
+
+            excess = await redis_client.zcount(INDEX_KEY, "-inf", "+inf") - self.max_entries
+            if excess > 0:
+                victims = [entry_id for entry_id, _ in await redis_client.zrangebyscore(INDEX_KEY, "-inf", "+inf", 0, excess)]
+                await self._remove({**dict.fromkeys(victims), **await self._load_entries(victims)})
+                self._record("evictions", len(victims))
+        except Exception as e:
+            logger.warning(f"写入答案缓存失败: {str(e)}")
+            self._record("errors")
+
+    async def _live_entries(self) -> List[Dict]:
+        """按最近使用顺序读取全部未过期条目，顺带清理已过期条目的索引"""
+        entry_ids = [entry_id for entry_id, _ in reversed(await redis_client.zrangebyscore(INDEX_KEY, "-inf", "+inf"))]
+        entries = await self._load_entries(entry_ids)
+        expired = [entry_id for entry_id in entry_ids if entry_id not in entries]
+        if expired:
+            await self._remove(dict.fromkeys(expired))
+            self._record("expired", len(expired))
+        return [{"id": int(entry_id), **entries[entry_id]} for entry_id in entry_ids if entry_id in entries]
+
+    async def list_entries(self, keyword: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """按最近使用顺序列出条目（管理员查看）"""
+        entries = [
+            entry for entry in await self._live_entries()
+            if keyword is None or keyword in entry["question"]
+        ][:limit]
+        hits = await redis_client.mget([_hits_key(entry["id"]) for entry in entries]) if entries else []
+        return [
+            {
+                "id": entry["id"],
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "hits": int(count or 0),
+                "created_at": entry["created_at"]
+            }
+            for entry, count in zip(entries, hits)
+        ]
+
+    async def purge(self, entry_id: Optional[int] = None, keyword: Optional[str] = None, all_entries: bool = False) -> int:
+        """
+        清除条目（对所有进程生效）
+
+        Args:
+            entry_id: 只清除该条目
+            keyword: 清除问题中包含该关键字的条目（不能为空字符串）
+            all_entries: 清空全部条目（必须显式指定）
+
+        Returns:
+            清除的条目数
+
+        Raises:
+            ValueError: 未指定清除条件或关键字为空
+        """
+        if keyword is not None and not keyword.strip():
+            raise ValueError("关键字不能为空")
+        if entry_id is None and keyword is None and not all_entries:
+            raise ValueError("请指定条目ID、关键字，或显式指定清空全部")
+
+        if entry_id is not None:
+            removed = await self._load_entries([str(entry_id)])
+        else:
+            removed = {
+                str(entry["id"]): entry for entry in await self._live_entries()
+                if all_entries or keyword in entry["question"]
+            }
+        await self._remove(removed)
+        self._record("purged", len(removed))
+        logger.info(f"已清除 {len(removed)} 条答案缓存")
+        return len(removed)
+
+    async def stats(self) -> Dict:
+        """缓存命中统计（条目数为所有进程共享的数量，命中统计为本进程的计数）"""
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            entries = await redis_client.zcount(INDEX_KEY, "-inf", "+inf")
+        except Exception as e:
+            logger.warning(f"读取答案缓存条目数失败: {str(e)}")
+            entries = None
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            **stats,
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+
+# 全局答案缓存实例
+answer_cache = AnswerCache()
@@ -0,0 +1,190 @@
+"""
+AI 聊天上下文构建 - 按 token 预算组装发给大模型的消息
+- 参考文档按检索排名依次放入，超出文档预算的部分截断或丢弃
+- 最近 N 轮对话原样保留，更早的对话折叠为滚动摘要（保存在对话记录中，每 N 轮才重新生成一次）
+- 已保存的对话从 chat_messages 表读取历史，只读取摘要之后的消息
+- 整体超出预算时从最早的消息开始丢弃，最后一条用户消息始终保留
+
+token 数按通义千问分词的经验值估算（中文约一字一个 token，英文约四个字符一个 token），不调用分词接口。
+"""
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import ChatConversation, ChatMessage
+
+# 估算 token 的分词：中文按字，英文和数字按词，其余非空白字符各算一个
+TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]|[A-Za-z0-9_]+|\S")
+
+# 每条消息的格式开销（角色标记等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 生成摘要时的提示词
+SUMMARY_PROMPT = (
+    "你负责压缩对话历史。请把【已有摘要】和【新增对话】合并为一段简洁的中文摘要，"
+    "保留用户关心的物品、问题、已经给出的结论和用户的偏好，省略寒暄和重复内容。只输出摘要本身。"
+)
+
+
+def _token_length(token: str) -> int:
+    if len(token) > 1:
+        return math.ceil(len(token) / 4)
+    return 1
+
+
+def count_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    return sum(_token_length(token) for token in TOKEN_PATTERN.findall(text))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """截断文本到 token 预算以内"""
+    used = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        used += _token_length(match.group())
+        if used > budget:
+            return text[:match.start()].rstrip() + "…"
+    return text
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ChatContextBuilder:
+    """聊天上下文构建类"""
+
+    def __init__(
+        self,
+        max_tokens: int = settings.CHAT_CONTEXT_MAX_TOKENS,
+        doc_tokens: int = settings.CHAT_CONTEXT_DOC_TOKENS,
+        history_turns: int = settings.CHAT_HISTORY_TURNS,
+        summary_tokens: int = settings.CHAT_SUMMARY_MAX_TOKENS
+    ):
+        """
+        Args:
+            max_tokens: 发给大模型的消息总预算（系统提示词 + 参考文档 + 摘要 + 对话）
+            doc_tokens: 参考文档的预算
+            history_turns: 原样保留的最近对话轮数，0 表示不折叠历史
+            summary_tokens: 历史摘要的最大长度
+        """
+        self.max_tokens = max_tokens
+        self.doc_tokens = doc_tokens
+        self.history_turns = history_turns
+        self.summary_tokens = summary_tokens
+
+    def trim_documents(self, documents: List[str]) -> List[str]:
+        """按检索排名放入参考文档，超出预算时截断最后一篇并丢弃其余"""
+        kept = []
+        remaining = self.doc_tokens
+        for document in documents:
+            if remaining <= 0:
+                break
+            tokens = count_tokens(document)
+            if tokens > remaining:
+                document = truncate_tokens(document, remaining)
+                tokens = remaining
+            kept.append(document)
+            remaining -= tokens
+        return kept
+
+    @staticmethod
+    def turn_starts(messages: List[Dict[str, str]]) -> List[int]:
+        """每轮对话（以用户消息开始）的起始下标"""
+        return [i for i, msg in enumerate(messages) if msg["role"] == "user"]
+
+    def recent_start(self, messages: List[Dict[str, str]]) -> int:
+        """最近 N 轮对话的起始下标（不足 N 轮时为 0）"""
+        starts = self.turn_starts(messages)
+        if self.history_turns <= 0 or len(starts) <= self.history_turns:
+            return 0
+        return starts[-self.history_turns]
+
+    def summary_request(self, summary: Optional[str], messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """生成滚动摘要的消息列表"""
+        role_names = {"user": "用户", "assistant": "助手"}
+        dialogue = "\n".join(f"{role_names.get(msg['role'], msg['role'])}：{msg['content']}" for msg in messages)
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"【已有摘要】\n{summary or '无'}\n\n【新增对话】\n{dialogue}"}
+        ]
+
+    def build(
+        self,
+        system_content: str,
+        history: List[Dict[str, str]],
+        summary: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        组装最终的消息列表，整体超出预算时从最早的对话开始丢弃
+
+        Args:
+            system_content: 系统提示词（已含参考文档）
+            history: 原样保留的对话消息
+            summary: 更早对话的摘要
+        """
+        if summary:
+            system_content += f"\n\n【对话摘要】\n以下是本次对话更早内容的摘要：\n{summary}"
+        system = {"role": "system", "content": system_content}
+        remaining = self.max_tokens - message_tokens(system)
+
+        kept = []
+        for msg in reversed(history):
+            tokens = message_tokens(msg)
+            if tokens > remaining:
+                if not kept:
+                    # 最后一条消息本身超出预算时截断保留
+                    kept.append({**msg, "content": truncate_tokens(msg["content"], max(remaining - MESSAGE_OVERHEAD_TOKENS, 1))})
+                break
+            kept.append(msg)
+            remaining -= tokens
+        kept.reverse()
+
+        # 不以助手消息开头（丢弃到一半的轮次）
+        while len(kept) > 1 and kept[0]["role"] != "user":
+            kept.pop(0)
+        return [system] + kept
+
+
+async def load_history(user_id: int, conversation_id: int) -> Optional[Tuple[Optional[str], int, List[Dict[str, str]]]]:
+    """
+    读取已保存对话的历史摘要和摘要之后的消息
+
+    Returns:
+        (摘要, 摘要覆盖的消息数, 之后的消息列表)，对话不存在时返回 None
+    """
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(ChatConversation.summary, ChatConversation.summary_message_count).where(
+                ChatConversation.id == conversation_id,
+                ChatConversation.user_id == user_id
+            )
+        )).one_or_none()
+        if row is None:
+            return None
+        covered = row.summary_message_count or 0
+        result = await db.execute(
+            select(ChatMessage.role, ChatMessage.content)
+            .where(ChatMessage.conversation_id == conversation_id)
+            .order_by(ChatMessage.id)
+            .offset(covered)
+        )
+        messages = [{"role": role, "content": content} for role, content in result]
+    return row.summary, covered, messages
+
+
+async def save_summary(user_id: int, conversation_id: int, summary: str, message_count: int):
+    """保存对话的历史摘要（不改变对话的更新时间）"""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(ChatConversation)
+            .where(ChatConversation.id == conversation_id, ChatConversation.user_id == user_id)
+            .values(summary=summary, summary_message_count=message_count, updated_at=ChatConversation.updated_at)
+        )
+        await db.commit()
+
+
+# 全局聊天上下文构建实例
+chat_context = ChatContextBuilder()
@@ -0,0 +1,89 @@
+"""
+类别名称索引
+将分类搜索文本解析为 predicted_class_id 集合，使查询可以使用 id 列上的索引，
+取代 predicted_class LIKE '%xxx%' 的全表扫描
+"""
+import os
+from typing import Dict, Set
+from app.core.config import settings
+from app.core.logger import logger
+
+
+def load_class_names() -> Dict[int, str]:
+    """
+    加载类别名称映射（类别ID从0开始，对应 classname.txt 的第1行）
+
+    Returns:
+        {class_id: class_name}
+    """
+    class_names_file = os.path.join(os.path.dirname(__file__), '../../ml_models/classname.txt')
+
+    # 如果文件不存在，尝试从项目根目录加载
+    if not os.path.exists(class_names_file):
+        class_names_file = os.path.join(os.path.dirname(__file__), '../../../classname.txt')
+
+    if os.path.exists(class_names_file):
+        try:
+            with open(class_names_file, 'r', encoding='utf-8') as f:
+                return {i: line.strip() for i, line in enumerate(f.readlines())}
+        except Exception as e:
+            logger.error(f"加载类别名称失败: {str(e)}")
+    else:
+        logger.warning(f"类别名称文件不存在: {class_names_file}")
+
+    # 使用默认名称
+    return {i: f"垃圾类别_{i}" for i in range(settings.NUM_CLASSES)}
+
+
+class ClassNameIndex:
+    """基于 n-gram 倒排表的类别名称子串索引"""
+
+    def __init__(self, class_names: Dict[int, str]):
+        """
+        构建索引
+
+        Args:
+            class_names: {class_id: class_name}
+        """
+        self.class_names = {class_id: name.lower() for class_id, name in class_names.items()}
+        self.unigrams: Dict[str, Set[int]] = {}
+        self.bigrams: Dict[str, Set[int]] = {}
+
+        for class_id, name in self.class_names.items():
+            for i, char in enumerate(name):
+                self.unigrams.setdefault(char, set()).add(class_id)
+                if i + 1 < len(name):
+                    self.bigrams.setdefault(name[i:i + 2], set()).add(class_id)
+
+    def search(self, text: str) -> Set[int]:
+        """
+        查找名称中包含 text 的所有类别（语义等同于 LIKE '%text%'）
+
+        Args:
+            text: 搜索文本
+
+        Returns:
+            匹配的类别ID集合
+        """
+        query = text.strip().lower()
+        if not query:
+            return set(self.class_names)
+
+        if len(query) == 1:
+            return set(self.unigrams.get(query, set()))
+
+        # 候选集为所有 bigram 倒排表的交集，再逐个校验子串
+        candidates = None
+        for i in range(len(query) - 1):
+            postings = self.bigrams.get(query[i:i + 2])
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+
+        return {class_id for class_id in candidates if query in self.class_names[class_id]}
+
+
+# 全局类别名称索引
+class_index = ClassNameIndex(load_class_names())
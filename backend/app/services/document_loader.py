@@ -1,8 +1,12 @@
 """
 文档加载和分割工具
 """
+import glob
+import hashlib
 import os
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List
+from sqlalchemy import inspect, select, table, column
+from app.core.config import settings
 from app.core.logger import logger
 
 
@@ -30,12 +34,13 @@ class DocumentLoader:
             return ""
 
     @staticmethod
-    def load_multiple_files(file_paths: List[str]) -> List[Dict[str, str]]:
+    def load_multiple_files(file_paths: List[str], base_dir: str = None) -> List[Dict[str, str]]:
         """
         加载多个文件
 
         Args:
             file_paths: 文件路径列表
+            base_dir: 基准目录，提供时 source 记录为相对路径（不随部署目录变化）
 
         Returns:
             文档列表，每个文档包含 content 和 source
@@ -44,12 +49,66 @@ class DocumentLoader:
         for file_path in file_paths:
             content = DocumentLoader.load_markdown(file_path)
             if content:
+                source = os.path.relpath(file_path, base_dir).replace(os.sep, '/') if base_dir else file_path
                 documents.append({
                     'content': content,
-                    'source': file_path
+                    'source': source
                 })
         return documents
 
+    @staticmethod
+    def iter_knowledge_articles(engine, batch_size: int = 500) -> Iterator[Dict[str, str]]:
+        """
+        逐篇读取旧系统 knowledge 表中已发布的文章（服务端游标分批拉取）
+        knowledge 表没有对应的 ORM 模型，由 scripts/migrate_knowledge.py 维护，按实际列读取；
+        只在 RAG_INCLUDE_KNOWLEDGE_TABLE 开启时由 iter_knowledge_base 调用，表不存在时记录错误并不产出
+
+        Args:
+            engine: 同步数据库引擎
+            batch_size: 每次从数据库拉取的行数
+
+        Yields:
+            文档，包含 content 和 source（knowledge/文章ID）
+        """
+        try:
+            if not inspect(engine).has_table('knowledge'):
+                logger.error("已开启 RAG_INCLUDE_KNOWLEDGE_TABLE，但数据库中没有 knowledge 表，跳过知识文章")
+                return
+
+            columns = {col['name'] for col in inspect(engine).get_columns('knowledge')}
+            knowledge = table('knowledge', *[column(name) for name in columns])
+            query = select(knowledge.c.id, knowledge.c.title, knowledge.c.content)
+            if 'is_published' in columns:
+                query = query.where(knowledge.c.is_published == True)
+
+            count = 0
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                    query.order_by(knowledge.c.id)
+                )
+                for article_id, title, content in result:
+                    if content:
+                        count += 1
+                        yield {'content': f"# {title}\n\n{content}", 'source': f"knowledge/{article_id}"}
+        except Exception as e:
+            logger.error(f"加载知识文章失败: {str(e)}")
+            return
+
+        logger.info(f"成功加载 {count} 篇知识文章")
+
+    @staticmethod
+    def load_knowledge_articles(engine) -> List[Dict[str, str]]:
+        """
+        加载旧系统 knowledge 表中已发布的文章（表不存在时返回空列表）
+
+        Args:
+            engine: 同步数据库引擎
+
+        Returns:
+            文档列表，每个文档包含 content 和 source（knowledge/文章ID）
+        """
+        return list(DocumentLoader.iter_knowledge_articles(engine))
+
 
 class TextSplitter:
     """文本分割器"""
@@ -126,19 +185,17 @@ class TextSplitter:
 
         return sections
 
-    def split_documents(self, documents: List[Dict[str, str]], by_section: bool = True) -> List[Dict]:
+    def iter_chunks(self, documents: Iterable[Dict[str, str]], by_section: bool = True) -> Iterator[Dict]:
         """
-        分割多个文档
+        逐个文档分割并产出文档块（不在内存中累积整个语料）
 
         Args:
-            documents: 文档列表
+            documents: 文档列表或生成器
             by_section: 是否按章节分割（否则按字符数分割）
 
-        Returns:
-            分割后的文档块列表
+        Yields:
+            文档块，包含 id、content、metadata
         """
-        all_chunks = []
-
         for doc in documents:
             content = doc['content']
             source = doc['source']
@@ -149,52 +206,96 @@ class TextSplitter:
             else:
                 chunks = self.split_text(content)
 
-            # 为每个块添加元数据
+            # 为每个块添加元数据，块ID由来源和内容哈希决定（内容不变则ID不变）
+            seen = set()
             for i, chunk in enumerate(chunks):
-                all_chunks.append({
+                content_hash = hashlib.sha1(chunk.encode('utf-8')).hexdigest()
+                chunk_key = make_chunk_key(source, content_hash)
+                if chunk_key in seen:
+                    # 同一文档中内容完全相同的块只保留一个
+                    continue
+                seen.add(chunk_key)
+                yield {
+                    'id': chunk_key,
                     'content': chunk,
                     'metadata': {
                         'source': source,
                         'chunk_id': i,
-                        'total_chunks': len(chunks)
+                        'total_chunks': len(chunks),
+                        'content_hash': content_hash
                     }
-                })
+                }
 
+    def split_documents(self, documents: List[Dict[str, str]], by_section: bool = True) -> List[Dict]:
+        """
+        分割多个文档
+
+        Args:
+            documents: 文档列表
+            by_section: 是否按章节分割（否则按字符数分割）
+
+        Returns:
+            分割后的文档块列表
+        """
+        all_chunks = list(self.iter_chunks(documents, by_section=by_section))
         logger.info(f"文档分割完成，共 {len(all_chunks)} 个块")
         return all_chunks
 
 
-def prepare_knowledge_base(project_root: str) -> List[Dict]:
+def make_chunk_key(source: str, content_hash: str) -> str:
+    """由来源路径和内容哈希生成稳定的文档块ID"""
+    source_hash = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return f"{source_hash}-{content_hash[:20]}"
+
+
+def iter_knowledge_base(project_root: str, engine=None) -> Iterator[Dict]:
     """
-    准备知识库文档
+    逐块产出知识库文档：README.md、docs/*.md 以及（开启 RAG_INCLUDE_KNOWLEDGE_TABLE 时）knowledge 表中已发布的文章
+    文档按需读取和分割，适合大规模语料的流式导入
 
     Args:
         project_root: 项目根目录
+        engine: 数据库引擎（可选，开启 RAG_INCLUDE_KNOWLEDGE_TABLE 且提供时加载 knowledge 表中的文章）
 
-    Returns:
-        处理后的文档块列表
+    Yields:
+        文档块（包含 id、content、metadata）
     """
     # 要加载的文档列表
-    doc_files = [
-        os.path.join(project_root, 'README.md'),
-        # 可以添加更多文档
-        # os.path.join(project_root, 'docs', '开发方案.md'),
-        # os.path.join(project_root, 'docs', '快速启动指南.md'),
-    ]
+    doc_files = [os.path.join(project_root, 'README.md')]
+    doc_files += sorted(glob.glob(os.path.join(project_root, 'docs', '*.md')))
 
     # 过滤存在的文件
     existing_files = [f for f in doc_files if os.path.exists(f)]
 
-    if not existing_files:
-        logger.warning("未找到任何文档文件")
-        return []
-
-    # 加载文档
     loader = DocumentLoader()
-    documents = loader.load_multiple_files(existing_files)
-
-    # 分割文档
+    documents = (
+        doc
+        for file_path in existing_files
+        for doc in loader.load_multiple_files([file_path], base_dir=project_root)
+    )
+    include_articles = engine is not None and settings.RAG_INCLUDE_KNOWLEDGE_TABLE
+    articles = loader.iter_knowledge_articles(engine) if include_articles else iter(())
+
+    # 分割文档：Markdown 文档按章节，知识文章按字符数
     splitter = TextSplitter(chunk_size=800, chunk_overlap=100)
-    chunks = splitter.split_documents(documents, by_section=True)
+    yield from splitter.iter_chunks(documents, by_section=True)
+    yield from splitter.iter_chunks(articles, by_section=False)
+
+
+def prepare_knowledge_base(project_root: str, engine=None) -> List[Dict]:
+    """
+    准备知识库文档：README.md、docs/*.md 以及（开启 RAG_INCLUDE_KNOWLEDGE_TABLE 时）knowledge 表中已发布的文章
 
+    Args:
+        project_root: 项目根目录
+        engine: 数据库引擎（可选，开启 RAG_INCLUDE_KNOWLEDGE_TABLE 且提供时加载 knowledge 表中的文章）
+
+    Returns:
+        处理后的文档块列表（每块包含 id、content、metadata）
+    """
+    chunks = list(iter_knowledge_base(project_root, engine=engine))
+    if not chunks:
+        logger.warning("未找到任何文档文件")
+    else:
+        logger.info(f"文档分割完成，共 {len(chunks)} 个块")
     return chunks
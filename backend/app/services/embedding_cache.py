@@ -0,0 +1,138 @@
+"""
+查询向量缓存
+缓存 RAG 检索时查询文本的嵌入向量，重复提问（如"电池是什么垃圾"）无需再跑一次嵌入模型
+
+- 查询文本先规范化（全半角、大小写、空白、句末标点），同义写法命中同一条缓存
+- 进程内 LRU 保存 float32 向量；可选 Redis 二级缓存以 float16 压缩存储，多进程共享
+"""
+import base64
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis_client import redis_client
+
+# 规范化时去掉的句末标点
+TRAILING_PUNCTUATION = "?？!！.。~～…"
+
+
+class EmbeddingCache:
+    """查询向量缓存类"""
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = settings.EMBEDDING_CACHE_SIZE,
+        use_redis: bool = settings.EMBEDDING_CACHE_REDIS,
+        ttl: int = settings.EMBEDDING_CACHE_TTL
+    ):
+        """
+        初始化缓存
+
+        Args:
+            namespace: 缓存命名空间（嵌入模型名称，换模型后旧向量自动失效）
+            max_entries: 进程内最多缓存的向量数，0 表示禁用
+            use_redis: 是否启用 Redis 二级缓存
+            ttl: Redis 中向量的保存秒数
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.use_redis = use_redis
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "redis_hits": 0, "misses": 0}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化查询文本"""
+        text = unicodedata.normalize("NFKC", text).casefold()
+        text = re.sub(r"\s+", " ", text).strip()
+        return text.rstrip(TRAILING_PUNCTUATION).strip()
+
+    def _record(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _redis_key(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"embedding:{self.namespace}:{digest}"
+
+    def get_local(self, key: str) -> Optional[np.ndarray]:
+        """从进程内缓存读取（key 为规范化后的文本）"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+        return vector
+
+    def put_local(self, key: str, vector: np.ndarray):
+        """写入进程内缓存"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, key: str) -> Optional[np.ndarray]:
+        """只查进程内缓存并计数（同步调用方使用）"""
+        vector = self.get_local(key)
+        self._record("hits" if vector is not None else "misses")
+        return vector
+
+    async def get(self, key: str) -> Optional[np.ndarray]:
+        """依次查询进程内缓存和 Redis 缓存"""
+        vector = self.get_local(key)
+        if vector is not None:
+            self._record("hits")
+            return vector
+
+        if self.use_redis:
+            try:
+                cached = await redis_client.get(self._redis_key(key))
+                if cached is not None:
+                    vector = np.frombuffer(base64.b64decode(cached), dtype=np.float16).astype(np.float32)
+                    self.put_local(key, vector)
+                    self._record("redis_hits")
+                    return vector
+            except Exception as e:
+                logger.warning(f"读取 Redis 查询向量缓存失败: {str(e)}")
+
+        self._record("misses")
+        return None
+
+    async def put(self, key: str, vector: np.ndarray):
+        """写入进程内缓存和 Redis 缓存"""
+        self.put_local(key, vector)
+        if self.use_redis:
+            try:
+                encoded = base64.b64encode(vector.astype(np.float16).tobytes()).decode("ascii")
+                await redis_client.set(self._redis_key(key), encoded, ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"写入 Redis 查询向量缓存失败: {str(e)}")
+
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        total = stats["hits"] + stats["redis_hits"] + stats["misses"]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "redis_enabled": self.use_redis,
+            **stats,
+            "hit_ratio": round((stats["hits"] + stats["redis_hits"]) / total, 4) if total else 0.0
+        }
@@ -0,0 +1,101 @@
+"""
+反馈全文检索
+SQLite 下使用 FTS5（trigram 分词，支持中文子串）索引反馈备注和正确类别，
+其他数据库或关键词过短时退回 LIKE 查询
+"""
+from sqlalchemy import text, or_, literal_column, select
+from sqlalchemy.engine import Engine
+from app.core.logger import logger
+from app.models.database import Feedback
+
+FTS_TABLE = "feedbacks_fts"
+
+# trigram 分词器的最短可匹配长度
+MIN_FTS_QUERY_LENGTH = 3
+
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        comment, correct_class,
+        content='feedbacks', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedbacks_fts_ai AFTER INSERT ON feedbacks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, comment, correct_class)
+        VALUES (new.id, new.comment, new.correct_class);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedbacks_fts_ad AFTER DELETE ON feedbacks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, comment, correct_class)
+        VALUES ('delete', old.id, old.comment, old.correct_class);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedbacks_fts_au AFTER UPDATE OF comment, correct_class ON feedbacks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, comment, correct_class)
+        VALUES ('delete', old.id, old.comment, old.correct_class);
+        INSERT INTO {FTS_TABLE}(rowid, comment, correct_class)
+        VALUES (new.id, new.comment, new.correct_class);
+    END""",
+]
+
+
+class FeedbackSearch:
+    """反馈检索服务类"""
+
+    def __init__(self):
+        self.fts_enabled = False
+
+    def setup(self, engine: Engine):
+        """
+        创建 FTS5 索引表及同步触发器（应用启动时调用）
+
+        Args:
+            engine: 同步数据库引擎
+        """
+        if engine.dialect.name != "sqlite":
+            return
+
+        try:
+            with engine.begin() as conn:
+                exists = conn.execute(
+                    text("SELECT name FROM sqlite_master WHERE type='table' AND name=:name"),
+                    {"name": FTS_TABLE}
+                ).first()
+                if not exists:
+                    for ddl in FTS_DDL:
+                        conn.execute(text(ddl))
+                    # 为已有反馈建立索引
+                    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+                    logger.info("已创建反馈全文索引")
+                else:
+                    for ddl in FTS_DDL[1:]:
+                        conn.execute(text(ddl))
+            self.fts_enabled = True
+        except Exception as e:
+            # SQLite 版本过低（trigram 需要 3.34+）时退回 LIKE 查询
+            logger.warning(f"反馈全文索引不可用，将使用 LIKE 查询: {str(e)}")
+            self.fts_enabled = False
+
+    def keyword_filter(self, keyword: str):
+        """
+        生成按关键词筛选反馈的查询条件
+
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+            可用于 query.filter() 的条件表达式
+        """
+        keyword = keyword.strip()
+        if self.fts_enabled and len(keyword) >= MIN_FTS_QUERY_LENGTH:
+            # 作为短语整体匹配，转义其中的双引号
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            matched_ids = (
+                select(literal_column("rowid"))
+                .select_from(text(FTS_TABLE))
+                .where(text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=phrase))
+            )
+            return Feedback.id.in_(matched_ids)
+
+        pattern = f"%{keyword}%"
+        return or_(Feedback.comment.like(pattern), Feedback.correct_class.like(pattern))
+
+
+# 全局反馈检索实例
+feedback_search = FeedbackSearch()
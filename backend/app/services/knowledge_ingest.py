@@ -0,0 +1,287 @@
+"""
+RAG 知识库增量导入
+文档块ID由来源路径和内容哈希决定，导入时与向量库现有内容对比：
+只为新增/修改的块生成向量，删除已不存在的块，未变化的块不做任何处理。
+清单文件（manifest.json）记录上次导入的块集合和嵌入模型，内容未变化时无需访问向量库即可确认。
+
+文档块以流的方式处理：新增的块攒满一批就编码并写入，内存中只保留块ID和当前批次。
+导入中断后重新运行，已写入的批次在向量库中已有对应ID，会被直接跳过（断点续传）；
+NumPy 后端在同步期间按检查点写盘（见 numpy_index.py），进程被强制终止时只需重新编码最后一个检查点之后的批次。
+
+服务启动时在后台做一次完整性检查：按当前文档计算期望的块集合（只读文件和算哈希，不加载嵌入模型），
+与清单和向量库对比，一致时什么也不做，不一致时才在后台增量重建索引。
+多进程部署（gunicorn -w N）时通过向量库目录下的文件锁保证只有一个进程执行检查和重建，其余进程只报告状态。
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.document_loader import iter_knowledge_base
+from app.services.vector_store import VectorStore, vector_store, EMBEDDING_MODEL_NAME
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境为单进程运行，无需跨进程锁
+    fcntl = None
+
+MANIFEST_FILE = "manifest.json"
+
+# 启动检查/重建的跨进程锁文件
+LOCK_FILE = ".reindex.lock"
+
+# 项目根目录（services -> app -> backend -> 项目根目录）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+class KnowledgeIngestor:
+    """知识库增量导入类"""
+
+    def __init__(self, store: VectorStore = vector_store):
+        """
+        Args:
+            store: 目标向量数据库
+        """
+        self.store = store
+        self.manifest_path = os.path.join(store.persist_directory, MANIFEST_FILE)
+        self.lock_path = os.path.join(store.persist_directory, LOCK_FILE)
+        self._task: Optional[asyncio.Task] = None
+        self._last_check: Optional[Dict] = None
+
+    @staticmethod
+    def build_manifest(entries: Dict[str, Dict]) -> Dict:
+        """
+        生成清单
+
+        Args:
+            entries: {块ID: {"source": 来源, "content_hash": 内容哈希}}
+        """
+        return {
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "chunks": entries
+        }
+
+    @staticmethod
+    def manifest_entry(chunk: Dict) -> Dict:
+        """文档块在清单中的记录"""
+        return {
+            "source": chunk["metadata"]["source"],
+            "content_hash": chunk["metadata"]["content_hash"]
+        }
+
+    def load_manifest(self) -> Optional[Dict]:
+        """读取上次导入的清单，不存在或损坏时返回 None"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"知识库清单读取失败，将与向量库逐一对比: {str(e)}")
+            return None
+
+    def save_manifest(self, manifest: Dict):
+        """原子写入清单"""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_up_to_date(self, chunk_ids: Iterable[str], manifest: Optional[Dict] = None) -> bool:
+        """清单与期望的块集合一致，且向量库中的文档数与清单一致"""
+        manifest = manifest if manifest is not None else self.load_manifest()
+        if not manifest or manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+            return False
+        expected = set(chunk_ids)
+        if set(manifest.get("chunks", {})) != expected:
+            return False
+        return self.store.get_count() == len(expected)
+
+    def sync(
+        self,
+        chunks: Iterable[Dict],
+        rebuild: bool = False,
+        batch_size: int = settings.VECTOR_UPSERT_BATCH_SIZE,
+        workers: int = settings.EMBEDDING_WORKERS
+    ) -> Dict[str, int]:
+        """
+        将向量库同步为给定的文档块集合
+
+        Args:
+            chunks: 文档块列表或生成器（iter_knowledge_base 的结果），只遍历一次
+            rebuild: 是否清空后全量重建
+            batch_size: 每批编码和写入的块数
+            workers: 并行编码的进程数，0 或 1 表示在当前进程中编码
+
+        Returns:
+            {"added": 新增块数, "deleted": 删除块数, "unchanged": 未变化块数}
+        """
+        manifest = self.load_manifest()
+
+        if manifest and manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+            # 换了嵌入模型，旧向量不可复用
+            logger.info(f"嵌入模型已变更（{manifest.get('embedding_model')} -> {EMBEDDING_MODEL_NAME}），全量重建")
+            rebuild = True
+
+        if rebuild:
+            self.store.clear()
+            existing = set()
+        else:
+            existing = set(self.store.get_ids())
+
+        entries: Dict[str, Dict] = {}
+        batch: List[Dict] = []
+        added = 0
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            # NumPy 后端的各批次先写入内存，只在检查点和同步结束时写盘
+            stack.enter_context(self.store.bulk_write())
+            pool = None
+            pool_started = False
+
+            def flush():
+                nonlocal added, pool, pool_started
+                if not pool_started:
+                    # 第一次有新块需要编码时才启动编码进程，无变化时不加载模型
+                    pool = stack.enter_context(self.store.multi_process_pool(workers))
+                    pool_started = True
+                self.store.upsert_batch(
+                    documents=[chunk["content"] for chunk in batch],
+                    metadatas=[chunk["metadata"] for chunk in batch],
+                    ids=[chunk["id"] for chunk in batch],
+                    pool=pool
+                )
+                added += len(batch)
+                batch.clear()
+                elapsed = time.perf_counter() - started
+                logger.info(f"已写入 {added} 个新文档块（已扫描 {len(entries)} 个，{added / elapsed:.1f} 块/秒）")
+
+            for chunk in chunks:
+                if chunk["id"] in entries:
+                    continue
+                entries[chunk["id"]] = self.manifest_entry(chunk)
+                if chunk["id"] in existing:
+                    continue
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+
+            to_delete = sorted(existing - set(entries))
+            self.store.delete(to_delete)
+
+        if added or to_delete or not self.is_up_to_date(entries, manifest):
+            self.save_manifest(self.build_manifest(entries))
+
+        result = {
+            "added": added,
+            "deleted": len(to_delete),
+            "unchanged": len(entries) - added
+        }
+        if added or to_delete:
+            logger.info(f"知识库同步完成: 新增 {result['added']}，删除 {result['deleted']}，未变化 {result['unchanged']}")
+        else:
+            logger.info(f"知识库无变化（{len(entries)} 个文档块）")
+        return result
+
+
+    @contextmanager
+    def exclusive(self):
+        """
+        尝试获取跨进程的重建锁（非阻塞），产出是否获取成功
+
+        锁随文件描述符关闭或进程退出自动释放，进程异常退出不会留下死锁。
+        """
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def check(self, project_root: str = PROJECT_ROOT, engine=None) -> Dict:
+        """
+        启动完整性检查：期望的块集合与清单、向量库一致时直接返回，否则增量重建
+
+        从未初始化过知识库（没有清单）时不自动导入，保持"不运行 init_rag.py 即不启用 RAG"的约定。
+        其他进程正在检查或重建时直接返回，不重复扫描文档、不并发写向量库和清单。
+
+        Returns:
+            {"status": "up_to_date" | "reindexed" | "not_initialized" | "no_documents" | "skipped", ...}
+        """
+        with self.exclusive() as acquired:
+            if not acquired:
+                logger.info("其他进程正在检查 RAG 知识库，本进程跳过启动检查")
+                return {"status": "skipped", "reason": "locked_by_other_process"}
+            return self._check(project_root, engine)
+
+    def _check(self, project_root: str, engine) -> Dict:
+        started = time.perf_counter()
+        manifest = self.load_manifest()
+        if manifest is None:
+            logger.info("RAG 知识库尚未初始化（没有清单文件），跳过启动检查")
+            return {"status": "not_initialized"}
+
+        chunk_ids = [chunk["id"] for chunk in iter_knowledge_base(project_root, engine=engine)]
+        if not chunk_ids:
+            # 文档目录不可用时不清空已有索引
+            logger.warning("启动检查未找到任何知识库文档，保留现有向量库")
+            return {"status": "no_documents"}
+
+        if self.is_up_to_date(chunk_ids, manifest):
+            logger.info(f"RAG 知识库与清单一致（{len(chunk_ids)} 个文档块），无需重建")
+            return {"status": "up_to_date", "chunks": len(chunk_ids)}
+
+        logger.info("RAG 知识库与文档不一致，开始后台增量重建")
+        result = self.sync(iter_knowledge_base(project_root, engine=engine))
+        return {"status": "reindexed", **result, "seconds": round(time.perf_counter() - started, 1)}
+
+    async def start(self, engine=None):
+        """在后台执行启动检查（应用启动时调用，不阻塞启动）"""
+        if self._task is None and settings.RAG_STARTUP_CHECK:
+            self._task = asyncio.create_task(self._run_check(engine))
+
+    async def _run_check(self, engine):
+        try:
+            result = await asyncio.to_thread(self.check, PROJECT_ROOT, engine)
+        except Exception as e:
+            logger.error(f"RAG 知识库启动检查失败: {str(e)}", exc_info=True)
+            result = {"status": "failed", "error": str(e)}
+        self._last_check = {"time": datetime.now().isoformat(timespec="seconds"), **result}
+
+    async def stop(self):
+        """停止等待启动检查（线程中进行的导入会在当前批次结束后随进程退出）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        """最近一次启动检查结果"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "last_check": self._last_check
+        }
+
+
+# 全局知识库导入实例
+knowledge_ingestor = KnowledgeIngestor()
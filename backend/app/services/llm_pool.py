@@ -0,0 +1,210 @@
+"""
+大模型调用执行器
+DashScope SDK 是同步的，一次回复可能要几秒到几十秒。所有大模型调用都经过这里：
+- 在专用的有界线程池中执行，不阻塞事件循环，也不占用默认线程池（检索和数据库访问在用）
+- 全局并发上限，超出时排队，排队超时直接拒绝（保护上游 API 配额）
+- 整体调用超时和流式输出的逐段超时
+- 调用方被取消（客户端断开）时立即返回；线程中的请求结束后才释放并发名额，上限始终如实
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Optional
+from app.core.config import settings
+from app.core.logger import logger
+
+# 流式迭代结束标记
+_END = object()
+
+
+class LLMPoolError(Exception):
+    """大模型调用被拒绝或超时"""
+    pass
+
+
+class LLMBusyError(LLMPoolError):
+    """排队等待并发名额超时"""
+    pass
+
+
+class LLMTimeoutError(LLMPoolError):
+    """大模型响应超时"""
+    pass
+
+
+class LLMPool:
+    """大模型调用执行器类"""
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        queue_timeout: float = settings.LLM_QUEUE_TIMEOUT,
+        call_timeout: float = settings.LLM_TIMEOUT,
+        stream_timeout: float = settings.LLM_STREAM_IDLE_TIMEOUT
+    ):
+        """
+        初始化执行器
+
+        Args:
+            max_concurrency: 同时进行的大模型调用上限（也是线程数）
+            queue_timeout: 等待并发名额的最长秒数
+            call_timeout: 一次调用（流式时为首段输出）的最长秒数
+            stream_timeout: 流式输出两段之间的最长间隔秒数
+        """
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.stream_timeout = stream_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._stats = {
+            "completed": 0, "failed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0,
+            "peak_active": 0, "peak_waiting": 0
+        }
+        self._total_run = 0.0
+
+    async def _acquire(self):
+        """等待并发名额，超时拒绝"""
+        with self._lock:
+            self._waiting += 1
+            self._stats["peak_waiting"] = max(self._stats["peak_waiting"], self._waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise LLMBusyError("AI服务繁忙，请稍后再试")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._active += 1
+            self._stats["peak_active"] = max(self._stats["peak_active"], self._active)
+
+    def _release_later(self, loop: asyncio.AbstractEventLoop, started: float, outcome: Dict):
+        """返回在线程中释放名额的回调（请求真正结束后才释放）"""
+        def release(future: Optional[Future] = None):
+            result = outcome.get("result")
+            if result is None:
+                # 线程中的回调可能先于事件循环记录结果执行，此时按任务本身的结果计数
+                failed = future is not None and (future.cancelled() or future.exception() is not None)
+                result = "failed" if failed else "completed"
+            with self._lock:
+                self._active -= 1
+                self._total_run += time.perf_counter() - started
+                self._stats[result] += 1
+            try:
+                loop.call_soon_threadsafe(self._semaphore.release)
+            except RuntimeError:
+                # 事件循环已关闭（应用退出中）
+                pass
+        return release
+
+    async def _wait(self, future: Future, timeout: float, outcome: Dict):
+        """等待线程中的结果，超时或被取消时记录原因"""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            outcome["result"] = "timeouts"
+            raise LLMTimeoutError("AI服务响应超时，请稍后再试")
+        except asyncio.CancelledError:
+            outcome["result"] = "cancelled"
+            raise
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """在线程池中执行一次大模型调用"""
+        loop = asyncio.get_running_loop()
+        await self._acquire()
+        outcome: Dict = {}
+        release = self._release_later(loop, time.perf_counter(), outcome)
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            release()
+            raise
+        future.add_done_callback(release)
+
+        return await self._wait(future, self.call_timeout, outcome)
+
+    async def stream(self, func: Callable, *args, **kwargs) -> AsyncIterator:
+        """
+        在线程池中执行返回同步迭代器的大模型调用，逐段产出结果
+
+        调用方停止迭代（包括客户端断开导致的取消）时关闭上游迭代器，结束 HTTP 连接
+        """
+        loop = asyncio.get_running_loop()
+        await self._acquire()
+        outcome: Dict = {}
+        release = self._release_later(loop, time.perf_counter(), outcome)
+        iterator = None
+        pending: Optional[Future] = None
+        try:
+            pending = self._executor.submit(func, *args, **kwargs)
+            iterator = await self._wait(pending, self.call_timeout, outcome)
+            timeout = self.call_timeout
+            while True:
+                pending = self._executor.submit(next, iterator, _END)
+                item = await self._wait(pending, timeout, outcome)
+                if item is _END:
+                    break
+                yield item
+                timeout = self.stream_timeout
+            pending = None
+            outcome["result"] = "completed"
+        except GeneratorExit:
+            outcome.setdefault("result", "cancelled")
+            raise
+        except Exception:
+            outcome.setdefault("result", "failed")
+            raise
+        finally:
+            self._close_stream(iterator, pending, release)
+
+    def _close_stream(self, iterator, pending: Optional[Future], release: Callable):
+        """关闭上游迭代器并释放名额（迭代器正在线程中执行时，等该步结束后再关闭）"""
+        def close(future: Optional[Future] = None):
+            target = iterator
+            if target is None and future is not None and not future.cancelled() and future.exception() is None:
+                # 调用本身还没返回时被取消，关闭它最终返回的迭代器
+                target = future.result()
+            try:
+                if target is not None and hasattr(target, "close"):
+                    target.close()
+            except Exception as e:
+                logger.warning(f"关闭大模型流式输出失败: {str(e)}")
+            finally:
+                release()
+
+        if pending is not None and not pending.done():
+            pending.add_done_callback(close)
+            return
+        try:
+            self._executor.submit(close, pending)
+        except RuntimeError:
+            # 线程池已关闭（应用退出中）
+            close(pending)
+
+    def stats(self) -> Dict:
+        """执行器运行指标"""
+        with self._lock:
+            finished = sum(self._stats[key] for key in ("completed", "failed", "timeouts", "cancelled"))
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "waiting": self._waiting,
+                **self._stats,
+                "avg_run_ms": round(self._total_run / finished * 1000, 2) if finished else 0.0
+            }
+
+    def shutdown(self):
+        """关闭线程池（应用关闭时调用，不等待仍在进行的请求）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局大模型调用执行器
+llm_pool = LLMPool()
@@ -1,13 +1,15 @@
 """
 模型推理服务
 """
+import asyncio
 import torch
 import torch.nn as nn
 from torchvision import transforms, models
 from PIL import Image
-import os
 from typing import List, Tuple
 from app.core.config import settings
+from app.services.class_index import load_class_names
+from app.services.resource_manager import resource_manager
 
 
 class ModelService:
@@ -15,14 +17,19 @@ class ModelService:
 
     def __init__(self):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model = None
         self.transform = None
         self.class_names = None
-        self._load_model()
+        # 模型权重在首次识别时加载，计入进程内存预算
+        resource_manager.register(
+            "classifier",
+            self._load_model,
+            idle_timeout=settings.CLASSIFIER_IDLE_TIMEOUT,
+            estimated_mb=100
+        )
         self._setup_transform()
         self._load_class_names()
 
-    def _load_model(self):
+    def _load_model(self) -> nn.Module:
         """加载模型"""
         print(f"加载模型: {settings.MODEL_PATH}")
 
@@ -38,8 +45,8 @@ class ModelService:
         model = model.to(self.device)
         model.eval()
 
-        self.model = model
         print(f"模型加载成功，使用设备: {self.device}")
+        return model
 
     def _setup_transform(self):
         """设置图像预处理"""
@@ -53,28 +60,9 @@ class ModelService:
         ])
 
     def _load_class_names(self):
-        """加载类别名称映射"""
-        class_names_file = os.path.join(os.path.dirname(__file__), '../../ml_models/classname.txt')
-
-        # 如果文件不存在，尝试从项目根目录加载
-        if not os.path.exists(class_names_file):
-            class_names_file = os.path.join(os.path.dirname(__file__), '../../../classname.txt')
-
-        if os.path.exists(class_names_file):
-            try:
-                with open(class_names_file, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                    # 类别ID从0开始，对应文件的第1行
-                    self.class_names = {i: line.strip() for i, line in enumerate(lines)}
-                print(f"成功加载 {len(self.class_names)} 个类别名称")
-            except Exception as e:
-                print(f"加载类别名称失败: {str(e)}")
-                # 使用默认名称
-                self.class_names = {i: f"垃圾类别_{i}" for i in range(settings.NUM_CLASSES)}
-        else:
-            print(f"类别名称文件不存在: {class_names_file}")
-            # 使用默认名称
-            self.class_names = {i: f"垃圾类别_{i}" for i in range(settings.NUM_CLASSES)}
+        """加载类别名称映射（与类别名称索引共用同一份数据）"""
+        self.class_names = load_class_names()
+        print(f"成功加载 {len(self.class_names)} 个类别名称")
 
     def predict(self, image_path: str) -> Tuple[int, float, List[dict]]:
         """
@@ -93,8 +81,8 @@ class ModelService:
         image_tensor = self.transform(image).unsqueeze(0).to(self.device)
 
         # 推理
-        with torch.no_grad():
-            outputs = self.model(image_tensor)
+        with torch.no_grad(), resource_manager.use("classifier") as model:
+            outputs = model(image_tensor)
             probabilities = torch.nn.functional.softmax(outputs, dim=1)
 
         # 获取Top-3结果
@@ -118,6 +106,14 @@ class ModelService:
 
         return predicted_class_id, predicted_confidence, top3_results
 
+    async def apredict(self, image_path: str) -> Tuple[int, float, List[dict]]:
+        """
+        在线程中预测单张图片（异步路由使用）
+
+        空闲卸载后的首次识别需要重新加载模型，读图、加载和推理都不能阻塞事件循环
+        """
+        return await asyncio.to_thread(self.predict, image_path)
+
     def get_class_name(self, class_id: int) -> str:
         """获取类别名称"""
         return self.class_names.get(class_id, f"类别_{class_id}")
@@ -0,0 +1,230 @@
+"""
+模型统计汇总服务
+
+所有模型对比/性能/准确率统计都由一次按 model_name 分组、使用 SUM(CASE ...) 的聚合查询完成，
+并物化到 model_stats 汇总表中：
+- 以识别记录ID为水位线增量汇总，每次只聚合水位线之后的新记录
+- 最近 SETTLE_SECONDS 内的记录可能仍有未提交的并发事务，不写入汇总表，读取时实时聚合补齐；
+  多个进程批量写入时 ID 与 created_at 的先后不一定一致，水位线只推进到最早一条未稳定记录之前
+- 每个进程最多每 REFRESH_INTERVAL 秒刷新一次汇总表，其余读取只做水位线之后的实时聚合
+- 删除识别记录时同步扣减汇总数据（ORM 删除自动扣减，归档分区中的删除由分区服务扣减；归档迁移不扣减，统计仍覆盖已归档数据）
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+from sqlalchemy import event, func, case, select, update
+from sqlalchemy.orm import Session
+from app.core.logger import logger
+from app.models.database import Prediction, ModelStat, SummaryWatermark
+
+WATERMARK_NAME = "model_stats"
+
+# 新记录在写入汇总表前的等待秒数，保证水位线之前的事务都已提交
+SETTLE_SECONDS = 10
+
+# 读取统计时刷新汇总表的最小间隔秒数（每个进程）
+REFRESH_INTERVAL = 60
+
+# 置信度区间（与 /api/stats/accuracy 的统计口径一致，区间左闭右开）
+CONFIDENCE_BUCKETS = [
+    ("90-100%", "bucket_90", 90, 100),
+    ("80-90%", "bucket_80", 80, 90),
+    ("70-80%", "bucket_70", 70, 80),
+    ("60-70%", "bucket_60", 60, 70),
+    ("0-60%", "bucket_0", 0, 60),
+]
+
+COUNTER_FIELDS = ["total", "confidence_sum", "high_count", "low_count"] + [
+    field for _, field, _, _ in CONFIDENCE_BUCKETS
+]
+
+
+def _count_if(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+
+def aggregate_by_model(db: Session, *conditions) -> Dict[str, Dict]:
+    """
+    一次分组聚合查询统计各模型的识别数据
+
+    Args:
+        db: 数据库会话
+        conditions: 附加筛选条件
+
+    Returns:
+        {model_name: {total, confidence_sum, high_count, ..., max_id}}
+    """
+    confidence = Prediction.confidence
+    model_name = func.coalesce(Prediction.model_name, "")
+    columns = [
+        model_name.label("model_name"),
+        func.count(Prediction.id).label("total"),
+        func.coalesce(func.sum(confidence), 0).label("confidence_sum"),
+        _count_if(confidence >= 80).label("high_count"),
+        _count_if(confidence < 60).label("low_count"),
+    ] + [
+        _count_if((confidence >= low) & (confidence < high)).label(field)
+        for _, field, low, high in CONFIDENCE_BUCKETS
+    ] + [
+        func.max(Prediction.id).label("max_id")
+    ]
+
+    rows = db.execute(select(*columns).where(*conditions).group_by(model_name)).mappings().all()
+    return {
+        row["model_name"]: {field: row[field] or 0 for field in COUNTER_FIELDS + ["max_id"]}
+        for row in rows
+    }
+
+
+def bucket_field(confidence: float) -> str:
+    """返回置信度所在区间对应的汇总字段，不在任何区间时返回 None"""
+    for _, field, low, high in CONFIDENCE_BUCKETS:
+        if low <= confidence < high:
+            return field
+    return None
+
+
+class ModelStatsService:
+    """模型统计汇总服务类"""
+
+    def __init__(self):
+        self._refreshed_at = 0.0
+
+    def _get_watermark(self, db: Session) -> int:
+        return db.scalar(
+            select(SummaryWatermark.last_id).where(SummaryWatermark.name == WATERMARK_NAME)
+        ) or 0
+
+    def refresh(self, db: Session):
+        """
+        将水位线之后、已稳定的新记录增量汇总到 model_stats
+
+        新水位线不超过最早一条未稳定记录的 ID，ID 较小但仍在等待期内的记录留到下次汇总。
+        多进程同时刷新时，通过对水位线的比较更新保证只有一个进程的汇总生效。
+        """
+        self._refreshed_at = time.monotonic()
+        watermark = self._get_watermark(db)
+        settled_before = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+        conditions = [Prediction.id > watermark]
+        first_unsettled = db.scalar(
+            select(func.min(Prediction.id)).where(
+                Prediction.id > watermark,
+                Prediction.created_at >= settled_before
+            )
+        )
+        if first_unsettled is not None:
+            conditions.append(Prediction.id < first_unsettled)
+        deltas = aggregate_by_model(db, *conditions)
+        if not deltas:
+            return
+
+        new_watermark = max(values["max_id"] for values in deltas.values())
+        try:
+            if watermark == 0 and db.get(SummaryWatermark, WATERMARK_NAME) is None:
+                db.add(SummaryWatermark(name=WATERMARK_NAME, last_id=new_watermark))
+                db.flush()
+            else:
+                result = db.execute(
+                    update(SummaryWatermark)
+                    .where(SummaryWatermark.name == WATERMARK_NAME, SummaryWatermark.last_id == watermark)
+                    .values(last_id=new_watermark)
+                )
+                if result.rowcount == 0:
+                    # 其他进程已完成本轮汇总
+                    db.rollback()
+                    return
+
+            existing = {
+                stat.model_name: stat
+                for stat in db.query(ModelStat).filter(ModelStat.model_name.in_(list(deltas))).all()
+            }
+            for model_name, values in deltas.items():
+                stat = existing.get(model_name)
+                if stat is None:
+                    db.add(ModelStat(model_name=model_name, **{f: values[f] for f in COUNTER_FIELDS}))
+                else:
+                    for field in COUNTER_FIELDS:
+                        setattr(stat, field, getattr(stat, field) + values[field])
+
+            db.commit()
+            logger.info(f"模型统计汇总已更新至识别记录 #{new_watermark}")
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"模型统计汇总更新失败: {str(e)}")
+
+    def get_stats(self, db: Session) -> Dict[str, Dict]:
+        """
+        获取各模型的最新统计（汇总表 + 水位线之后的实时聚合）
+
+        Returns:
+            {model_name: {total, confidence_sum, high_count, low_count, bucket_*}}
+        """
+        if time.monotonic() - self._refreshed_at > REFRESH_INTERVAL:
+            self.refresh(db)
+
+        stats = {
+            stat.model_name: {field: getattr(stat, field) for field in COUNTER_FIELDS}
+            for stat in db.query(ModelStat).all()
+        }
+        tail = aggregate_by_model(db, Prediction.id > self._get_watermark(db))
+        for model_name, values in tail.items():
+            merged = stats.setdefault(model_name, {field: 0 for field in COUNTER_FIELDS})
+            for field in COUNTER_FIELDS:
+                merged[field] += values[field]
+        return stats
+
+    @staticmethod
+    def combine(stats: List[Dict]) -> Dict:
+        """合并多个模型的统计"""
+        combined = {field: 0 for field in COUNTER_FIELDS}
+        for values in stats:
+            for field in COUNTER_FIELDS:
+                combined[field] += values[field]
+        return combined
+
+
+# 全局模型统计汇总服务实例
+model_stats_service = ModelStatsService()
+
+
+def decrement_deleted(connection, rows: Iterable):
+    """
+    扣减已计入汇总表的被删除记录（rows 需有 id、confidence、model_name 属性，在删除的事务中调用）
+
+    ORM 删除由 after_flush 事件自动调用；归档分区中的记录用 Core 语句删除，由分区服务显式调用。
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    watermark = connection.execute(
+        select(SummaryWatermark.last_id).where(SummaryWatermark.name == WATERMARK_NAME)
+    ).scalar() or 0
+
+    for row in rows:
+        if row.id is None or row.id > watermark:
+            continue
+        values = {
+            "total": ModelStat.total - 1,
+            "confidence_sum": ModelStat.confidence_sum - row.confidence,
+        }
+        if row.confidence >= 80:
+            values["high_count"] = ModelStat.high_count - 1
+        if row.confidence < 60:
+            values["low_count"] = ModelStat.low_count - 1
+        field = bucket_field(row.confidence)
+        if field:
+            values[field] = getattr(ModelStat, field) - 1
+
+        connection.execute(
+            update(ModelStat)
+            .where(ModelStat.model_name == (row.model_name or ""))
+            .values(**values)
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _decrement_deleted_predictions(session, flush_context):
+    """通过 ORM 删除识别记录时，扣减已计入汇总表的统计"""
+    deleted = [obj for obj in session.deleted if isinstance(obj, Prediction)]
+    if deleted:
+        decrement_deleted(session.connection(), deleted)
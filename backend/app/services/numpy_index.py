@@ -0,0 +1,335 @@
+"""
+NumPy 向量索引 - 中小规模知识库的 ChromaDB 替代后端
+- 向量归一化后保存为 .npy 矩阵，以内存映射方式打开，启动时不读入整个文件
+- 文档ID、正文和元数据保存在 JSON 附属文件中，与矩阵按行对应
+- 检索为一次矩阵-向量乘积（余弦相似度）后取 top-k；超过设定规模时建立 IVF 分区，只扫描最近的若干个分区
+
+对外提供与 ChromaDB 集合相同的 upsert / query / get / delete / count 接口，VectorStore 无需区分后端。
+
+每次写入都要重写整个矩阵文件，大批量导入时应放在 batch() 中：
+改动先记在内存中的工作副本里，累计改动达到已保存的行数时才写盘一次（检查点），退出时再写盘一次。
+每次写盘的数据量随索引规模倍增，整次导入的写盘总量与文档数成线性关系；中断后已写盘的部分仍可续传。
+批量写入期间的改动在写盘前对检索不可见。
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.logger import logger
+
+VECTORS_FILE = "vectors.npy"
+ITEMS_FILE = "items.json"
+
+# 检索时每次转换为 float32 计算的行数（float16 矩阵乘法没有 BLAS 加速）
+SCAN_BLOCK_ROWS = 8192
+
+# IVF 聚类迭代次数与每个分区的训练样本数
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 256
+
+# 批量写入时两次检查点之间至少累计的改动行数
+CHECKPOINT_MIN_ROWS = 10000
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化（零向量保持为零）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class IVFPartition:
+    """倒排文件分区：球面 k-means 聚类中心 + 每个分区的行号列表"""
+
+    def __init__(self, vectors: np.ndarray, nlist: int, seed: int = 0):
+        """
+        Args:
+            vectors: 已归一化的向量矩阵
+            nlist: 分区数
+            seed: 随机种子（保证同样的数据得到同样的分区）
+        """
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        sample_size = min(n, nlist * KMEANS_SAMPLES_PER_LIST)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(nlist):
+                members = sample[assignment == i]
+                if len(members):
+                    centroids[i] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        self.centroids = centroids
+        assignment = np.concatenate([
+            np.argmax(np.asarray(vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32) @ centroids.T, axis=1)
+            for start in range(0, n, SCAN_BLOCK_ROWS)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """与查询最接近的 nprobe 个分区中的全部行号"""
+        nprobe = min(nprobe, len(self.lists))
+        nearest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([self.lists[i] for i in nearest]))
+
+
+class NumpyIndex:
+    """NumPy 向量索引类"""
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: str = "float16",
+        ivf_threshold: int = 20000,
+        nprobe: int = 8
+    ):
+        """
+        打开（或创建）索引
+
+        Args:
+            directory: 索引文件目录
+            dtype: 向量存储精度（float16 / float32）
+            ivf_threshold: 文档数达到该值后启用 IVF 分区检索，0 表示始终精确检索
+            nprobe: IVF 检索时扫描的分区数
+        """
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._ivf: Optional[IVFPartition] = None
+        # 批量写入的嵌套层数和尚未写盘的工作副本
+        self._batch_depth = 0
+        self._pending: Optional[Dict] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    @property
+    def items_path(self) -> str:
+        return os.path.join(self.directory, ITEMS_FILE)
+
+    def _load(self):
+        """以内存映射方式打开向量矩阵并读取附属文件"""
+        if os.path.exists(self.vectors_path) and os.path.exists(self.items_path):
+            with open(self.items_path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+            # 空索引不做内存映射（长度为 0 的映射在部分平台上会失败）
+            vectors = np.load(self.vectors_path, mmap_mode="r") if items["ids"] else np.empty((0, 0), dtype=self.dtype)
+            if len(vectors) != len(items["ids"]):
+                raise ValueError(f"向量索引已损坏：{len(vectors)} 行向量与 {len(items['ids'])} 个文档ID不一致")
+        else:
+            items = {"ids": [], "documents": [], "metadatas": []}
+            vectors = np.empty((0, 0), dtype=self.dtype)
+
+        self._vectors = vectors
+        self._ids: List[str] = items["ids"]
+        self._documents: List[str] = items["documents"]
+        self._metadatas: List[Dict] = items["metadatas"]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._ivf = None
+
+    def _save(self, vectors: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        """原子写入矩阵和附属文件后重新打开（调用方持有锁）"""
+        vectors_tmp = f"{self.vectors_path}.tmp"
+        items_tmp = f"{self.items_path}.tmp"
+        with open(vectors_tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=self.dtype))
+        with open(items_tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f, ensure_ascii=False)
+        # 先释放旧的内存映射（Windows 上被映射的文件不能替换）
+        self._vectors = None
+        os.replace(vectors_tmp, self.vectors_path)
+        os.replace(items_tmp, self.items_path)
+        self._load()
+
+    def count(self) -> int:
+        """文档数量"""
+        return len(self._ids)
+
+    @contextmanager
+    def batch(self):
+        """
+        批量写入：期间的 upsert / delete 只在检查点写盘，退出时（包括异常退出）保存剩余改动
+
+        Example:
+            with index.batch():
+                for ids, embeddings, documents in batches:
+                    index.upsert(ids=ids, embeddings=embeddings, documents=documents)
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._flush()
+
+    def _working_copy(self) -> Dict:
+        """尚未写盘的工作副本，不存在时从当前索引复制（调用方持有锁）"""
+        if self._pending is None:
+            self._pending = {
+                # 可写的 float32 矩阵（内存映射是只读的），容量按倍数扩容，rows 之后的行未使用
+                "vectors": np.array(self._vectors, dtype=np.float32) if self.count() else None,
+                "rows": self.count(),
+                "ids": list(self._ids),
+                "documents": list(self._documents),
+                "metadatas": list(self._metadatas),
+                "positions": dict(self._positions),
+                "changed": 0
+            }
+        return self._pending
+
+    def _checkpoint(self):
+        """不在批量写入中时立即写盘；批量写入中累计改动达到已保存的行数时写盘一次（调用方持有锁）"""
+        if self._pending is None:
+            return
+        if self._batch_depth and self._pending["changed"] < max(self.count(), CHECKPOINT_MIN_ROWS):
+            return
+        self._flush()
+
+    def _flush(self):
+        """保存工作副本并丢弃（调用方持有锁）"""
+        work, self._pending = self._pending, None
+        if work is None or not work["changed"]:
+            return
+        rows = work["rows"]
+        self._save(
+            work["vectors"][:rows] if rows else np.empty((0, 0), dtype=self.dtype),
+            work["ids"], work["documents"], work["metadatas"]
+        )
+
+    def upsert(self, ids: List[str], embeddings: List, documents: List[str], metadatas: Optional[List[Dict]] = None):
+        """写入文档，ID 已存在时覆盖"""
+        new_vectors = normalize_rows(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            work = self._working_copy()
+            vectors = work["vectors"]
+            if vectors is None:
+                vectors = np.empty((0, new_vectors.shape[1]), dtype=np.float32)
+            elif vectors.shape[1] != new_vectors.shape[1]:
+                raise ValueError(f"向量维度不一致：索引为 {vectors.shape[1]}，写入为 {new_vectors.shape[1]}")
+
+            all_ids, all_documents, all_metadatas = work["ids"], work["documents"], work["metadatas"]
+            positions = work["positions"]
+            appended = []
+            for row, doc_id in enumerate(ids):
+                position = positions.get(doc_id)
+                if position is None:
+                    positions[doc_id] = len(all_ids)
+                    all_ids.append(doc_id)
+                    all_documents.append(documents[row])
+                    all_metadatas.append(metadatas[row])
+                    appended.append(row)
+                else:
+                    vectors[position] = new_vectors[row]
+                    all_documents[position] = documents[row]
+                    all_metadatas[position] = metadatas[row]
+            if appended:
+                rows = work["rows"]
+                needed = rows + len(appended)
+                if needed > len(vectors):
+                    grown = np.empty((max(needed, 2 * len(vectors)), vectors.shape[1]), dtype=np.float32)
+                    grown[:rows] = vectors[:rows]
+                    vectors = grown
+                vectors[rows:needed] = new_vectors[appended]
+                work["rows"] = needed
+            work["vectors"] = vectors
+            work["changed"] += len(ids)
+            self._checkpoint()
+
+    def add(self, ids: List[str], embeddings: List, documents: List[str], metadatas: Optional[List[Dict]] = None):
+        """写入文档（与 upsert 相同）"""
+        self.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: List[str]):
+        """按ID删除文档"""
+        with self._lock:
+            if self._pending is None and not any(doc_id in self._positions for doc_id in ids):
+                return
+            work = self._working_copy()
+            remove = {work["positions"][doc_id] for doc_id in ids if doc_id in work["positions"]}
+            if remove:
+                keep = [i for i in range(work["rows"]) if i not in remove]
+                work["vectors"] = work["vectors"][keep] if keep else None
+                work["rows"] = len(keep)
+                for field in ("ids", "documents", "metadatas"):
+                    work[field] = [work[field][i] for i in keep]
+                work["positions"] = {doc_id: i for i, doc_id in enumerate(work["ids"])}
+                work["changed"] += len(remove)
+            self._checkpoint()
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict:
+        """按ID读取文档（不提供 ids 时返回全部）"""
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            positions = range(self.count()) if ids is None else \
+                [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+            result = {"ids": [self._ids[i] for i in positions]}
+            if "documents" in include:
+                result["documents"] = [self._documents[i] for i in positions]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[i] for i in positions]
+        return result
+
+    def _partition(self) -> Optional[IVFPartition]:
+        """达到规模阈值时（首次检索时）建立 IVF 分区"""
+        n = self.count()
+        if self.ivf_threshold <= 0 or n < self.ivf_threshold:
+            return None
+        if self._ivf is None:
+            with self._lock:
+                if self._ivf is None:
+                    nlist = max(1, int(np.sqrt(n)))
+                    logger.info(f"为 {n} 个向量建立 IVF 分区（{nlist} 个分区）")
+                    self._ivf = IVFPartition(self._vectors, nlist)
+        return self._ivf
+
+    def _scores(self, vectors: np.ndarray, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """分块计算余弦相似度"""
+        total = len(vectors) if rows is None else len(rows)
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SCAN_BLOCK_ROWS):
+            block = vectors[start:start + SCAN_BLOCK_ROWS] if rows is None else vectors[rows[start:start + SCAN_BLOCK_ROWS]]
+            scores[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ query
+        return scores
+
+    def query(self, query_embeddings: List, n_results: int = 10, include: Optional[List[str]] = None) -> Dict:
+        """
+        检索最相似的文档
+
+        Returns:
+            与 ChromaDB 相同的结构，distances 为余弦距离（1 - 余弦相似度）
+        """
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            vectors, ids, documents, metadatas = self._vectors, self._ids, self._documents, self._metadatas
+            partition = self._partition()
+
+        for query in normalize_rows(query_embeddings):
+            rows = partition.candidates(query, self.nprobe) if partition is not None else None
+            scores = self._scores(vectors, rows, query) if len(ids) else np.empty(0, dtype=np.float32)
+            k = min(n_results, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+            top = top[np.argsort(-scores[top])]
+            positions = top if rows is None else rows[top]
+
+            result["ids"].append([ids[i] for i in positions])
+            result["documents"].append([documents[i] for i in positions])
+            result["metadatas"].append([metadatas[i] for i in positions])
+            result["distances"].append([float(1.0 - scores[i]) for i in top])
+        return result
@@ -0,0 +1,490 @@
+"""
+识别记录按月分区与归档服务
+
+热数据保存在 predictions 表中，超过保留期的整月数据迁移到按月分区：
+- PostgreSQL: 原生分区表 predictions_archive（PARTITION BY RANGE created_at），每月一个分区
+- SQLite: 每月一张独立的表 predictions_YYYYMM
+
+迁移时同时写出一份 gzip 压缩的 JSON Lines 冷备份。
+查询通过 prediction_source() 获取实体，时间范围跨越热/冷边界时自动 UNION ALL 相关分区。
+异步路由通过 aget_partitions() 用请求的会话加载分区登记信息，不阻塞事件循环。
+"""
+import os
+import gzip
+import json
+import time
+import shutil
+from collections import OrderedDict, defaultdict
+from types import SimpleNamespace
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+from sqlalchemy import (
+    Table, Column, MetaData, Index, PrimaryKeyConstraint,
+    select, insert, delete, func, text, union_all
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from app.core.config import settings
+from app.core.database import engine, SessionLocal
+from app.core.logger import logger
+from app.models.database import Prediction, PredictionPartition, Feedback
+from app.services.model_stats import decrement_deleted
+
+# 归档表使用独立的 MetaData，避免被 Base.metadata.create_all 创建
+partition_metadata = MetaData()
+
+ARCHIVE_PARENT_TABLE = "predictions_archive"
+
+# 进程内缓存的归档记录计数条数（归档数据只在归档、删除、恢复时变化）
+ARCHIVED_COUNT_CACHE_SIZE = 1024
+
+
+def month_start(value: datetime) -> datetime:
+    """返回所在月份的第一天零点"""
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """月份加减（value 须为月初）"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def build_archive_table(name: str, partitioned: bool = False) -> Table:
+    """
+    按 Prediction 的列结构构建归档表
+
+    Args:
+        name: 表名
+        partitioned: 是否为 PostgreSQL 分区父表（主键需包含分区键）
+
+    Returns:
+        归档表对象
+    """
+    if name in partition_metadata.tables:
+        return partition_metadata.tables[name]
+
+    columns = [
+        Column(column.name, column.type, nullable=column.nullable)
+        for column in Prediction.__table__.columns
+    ]
+    primary_key = ("id", "created_at") if partitioned else ("id",)
+    options = {"postgresql_partition_by": "RANGE (created_at)"} if partitioned else {}
+
+    return Table(
+        name,
+        partition_metadata,
+        *columns,
+        PrimaryKeyConstraint(*primary_key),
+        Index(f"ix_{name}_user_created", "user_id", "created_at"),
+        Index(f"ix_{name}_created", "created_at"),
+        **options
+    )
+
+
+class PartitionService:
+    """识别记录分区服务类"""
+
+    def __init__(self, registry_ttl: int = 60):
+        """
+        初始化分区服务
+
+        Args:
+            registry_ttl: 分区登记信息的进程内缓存秒数
+        """
+        self.registry_ttl = registry_ttl
+        self._partitions: List[PredictionPartition] = []
+        self._loaded_at = 0.0
+        self._archived_counts: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    @property
+    def is_postgresql(self) -> bool:
+        """当前数据库是否为 PostgreSQL"""
+        return engine.dialect.name == "postgresql"
+
+    @property
+    def _stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.registry_ttl
+
+    def _set_partitions(self, partitions: List[PredictionPartition]):
+        self._partitions = partitions
+        self._loaded_at = time.monotonic()
+
+    def get_partitions(self) -> List[PredictionPartition]:
+        """获取已归档的分区列表（带缓存，同步路由和脚本使用）"""
+        if self._stale:
+            self.refresh()
+        return self._partitions
+
+    async def aget_partitions(self, db: AsyncSession) -> List[PredictionPartition]:
+        """获取已归档的分区列表（带缓存，异步路由使用请求的会话加载）"""
+        if self._stale:
+            try:
+                result = await db.execute(select(PredictionPartition).order_by(PredictionPartition.start_at))
+                partitions = result.scalars().all()
+                for partition in partitions:
+                    db.expunge(partition)
+            except Exception as e:
+                # 登记表尚未创建时视为没有归档分区
+                logger.warning(f"加载识别记录分区信息失败: {str(e)}")
+                await db.rollback()
+                partitions = []
+            self._set_partitions(partitions)
+        return self._partitions
+
+    def refresh(self):
+        """重新加载分区登记信息"""
+        db = SessionLocal()
+        try:
+            partitions = db.query(PredictionPartition).order_by(PredictionPartition.start_at).all()
+            db.expunge_all()
+        except Exception as e:
+            # 登记表尚未创建时视为没有归档分区
+            logger.warning(f"加载识别记录分区信息失败: {str(e)}")
+            partitions = []
+        finally:
+            db.close()
+        self._set_partitions(partitions)
+
+    def invalidate(self):
+        """归档数据变化后，下次访问时重新加载登记信息并丢弃归档计数缓存"""
+        self._loaded_at = 0.0
+        self._archived_counts.clear()
+
+    @staticmethod
+    def partitions_in_range(
+        partitions: List[PredictionPartition],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[PredictionPartition]:
+        """与 [start, end) 相交的分区"""
+        return [
+            p for p in partitions
+            if (start is None or p.end_at > start) and (end is None or p.start_at < end)
+        ]
+
+    def archive_tables(self, partitions: List[PredictionPartition]) -> List[Table]:
+        """存放这些分区数据的表（PostgreSQL 为分区父表，由数据库按 created_at 自动裁剪）"""
+        if not partitions:
+            return []
+        if self.is_postgresql:
+            return [build_archive_table(ARCHIVE_PARENT_TABLE, partitioned=True)]
+        return [build_archive_table(p.table_name) for p in partitions]
+
+    @staticmethod
+    def _union_source(tables: List[Table], name: str):
+        """
+        把多张同结构的表 UNION ALL 为 Prediction 别名
+
+        只含归档表时子查询的列与 predictions 没有继承关系，按列名映射，
+        否则实体属性会解析回 predictions 表，产生笛卡尔积
+        """
+        columns = [column.name for column in Prediction.__table__.columns]
+        selects = [select(*[table.c[name] for name in columns]) for table in tables]
+        source = union_all(*selects).subquery(name)
+        return aliased(Prediction, source, adapt_on_names=True)
+
+    def prediction_source(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        partitions: Optional[List[PredictionPartition]] = None
+    ):
+        """
+        获取覆盖指定时间范围的识别记录实体
+
+        时间范围不涉及归档分区时直接返回 Prediction，
+        否则返回映射到 "热表 UNION ALL 相关分区" 的 Prediction 别名，可像 Prediction 一样使用。
+
+        Args:
+            start: 起始时间（含），None 表示不限
+            end: 结束时间（不含），None 表示不限
+            partitions: 已加载的分区列表（异步路由传入 aget_partitions 的结果），默认同步加载
+
+        Returns:
+            Prediction 或其别名
+        """
+        if partitions is None:
+            partitions = self.get_partitions()
+        partitions = self.partitions_in_range(partitions, start, end)
+        if not partitions:
+            return Prediction
+        return self._union_source([Prediction.__table__] + self.archive_tables(partitions), "predictions_all")
+
+    async def count_archived(
+        self,
+        db: AsyncSession,
+        partitions: List[PredictionPartition],
+        cache_key: Hashable,
+        conditions
+    ) -> int:
+        """
+        统计归档分区中满足条件的记录数（按分区登记信息缓存，归档数据不变时不重复扫描分区）
+
+        Args:
+            db: 请求的会话
+            partitions: 相关分区
+            cache_key: 查询条件的标识（如用户ID和筛选参数）
+            conditions: 接收归档实体、返回查询条件列表的函数
+        """
+        if not partitions:
+            return 0
+        signature = tuple((p.month, p.row_count, p.archived_at) for p in partitions)
+        key = (cache_key, signature)
+        if key in self._archived_counts:
+            self._archived_counts.move_to_end(key)
+            return self._archived_counts[key]
+
+        A = self._union_source(self.archive_tables(partitions), "predictions_archived")
+        count = await db.scalar(select(func.count()).select_from(A).where(*conditions(A))) or 0
+        self._archived_counts[key] = count
+        while len(self._archived_counts) > ARCHIVED_COUNT_CACHE_SIZE:
+            self._archived_counts.popitem(last=False)
+        return count
+
+    def find_archived(self, db: Session, prediction_id: int, user_id: Optional[int] = None) -> Optional[Tuple[Table, Dict]]:
+        """
+        在归档分区中查找识别记录
+
+        Returns:
+            (所在的表, 记录)，不存在时返回 None
+        """
+        for table in self.archive_tables(self.get_partitions()):
+            query = select(table).where(table.c.id == prediction_id)
+            if user_id is not None:
+                query = query.where(table.c.user_id == user_id)
+            row = db.execute(query).mappings().first()
+            if row is not None:
+                return table, dict(row)
+        return None
+
+    def _adjust_counts(self, db: Session, removed: Dict[str, int]):
+        """按月份扣减登记表中的归档记录数"""
+        registry = PredictionPartition.__table__
+        for month, count in removed.items():
+            db.execute(
+                registry.update()
+                .where(registry.c.month == month)
+                .values(row_count=registry.c.row_count - count)
+            )
+        self.invalidate()
+
+    def delete_archived(self, db: Session, table: Table, row: Dict):
+        """删除一条归档记录，同时扣减模型统计汇总（调用方负责提交）"""
+        db.execute(delete(table).where(table.c.id == row["id"]))
+        decrement_deleted(db.connection(), [SimpleNamespace(**row)])
+        self._adjust_counts(db, {row["created_at"].strftime("%Y-%m"): 1})
+
+    def restore(self, db: Session, table: Table, row: Dict):
+        """
+        把一条归档记录移回热表（保留原 id，调用方负责提交）
+
+        有反馈关联的记录必须在热表中（外键和错误案例查询依赖热表）；记录仍然存在，模型统计不变
+        """
+        db.execute(insert(Prediction.__table__).values(**row))
+        db.execute(delete(table).where(table.c.id == row["id"]))
+        self._adjust_counts(db, {row["created_at"].strftime("%Y-%m"): 1})
+
+    def delete_user_rows(self, db: Session, user_id: int) -> List[str]:
+        """
+        删除用户在归档分区中的全部记录，同时扣减模型统计汇总（调用方负责提交）
+
+        Returns:
+            被删除记录的图片路径
+        """
+        image_paths = []
+        removed: Dict[str, int] = defaultdict(int)
+        for table in self.archive_tables(self.get_partitions()):
+            rows = db.execute(
+                select(
+                    table.c.id, table.c.image_path, table.c.confidence, table.c.model_name, table.c.created_at
+                ).where(table.c.user_id == user_id)
+            ).all()
+            if not rows:
+                continue
+            db.execute(delete(table).where(table.c.user_id == user_id))
+            decrement_deleted(db.connection(), rows)
+            for row in rows:
+                image_paths.append(row.image_path)
+                removed[row.created_at.strftime("%Y-%m")] += 1
+        if removed:
+            self._adjust_counts(db, removed)
+        return image_paths
+
+    def _ensure_partition(self, conn, start: datetime, end: datetime) -> Table:
+        """确保指定月份的归档表（分区）存在"""
+        suffix = start.strftime("%Y%m")
+        if self.is_postgresql:
+            parent = build_archive_table(ARCHIVE_PARENT_TABLE, partitioned=True)
+            parent.create(bind=conn, checkfirst=True)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {ARCHIVE_PARENT_TABLE}_{suffix} "
+                f"PARTITION OF {ARCHIVE_PARENT_TABLE} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            return parent
+
+        table = build_archive_table(f"predictions_{suffix}")
+        table.create(bind=conn, checkfirst=True)
+        return table
+
+    @staticmethod
+    def _archive_file(start: datetime) -> str:
+        return os.path.join(settings.PREDICTION_ARCHIVE_DIR, f"predictions_{start.strftime('%Y%m')}.jsonl.gz")
+
+    def _export_rows(self, rows: list, temp_path: str):
+        """将迁移的记录写入本次归档的临时 gzip 文件（事务提交后才并入冷备份文件）"""
+        with gzip.open(temp_path, "at", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n")
+
+    @staticmethod
+    def _publish_export(temp_path: str, file_path: str):
+        """
+        把临时文件并入冷备份文件
+
+        gzip 支持多成员拼接，已有文件时把临时文件整体追加到末尾，重复归档同一月份不会覆盖已有数据
+        """
+        if not os.path.exists(file_path):
+            os.replace(temp_path, file_path)
+            return
+        with open(temp_path, "rb") as src, open(file_path, "ab") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(temp_path)
+
+    def archive_month(self, start: datetime, chunk_size: int = 5000) -> int:
+        """
+        将某个月份的热数据迁移到归档分区
+
+        有反馈关联的记录保留在热表中，以维持外键完整性和错误案例查询。
+
+        Args:
+            start: 月初时间
+            chunk_size: 每次读取迁移的记录数，避免整月数据一次性载入内存
+
+        Returns:
+            迁移的记录数
+        """
+        end = add_months(start, 1)
+        month = start.strftime("%Y-%m")
+        hot_table = Prediction.__table__
+        conditions = [
+            hot_table.c.created_at >= start,
+            hot_table.c.created_at < end,
+            hot_table.c.id.notin_(select(Feedback.prediction_id))
+        ]
+
+        archive_file = self._archive_file(start)
+        os.makedirs(settings.PREDICTION_ARCHIVE_DIR, exist_ok=True)
+        # 事务回滚后重新执行不会在冷备份文件中留下重复数据
+        temp_path = f"{archive_file}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            moved = self._move_rows(start, end, month, conditions, chunk_size, archive_file, temp_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if not moved:
+            return 0
+
+        self._publish_export(temp_path, archive_file)
+        logger.info(f"已归档 {month} 的识别记录 {moved} 条")
+        return moved
+
+    def _move_rows(
+        self,
+        start: datetime,
+        end: datetime,
+        month: str,
+        conditions: list,
+        chunk_size: int,
+        archive_file: str,
+        temp_path: str
+    ) -> int:
+        """在一个事务中迁移记录并登记分区，返回迁移的记录数"""
+        hot_table = Prediction.__table__
+        moved = 0
+        with engine.begin() as conn:
+            table = None
+            while True:
+                rows = conn.execute(
+                    select(hot_table).where(*conditions).order_by(hot_table.c.id).limit(chunk_size)
+                ).mappings().all()
+                if not rows:
+                    break
+
+                if table is None:
+                    table = self._ensure_partition(conn, start, end)
+                conn.execute(insert(table), [dict(row) for row in rows])
+                conn.execute(delete(hot_table).where(hot_table.c.id.in_([row["id"] for row in rows])))
+                self._export_rows(rows, temp_path)
+                moved += len(rows)
+
+            if not moved:
+                return 0
+
+            registry = PredictionPartition.__table__
+            table_name = (
+                f"{ARCHIVE_PARENT_TABLE}_{start.strftime('%Y%m')}" if self.is_postgresql else table.name
+            )
+            existing = conn.execute(
+                select(registry.c.id).where(registry.c.month == month)
+            ).first()
+            if existing:
+                conn.execute(
+                    registry.update()
+                    .where(registry.c.id == existing.id)
+                    .values(
+                        row_count=registry.c.row_count + moved,
+                        archive_file=archive_file,
+                        archived_at=datetime.utcnow()
+                    )
+                )
+            else:
+                conn.execute(insert(registry).values(
+                    month=month,
+                    table_name=table_name,
+                    start_at=start,
+                    end_at=end,
+                    row_count=moved,
+                    archive_file=archive_file,
+                    archived_at=datetime.utcnow()
+                ))
+        return moved
+
+    def archive_expired(self, retention_months: Optional[int] = None) -> int:
+        """
+        归档所有超出保留期的整月数据
+
+        Args:
+            retention_months: 热表保留的月数（含当月），默认读取 PREDICTION_HOT_MONTHS
+
+        Returns:
+            迁移的记录总数
+        """
+        if retention_months is None:
+            retention_months = settings.PREDICTION_HOT_MONTHS
+        cutoff = add_months(month_start(datetime.utcnow()), -(retention_months - 1))
+
+        with engine.connect() as conn:
+            oldest = conn.execute(
+                select(func.min(Prediction.created_at)).where(Prediction.created_at < cutoff)
+            ).scalar()
+        if oldest is None:
+            logger.info("没有需要归档的识别记录")
+            return 0
+
+        total = 0
+        current = month_start(oldest)
+        while current < cutoff:
+            total += self.archive_month(current)
+            current = add_months(current, 1)
+
+        self.refresh()
+        return total
+
+
+# 全局分区服务实例
+partition_service = PartitionService()
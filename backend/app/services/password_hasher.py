@@ -0,0 +1,110 @@
+"""
+密码哈希执行器
+bcrypt 每次计算需要 100~300ms CPU，放在专用的有界线程池中执行（bcrypt 计算期间释放 GIL），
+避免登录/注册高峰阻塞事件循环、挤占识别请求；排队过多时直接拒绝，而不是无限堆积
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.security import get_password_hash, verify_and_update_password
+
+
+class PasswordHasherBusyError(Exception):
+    """哈希任务排队已满"""
+    pass
+
+
+class PasswordHasher:
+    """密码哈希执行器类"""
+
+    def __init__(
+        self,
+        workers: int = settings.PASSWORD_HASH_WORKERS,
+        max_pending: int = settings.PASSWORD_HASH_MAX_PENDING
+    ):
+        """
+        初始化执行器
+
+        Args:
+            workers: 哈希线程数
+            max_pending: 最多同时排队和执行的任务数，超出时拒绝
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"completed": 0, "rejected": 0, "rehashed": 0, "peak_pending": 0}
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    async def _submit(self, func: Callable, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise PasswordHasherBusyError(f"密码哈希任务排队已满({self.max_pending})")
+            self._pending += 1
+            self._stats["peak_pending"] = max(self._stats["peak_pending"], self._pending)
+
+        submitted_at = time.perf_counter()
+        started_at = None
+
+        def run():
+            nonlocal started_at
+            started_at = time.perf_counter()
+            return func(*args)
+
+        def release(future: Future):
+            # 在线程池任务结束（或排队中被取消）时释放名额：调用方被取消时 bcrypt 可能仍在执行
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._pending -= 1
+                if started_at is not None:
+                    self._stats["completed"] += 1
+                    self._total_wait += started_at - submitted_at
+                    self._total_run += finished_at - started_at
+
+        future = self._executor.submit(run)
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        """生成密码哈希"""
+        return await self._submit(get_password_hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        验证密码，哈希参数已变更（如 bcrypt 轮数调整）时同时返回新哈希
+
+        Returns:
+            (是否匹配, 新哈希或 None)
+        """
+        verified, new_hash = await self._submit(verify_and_update_password, password, password_hash)
+        if new_hash:
+            with self._lock:
+                self._stats["rehashed"] += 1
+        return verified, new_hash
+
+    def stats(self) -> Dict:
+        """执行器运行指标"""
+        with self._lock:
+            completed = self._stats["completed"]
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                **self._stats,
+                "avg_wait_ms": round(self._total_wait / completed * 1000, 2) if completed else 0.0,
+                "avg_run_ms": round(self._total_run / completed * 1000, 2) if completed else 0.0
+            }
+
+    def shutdown(self):
+        """关闭线程池（应用关闭时调用）"""
+        self._executor.shutdown(wait=True)
+
+
+# 全局密码哈希执行器
+password_hasher = PasswordHasher()
@@ -0,0 +1,161 @@
+"""
+识别记录写入队列（write-behind）
+将多个请求的 Prediction 插入合并为一个多行事务，减少 SQLite 每次提交的 fsync 开销
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.models.database import Prediction
+from app.services.report_cache import report_cache
+
+
+class PredictionWriter:
+    """识别记录批量写入器"""
+
+    def __init__(
+        self,
+        batch_size: int = settings.PREDICTION_WRITE_BATCH_SIZE,
+        flush_interval_ms: int = settings.PREDICTION_WRITE_INTERVAL_MS,
+        max_pending: int = settings.PREDICTION_WRITE_MAX_PENDING
+    ):
+        """
+        初始化写入器
+
+        Args:
+            batch_size: 单个事务最多插入的记录数
+            flush_interval_ms: 从收到第一条记录起最多等待的毫秒数
+            max_pending: 缓冲队列上限，队列满时提交方等待（背压）
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """后台写入任务是否在运行"""
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """启动后台写入任务（应用启动时调用）"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"识别记录写入队列已启动: batch_size={self.batch_size} "
+            f"interval={self.flush_interval * 1000:.0f}ms max_pending={self.max_pending}"
+        )
+
+    async def stop(self):
+        """停止写入任务，并把缓冲中的记录全部写入（应用关闭时调用）"""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("识别记录写入队列已停止，缓冲记录已全部写入")
+
+    async def submit(self, values: Dict) -> Dict:
+        """
+        提交一条识别记录，等待其所在批次提交后返回
+
+        Args:
+            values: Prediction 列值
+
+        Returns:
+            包含 id 和 created_at 的完整记录
+        """
+        values = dict(values)
+        values.setdefault("created_at", datetime.utcnow())
+
+        if not self.running:
+            # 写入任务未启动（如脚本环境），直接单条写入
+            await self._flush([(values, None)])
+            return values
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((values, future))
+        values["id"] = await future
+        return values
+
+    async def _run(self):
+        """后台循环：攒批后统一提交"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    async def _insert(rows: List[Dict]) -> List[int]:
+        """在一个事务中插入多条记录，返回各自的 id"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                insert(Prediction).returning(Prediction.id, sort_by_parameter_order=True),
+                rows
+            )
+            ids = result.scalars().all()
+            await db.commit()
+        return ids
+
+    async def _flush(self, batch: List[Tuple[Dict, Optional[asyncio.Future]]]):
+        """
+        在一个事务中插入一批记录，并通过 future 返回各自的 id
+
+        整批失败时逐条重试，只有出错的那条记录对应的请求失败
+        """
+        rows = [values for values, _ in batch]
+        try:
+            ids = await self._insert(rows)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"写入识别记录失败: {str(e)}", exc_info=True)
+                values, future = batch[0]
+                if future is None:
+                    raise
+                if not future.done():
+                    future.set_exception(e)
+                return
+            logger.warning(f"批量写入识别记录失败({len(rows)} 条)，改为逐条写入: {str(e)}")
+            for item in batch:
+                await self._flush([item])
+            return
+
+        # Core 批量插入不触发 ORM 会话事件，手动使报表缓存失效
+        report_cache.invalidate("predictions")
+
+        for (values, future), prediction_id in zip(batch, ids):
+            if future is None:
+                values["id"] = prediction_id
+            elif not future.done():
+                future.set_result(prediction_id)
+
+        logger.debug(f"批量写入 {len(rows)} 条识别记录")
+
+
+# 全局识别记录写入器
+prediction_writer = PredictionWriter()
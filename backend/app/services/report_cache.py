@@ -0,0 +1,276 @@
+"""
+报表缓存
+缓存统计/报表接口的计算结果，进程内 LRU + 可选 Redis 二级缓存
+
+失效机制：缓存键中包含所依赖数据表的"版本号"。
+- Prediction/User/Feedback 写入提交后，根据写入记录的时间戳递增版本号：
+  近期写入只递增 open 版本（只影响包含当前时间的统计窗口），
+  修改历史记录则递增 all 版本（影响该表的所有窗口）
+- 已结束的历史时间段只依赖 all 版本，使用长 TTL；包含当前时间的窗口使用短 TTL
+"""
+import asyncio
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis_client import redis_client
+
+# 参与失效跟踪的数据表
+TRACKED_TABLES = ("predictions", "users", "feedbacks")
+
+# 结束时间早于"当前时间 - CLOSED_AFTER"的窗口视为已关闭（留出时区差余量）
+CLOSED_AFTER = timedelta(days=2)
+
+# 时间戳晚于"当前时间 - RECENT_WRITE"的写入视为近期写入，只影响未关闭的窗口
+RECENT_WRITE = timedelta(days=1)
+
+
+class ReportCache:
+    """报表缓存类"""
+
+    def __init__(
+        self,
+        max_entries: int = settings.REPORT_CACHE_MAX_ENTRIES,
+        open_ttl: int = settings.REPORT_CACHE_OPEN_TTL,
+        closed_ttl: int = settings.REPORT_CACHE_CLOSED_TTL,
+        use_redis: bool = settings.REPORT_CACHE_REDIS
+    ):
+        """
+        初始化报表缓存
+
+        Args:
+            max_entries: 进程内最多缓存的条目数
+            open_ttl: 包含当前时间的窗口的缓存秒数
+            closed_ttl: 已结束历史时间段的缓存秒数
+            use_redis: 是否启用 Redis 二级缓存（多进程共享结果与失效版本号）
+        """
+        self.max_entries = max_entries
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.use_redis = use_redis
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks = set()
+
+    async def start(self):
+        """记录事件循环（应用启动时调用），供线程池中的写入通知 Redis 递增版本号"""
+        self._loop = asyncio.get_running_loop()
+
+    @staticmethod
+    def is_open_window(end: Optional[datetime]) -> bool:
+        """窗口是否仍可能被新写入影响"""
+        return end is None or end > datetime.now() - CLOSED_AFTER
+
+    def _generation_keys(self, tables: Iterable[str], is_open: bool) -> list:
+        scopes = ("all", "open") if is_open else ("all",)
+        return [f"{table}:{scope}" for table in sorted(tables) for scope in scopes]
+
+    async def _get_generations(self, keys: list) -> list:
+        """读取版本号（启用 Redis 时以 Redis 为准，便于多进程同步失效）"""
+        if self.use_redis:
+            try:
+                values = await redis_client.mget([f"report_cache:gen:{key}" for key in keys])
+                return [int(value or 0) for value in values]
+            except Exception as e:
+                logger.warning(f"读取报表缓存版本号失败，使用本地版本号: {str(e)}")
+        with self._lock:
+            return [self._generations.get(key, 0) for key in keys]
+
+    def _record(self, endpoint: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"hits": 0, "redis_hits": 0, "misses": 0})
+            stats[field] += 1
+
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+        tables: Iterable[str] = ("predictions",),
+        end: Optional[datetime] = None
+    ) -> Any:
+        """
+        获取缓存结果，未命中时计算并写入缓存
+
+        Args:
+            endpoint: 接口标识
+            params: 影响结果的参数
+            compute: 同步计算函数（在线程池中执行），返回可 JSON 序列化的结果
+            tables: 结果所依赖的数据表
+            end: 统计窗口结束时间，None 表示窗口包含当前时间
+
+        Returns:
+            报表结果
+        """
+        is_open = self.is_open_window(end)
+        ttl = self.open_ttl if is_open else self.closed_ttl
+        generation_keys = self._generation_keys(tables, is_open)
+        generations = await self._get_generations(generation_keys)
+        key = json.dumps(
+            [endpoint, params, dict(zip(generation_keys, generations))],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        if entry:
+            self._record(endpoint, "hits")
+            return entry[1]
+
+        if self.use_redis:
+            try:
+                cached = await redis_client.get(f"report_cache:{key}")
+                if cached is not None:
+                    value = json.loads(cached)
+                    self._store(key, value, ttl)
+                    self._record(endpoint, "redis_hits")
+                    return value
+            except Exception as e:
+                logger.warning(f"读取 Redis 报表缓存失败: {str(e)}")
+
+        self._record(endpoint, "misses")
+        # 经过一次 JSON 往返，保证进程内缓存与 Redis 缓存返回的数据形式一致
+        value = json.loads(json.dumps(await run_in_threadpool(compute), ensure_ascii=False, default=str))
+        self._store(key, value, ttl)
+
+        if self.use_redis:
+            try:
+                await redis_client.set(f"report_cache:{key}", json.dumps(value, ensure_ascii=False), ex=ttl)
+            except Exception as e:
+                logger.warning(f"写入 Redis 报表缓存失败: {str(e)}")
+
+        return value
+
+    def _store(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def write_scope(timestamp: Optional[datetime]) -> str:
+        """根据被写入记录的 created_at 判断影响范围（None 表示新写入的记录）"""
+        if timestamp is None or timestamp >= datetime.utcnow() - RECENT_WRITE:
+            return "open"
+        return "all"
+
+    def invalidate(self, table: str, timestamp: Optional[datetime] = None):
+        """
+        数据写入后使相关缓存失效
+
+        Args:
+            table: 被写入的数据表
+            timestamp: 被写入记录的 created_at，None 表示新写入的记录
+        """
+        self.bump(table, self.write_scope(timestamp))
+
+    def bump(self, table: str, scope: str):
+        """递增数据表的版本号（scope: open / all）"""
+        key = f"{table}:{scope}"
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+        if self.use_redis:
+            self._publish(key)
+
+    async def _incr_remote(self, key: str):
+        try:
+            await redis_client.incr(f"report_cache:gen:{key}")
+        except Exception as e:
+            logger.warning(f"更新 Redis 报表缓存版本号失败: {str(e)}")
+
+    def _publish(self, key: str):
+        """
+        在 Redis 中递增版本号
+
+        写入可能发生在事件循环中（如批量写入队列），也可能发生在线程池中的同步接口里：
+        前者创建后台任务，后者提交到事件循环并等待完成，保证接口返回前其他进程已能看到失效。
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            task = loop.create_task(self._incr_remote(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif self._loop is not None and self._loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._incr_remote(key), self._loop)
+            try:
+                future.result(timeout=settings.REDIS_SOCKET_TIMEOUT * (settings.REDIS_RETRY_ATTEMPTS + 1))
+            except Exception as e:
+                logger.warning(f"更新 Redis 报表缓存版本号超时: {str(e)}")
+
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """缓存命中统计"""
+        with self._lock:
+            endpoints = {name: dict(values) for name, values in self._stats.items()}
+            entries = len(self._entries)
+
+        def ratio(values: Dict[str, int]) -> float:
+            total = values["hits"] + values["redis_hits"] + values["misses"]
+            return round((values["hits"] + values["redis_hits"]) / total, 4) if total else 0.0
+
+        totals = {"hits": 0, "redis_hits": 0, "misses": 0}
+        for values in endpoints.values():
+            for field in totals:
+                totals[field] += values[field]
+            values["hit_ratio"] = ratio(values)
+
+        return {
+            "entries": entries,
+            "redis_enabled": self.use_redis,
+            **totals,
+            "hit_ratio": ratio(totals),
+            "endpoints": endpoints
+        }
+
+
+# 全局报表缓存实例
+report_cache = ReportCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_report_writes(session, flush_context):
+    """记录本次事务中被写入的受跟踪记录"""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table in TRACKED_TABLES:
+            session.info.setdefault("report_cache_writes", set()).add(
+                (table, report_cache.write_scope(getattr(obj, "created_at", None)))
+            )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_report_cache(session):
+    """事务提交后使受影响的报表缓存失效"""
+    for table, scope in session.info.pop("report_cache_writes", ()):
+        report_cache.bump(table, scope)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_report_writes(session):
+    """事务回滚时丢弃记录"""
+    session.info.pop("report_cache_writes", None)
@@ -0,0 +1,271 @@
+"""
+模型资源管理
+统一管理分类模型、嵌入模型、向量数据库等占用大量内存的子系统：
+- 首次使用时才加载，避免启动和导入时的开销
+- 空闲超过设定时间后卸载（后台定期检查）
+- 加载前按每个进程的内存预算，卸载最久未使用的其他资源腾出空间
+- 记录加载/卸载事件和进程常驻内存（RSS），供管理员指标接口查看
+"""
+import asyncio
+import gc
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+from app.core.logger import logger
+
+# 后台检查空闲资源的间隔秒数
+REAP_INTERVAL = 30
+
+# 保留的最近加载/卸载事件数
+MAX_EVENTS = 50
+
+
+def get_rss_mb() -> float:
+    """当前进程常驻内存（MB）"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        # 非 Linux 平台退回峰值内存（macOS 单位为字节，其他为 KB）
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class ManagedResource:
+    """受管理的资源"""
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        unloader: Optional[Callable[[Any], None]] = None,
+        idle_timeout: int = 0,
+        estimated_mb: float = 0,
+        pinned: bool = False
+    ):
+        """
+        Args:
+            name: 资源名称
+            loader: 加载函数，返回资源对象
+            unloader: 卸载时的清理函数（可选）
+            idle_timeout: 空闲多少秒后卸载，0 表示不因空闲卸载
+            estimated_mb: 预估内存占用，首次加载后以实测 RSS 增量为准
+            pinned: 加载后常驻，不因空闲或内存预算被卸载（卸载会丢失数据的资源）
+        """
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.idle_timeout = idle_timeout
+        self.size_mb = estimated_mb
+        self.pinned = pinned
+        self.value = None
+        self.in_use = 0
+        self.last_used = 0.0
+        self.load_count = 0
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.value is not None
+
+
+class ResourceManager:
+    """资源管理器类"""
+
+    def __init__(self, memory_budget_mb: int = settings.RESOURCE_MEMORY_BUDGET_MB):
+        """
+        Args:
+            memory_budget_mb: 每个进程的内存预算（MB），0 表示不限制
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self._resources: Dict[str, ManagedResource] = {}
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, loader: Callable[[], Any], **options) -> ManagedResource:
+        """注册资源（只登记，不加载）"""
+        resource = ManagedResource(name, loader, **options)
+        self._resources[name] = resource
+        return resource
+
+    @contextmanager
+    def use(self, name: str):
+        """
+        使用资源（未加载时先加载），使用期间不会被卸载
+
+        Example:
+            with resource_manager.use("embedder") as model:
+                model.encode(...)
+        """
+        resource = self._resources[name]
+        with resource.lock:
+            if not resource.loaded:
+                self._load(resource)
+            resource.in_use += 1
+            value = resource.value
+        try:
+            yield value
+        finally:
+            with resource.lock:
+                resource.in_use -= 1
+                resource.last_used = time.monotonic()
+
+    def _load(self, resource: ManagedResource):
+        """加载资源（调用方持有 resource.lock）"""
+        self._make_room(resource)
+
+        rss_before = get_rss_mb()
+        started = time.perf_counter()
+        logger.info(f"正在加载资源: {resource.name}")
+        resource.value = resource.loader()
+        duration = time.perf_counter() - started
+        rss_after = get_rss_mb()
+
+        # 以实测增量作为资源大小（重复加载时可能偏小，保留较大值）
+        resource.size_mb = max(resource.size_mb, rss_after - rss_before)
+        resource.load_count += 1
+        resource.last_used = time.monotonic()
+        self._record("load", resource, duration, rss_after)
+        logger.info(f"资源 {resource.name} 加载完成，耗时 {duration:.2f}s，RSS {rss_after:.0f}MB")
+
+    def _unload(self, resource: ManagedResource, reason: str):
+        """卸载资源（调用方持有 resource.lock）"""
+        value, resource.value = resource.value, None
+        if resource.unloader is not None:
+            try:
+                resource.unloader(value)
+            except Exception as e:
+                logger.warning(f"资源 {resource.name} 清理失败: {str(e)}")
+        del value
+        gc.collect()
+        self._release_torch_cache()
+        rss_after = get_rss_mb()
+        self._record(f"unload:{reason}", resource, 0.0, rss_after)
+        logger.info(f"资源 {resource.name} 已卸载（{reason}），RSS {rss_after:.0f}MB")
+
+    @staticmethod
+    def _release_torch_cache():
+        import sys
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _make_room(self, incoming: ManagedResource):
+        """按内存预算卸载最久未使用的空闲资源，为即将加载的资源腾出空间"""
+        if self.memory_budget_mb <= 0:
+            return
+
+        candidates = sorted(
+            (r for r in self._resources.values() if r is not incoming and r.loaded and not r.pinned),
+            key=lambda r: r.last_used
+        )
+        for resource in candidates:
+            if get_rss_mb() + incoming.size_mb <= self.memory_budget_mb:
+                return
+            # 非阻塞获取：正在加载或使用中的资源不卸载，也避免两个资源互相等待
+            if not resource.lock.acquire(blocking=False):
+                continue
+            try:
+                if resource.loaded and resource.in_use == 0:
+                    self._unload(resource, "budget")
+            finally:
+                resource.lock.release()
+
+        if get_rss_mb() + incoming.size_mb > self.memory_budget_mb:
+            logger.warning(
+                f"加载 {incoming.name} 后预计超出内存预算 {self.memory_budget_mb}MB"
+                f"（当前 RSS {get_rss_mb():.0f}MB，预估 {incoming.size_mb:.0f}MB）"
+            )
+
+    def unload_idle(self):
+        """卸载空闲超时的资源"""
+        now = time.monotonic()
+        for resource in list(self._resources.values()):
+            if not resource.loaded or resource.pinned or resource.idle_timeout <= 0:
+                continue
+            if now - resource.last_used < resource.idle_timeout:
+                continue
+            if not resource.lock.acquire(blocking=False):
+                continue
+            try:
+                if resource.loaded and resource.in_use == 0 and now - resource.last_used >= resource.idle_timeout:
+                    self._unload(resource, "idle")
+            finally:
+                resource.lock.release()
+
+    def unload(self, name: str):
+        """手动卸载资源（使用中则跳过）"""
+        resource = self._resources[name]
+        with resource.lock:
+            if resource.loaded and resource.in_use == 0:
+                self._unload(resource, "manual")
+
+    async def start(self):
+        """启动后台空闲检查任务（应用启动时调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._reap())
+
+    async def stop(self):
+        """停止后台任务（应用关闭时调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            try:
+                # 卸载时的 gc 可能耗时，放到线程中执行
+                await asyncio.to_thread(self.unload_idle)
+            except Exception as e:
+                logger.warning(f"空闲资源检查失败: {str(e)}")
+
+    def _record(self, event: str, resource: ManagedResource, duration: float, rss_mb: float):
+        with self._lock:
+            self._events.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "event": event,
+                "resource": resource.name,
+                "duration_ms": round(duration * 1000, 1),
+                "rss_mb": round(rss_mb, 1)
+            })
+
+    def stats(self) -> Dict:
+        """资源状态、内存与最近的加载/卸载事件"""
+        now = time.monotonic()
+        with self._lock:
+            events = list(self._events)
+        return {
+            "rss_mb": round(get_rss_mb(), 1),
+            "memory_budget_mb": self.memory_budget_mb,
+            "resources": {
+                resource.name: {
+                    "loaded": resource.loaded,
+                    "in_use": resource.in_use,
+                    "size_mb": round(resource.size_mb, 1),
+                    "load_count": resource.load_count,
+                    "idle_timeout": resource.idle_timeout,
+                    "pinned": resource.pinned,
+                    "idle_seconds": round(now - resource.last_used) if resource.loaded else None
+                }
+                for resource in self._resources.values()
+            },
+            "events": events
+        }
+
+
+# 全局资源管理器实例
+resource_manager = ResourceManager()
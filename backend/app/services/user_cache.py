@@ -0,0 +1,84 @@
+"""
+用户信息缓存
+缓存认证时查询的 User 记录，避免每个已登录请求都访问数据库。
+用户状态、密码等字段通过 ORM 修改或删除时自动失效；多进程部署下由短 TTL 限制不一致时间。
+"""
+import time
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.database import User
+
+
+class UserCache:
+    """用户信息缓存类"""
+
+    def __init__(self, ttl: int = settings.USER_CACHE_TTL, max_entries: int = 10000):
+        """
+        初始化缓存
+
+        Args:
+            ttl: 缓存秒数，0 表示禁用
+            max_entries: 最多缓存的用户数
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[int, Tuple[float, User]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[User]:
+        """获取缓存的用户，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            return entry[1]
+
+    def set(self, user: User):
+        """
+        缓存用户（须为已脱离会话的对象，只读使用）
+
+        Args:
+            user: 用户对象
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, user_id: int):
+        """使指定用户的缓存失效"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+# 全局用户缓存实例
+user_cache = UserCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_user_writes(session, flush_context):
+    """记录本次事务中被修改或删除的用户"""
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault("user_cache_writes", set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_user_cache(session):
+    """事务提交后使被修改用户的缓存失效"""
+    for user_id in session.info.pop("user_cache_writes", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_writes(session):
+    """事务回滚时丢弃记录"""
+    session.info.pop("user_cache_writes", None)
@@ -1,76 +1,193 @@
 """
 向量数据库服务 - 用于 RAG 检索
+嵌入模型和向量库由资源管理器在首次使用时加载，嵌入模型空闲一段时间后自动卸载
+向量库后端由 VECTOR_STORE_BACKEND 选择：ChromaDB 或内置的 NumPy 索引（numpy_index.py）
 """
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+import asyncio
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+import numpy as np
+from app.core.config import settings
 from app.core.logger import logger
+from app.services.resource_manager import resource_manager
+from app.services.embedding_cache import EmbeddingCache
 import os
 
+# 嵌入模型（多语言，支持中文）
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
 
 class VectorStore:
     """向量数据库服务类"""
 
     def __init__(self, persist_directory: str = "./chroma_db"):
         """
-        初始化向量数据库
+        初始化向量数据库（只登记资源，不加载）
 
         Args:
             persist_directory: 数据库持久化目录
         """
         self.persist_directory = persist_directory
+        self.collection_name = "trash_classification_docs"
+        self.query_cache = EmbeddingCache(namespace=EMBEDDING_MODEL_NAME)
+
+        resource_manager.register(
+            "embedder",
+            self._load_embedding_model,
+            idle_timeout=settings.EMBEDDER_IDLE_TIMEOUT,
+            estimated_mb=500
+        )
+        # 两种后端的数据都保存在磁盘上，卸载后可以随时重新打开
+        self.backend = settings.VECTOR_STORE_BACKEND
+        resource_manager.register("vector_db", self._open_collection)
+
+    def _load_embedding_model(self):
+        """加载嵌入模型"""
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    def _open_collection(self):
+        """打开向量库集合（按 VECTOR_STORE_BACKEND 选择后端）"""
+        if self.backend == "numpy":
+            return self._open_numpy_index()
+        if self.backend != "chroma":
+            raise ValueError(f"未知的向量库后端: {self.backend}")
+        return self._open_chroma_collection()
+
+    def _open_numpy_index(self):
+        """打开 NumPy 向量索引"""
+        from app.services.numpy_index import NumpyIndex
+        index = NumpyIndex(
+            os.path.join(self.persist_directory, "numpy_index"),
+            dtype=settings.VECTOR_INDEX_DTYPE,
+            ivf_threshold=settings.VECTOR_INDEX_IVF_THRESHOLD,
+            nprobe=settings.VECTOR_INDEX_IVF_NPROBE
+        )
+        logger.info(f"已打开 NumPy 向量索引，共 {index.count()} 个文档")
+        return index
+
+    def _open_chroma_collection(self):
+        """打开持久化的 ChromaDB 客户端，获取或创建集合（重启后直接复用磁盘上的索引，不重新生成向量）"""
+        import chromadb
+        from chromadb.config import Settings
 
         # 创建持久化目录
-        os.makedirs(persist_directory, exist_ok=True)
+        os.makedirs(self.persist_directory, exist_ok=True)
 
-        # 初始化 ChromaDB 客户端
-        self.client = chromadb.Client(Settings(
-            persist_directory=persist_directory,
-            anonymized_telemetry=False
-        ))
+        if hasattr(chromadb, "PersistentClient"):
+            self.client = chromadb.PersistentClient(
+                path=self.persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            # chromadb < 0.4 需要显式指定持久化实现，否则数据只保存在内存中
+            self.client = chromadb.Client(Settings(
+                chroma_db_impl="duckdb+parquet",
+                persist_directory=self.persist_directory,
+                anonymized_telemetry=False
+            ))
 
-        # 初始化嵌入模型（使用中文模型）
-        logger.info("正在加载嵌入模型...")
-        self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        logger.info("嵌入模型加载完成")
+        collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"description": "垃圾分类系统文档知识库"}
+        )
+        logger.info(f"已打开集合: {self.collection_name}，共 {collection.count()} 个文档")
+        return collection
 
-        # 获取或创建集合
-        self.collection_name = "trash_classification_docs"
-        try:
-            self.collection = self.client.get_collection(name=self.collection_name)
-            logger.info(f"已加载现有集合: {self.collection_name}")
-        except:
-            self.collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "垃圾分类系统文档知识库"}
+    def encode(self, texts: List[str], batch_size: int = settings.EMBEDDING_BATCH_SIZE, pool: Optional[Dict] = None):
+        """
+        生成文本的嵌入向量（按 batch_size 分批送入模型）
+
+        Args:
+            texts: 文本列表
+            batch_size: 每批编码的文本数
+            pool: multi_process_pool() 创建的多进程编码池（可选）
+        """
+        with resource_manager.use("embedder") as model:
+            if pool is not None:
+                return model.encode_multi_process(texts, pool, batch_size=batch_size)
+            return model.encode(texts, batch_size=batch_size)
+
+    @contextmanager
+    def multi_process_pool(self, workers: int = settings.EMBEDDING_WORKERS):
+        """
+        创建多进程编码池（大批量导入时使用），workers 不大于 1 时返回 None（单进程编码）
+
+        Example:
+            with vector_store.multi_process_pool(4) as pool:
+                vector_store.add_documents(documents, ids=ids, pool=pool)
+        """
+        if workers <= 1:
+            yield None
+            return
+
+        with resource_manager.use("embedder") as model:
+            pool = model.start_multi_process_pool(target_devices=["cpu"] * workers)
+            logger.info(f"已启动 {workers} 个嵌入编码进程")
+            try:
+                yield pool
+            finally:
+                model.stop_multi_process_pool(pool)
+
+    @contextmanager
+    def bulk_write(self):
+        """
+        大批量写入（NumPy 后端只在检查点和退出时写盘，ChromaDB 后端逐批直接写入）
+
+        Example:
+            with vector_store.bulk_write():
+                for batch in batches:
+                    vector_store.upsert_batch(...)
+        """
+        with resource_manager.use("vector_db") as collection:
+            if self.backend == "numpy":
+                with collection.batch():
+                    yield
+            else:
+                yield
+
+    def upsert_batch(self, documents: List[str], metadatas: List[Dict], ids: List[str], pool: Optional[Dict] = None):
+        """编码一批文档并写入集合（ID 已存在时覆盖，重复导入同一批不会报错）"""
+        embeddings = self.encode(documents, pool=pool).tolist()
+        with resource_manager.use("vector_db") as collection:
+            collection.upsert(
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
             )
-            logger.info(f"已创建新集合: {self.collection_name}")
 
-    def add_documents(self, documents: List[str], metadatas: List[Dict] = None, ids: List[str] = None):
+    def add_documents(
+        self,
+        documents: List[str],
+        metadatas: List[Dict] = None,
+        ids: List[str] = None,
+        batch_size: int = settings.VECTOR_UPSERT_BATCH_SIZE,
+        pool: Optional[Dict] = None
+    ):
         """
-        添加文档到向量数据库
+        添加文档到向量数据库（按 batch_size 分批编码和写入）
 
         Args:
             documents: 文档文本列表
             metadatas: 文档元数据列表
             ids: 文档ID列表
+            batch_size: 每批写入的文档数
+            pool: 多进程编码池（可选）
         """
         try:
-            # 生成嵌入向量
-            embeddings = self.embedding_model.encode(documents).tolist()
-
             # 如果没有提供ID，自动生成
             if ids is None:
                 ids = [f"doc_{i}" for i in range(len(documents))]
 
-            # 添加到集合
-            self.collection.add(
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            for start in range(0, len(documents), batch_size):
+                end = start + batch_size
+                self.upsert_batch(
+                    documents[start:end],
+                    metadatas[start:end] if metadatas else None,
+                    ids[start:end],
+                    pool=pool
+                )
 
             logger.info(f"成功添加 {len(documents)} 个文档到向量数据库")
 
@@ -78,6 +195,45 @@ class VectorStore:
             logger.error(f"添加文档失败: {str(e)}", exc_info=True)
             raise
 
+    def embed_query(self, query: str) -> np.ndarray:
+        """生成查询向量（优先读取进程内缓存）"""
+        key = self.query_cache.normalize(query)
+        vector = self.query_cache.lookup(key)
+        if vector is None:
+            vector = self.encode([key])[0]
+            self.query_cache.put_local(key, vector)
+        return vector
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """生成查询向量（依次读取进程内缓存、Redis 缓存，未命中时在线程中编码）"""
+        key = self.query_cache.normalize(query)
+        vector = await self.query_cache.get(key)
+        if vector is None:
+            vector = (await asyncio.to_thread(self.encode, [key]))[0]
+            await self.query_cache.put(key, vector)
+        return vector
+
+    def _query(self, query: str, query_embedding: np.ndarray, n_results: int) -> List[Dict]:
+        """按查询向量检索并格式化结果"""
+        with resource_manager.use("vector_db") as collection:
+            results = collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=n_results
+            )
+
+        # 格式化结果
+        documents = []
+        if results['documents'] and len(results['documents']) > 0:
+            for i, doc in enumerate(results['documents'][0]):
+                documents.append({
+                    'content': doc,
+                    'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
+                    'distance': results['distances'][0][i] if results['distances'] else 0
+                })
+
+        logger.info(f"搜索查询: '{query}', 找到 {len(documents)} 个相关文档")
+        return documents
+
     def search(self, query: str, n_results: int = 3) -> List[Dict]:
         """
         搜索相关文档
@@ -90,28 +246,16 @@ class VectorStore:
             相关文档列表
         """
         try:
-            # 生成查询向量
-            query_embedding = self.embedding_model.encode([query]).tolist()
-
-            # 搜索
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=n_results
-            )
-
-            # 格式化结果
-            documents = []
-            if results['documents'] and len(results['documents']) > 0:
-                for i, doc in enumerate(results['documents'][0]):
-                    documents.append({
-                        'content': doc,
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                        'distance': results['distances'][0][i] if results['distances'] else 0
-                    })
-
-            logger.info(f"搜索查询: '{query}', 找到 {len(documents)} 个相关文档")
-            return documents
+            return self._query(query, self.embed_query(query), n_results)
+        except Exception as e:
+            logger.error(f"搜索文档失败: {str(e)}", exc_info=True)
+            return []
 
+    async def asearch(self, query: str, n_results: int = 3) -> List[Dict]:
+        """搜索相关文档（异步版本，模型推理与检索在线程中执行，不阻塞事件循环）"""
+        try:
+            query_embedding = await self.aembed_query(query)
+            return await asyncio.to_thread(self._query, query, query_embedding, n_results)
         except Exception as e:
             logger.error(f"搜索文档失败: {str(e)}", exc_info=True)
             return []
@@ -119,20 +263,35 @@ class VectorStore:
     def clear(self):
         """清空集合"""
         try:
-            self.client.delete_collection(name=self.collection_name)
-            self.collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "垃圾分类系统文档知识库"}
-            )
+            with resource_manager.use("vector_db") as collection:
+                # 删除集合中的全部文档（保留集合本身，资源管理器持有的集合对象继续可用）
+                existing = collection.get(include=[])
+                if existing["ids"]:
+                    collection.delete(ids=existing["ids"])
             logger.info("已清空向量数据库")
         except Exception as e:
             logger.error(f"清空数据库失败: {str(e)}", exc_info=True)
             raise
 
+    def get_ids(self) -> List[str]:
+        """获取集合中全部文档ID（不读取向量和正文）"""
+        with resource_manager.use("vector_db") as collection:
+            return collection.get(include=[])["ids"]
+
+    def delete(self, ids: List[str], batch_size: int = settings.VECTOR_UPSERT_BATCH_SIZE):
+        """按ID分批删除文档"""
+        if not ids:
+            return
+        with resource_manager.use("vector_db") as collection:
+            for start in range(0, len(ids), batch_size):
+                collection.delete(ids=ids[start:start + batch_size])
+        logger.info(f"从向量数据库删除 {len(ids)} 个文档")
+
     def get_count(self) -> int:
         """获取文档数量"""
         try:
-            return self.collection.count()
+            with resource_manager.use("vector_db") as collection:
+                return collection.count()
         except:
             return 0
 
@@ -5,9 +5,18 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import engine, async_engine
 from app.core.logger import logger
+from app.core.rate_limit import RateLimitMiddleware
 from app.models.database import Base
+from app.services.prediction_writer import prediction_writer
+from app.services.feedback_search import feedback_search
+from app.services.report_cache import report_cache
+from app.services.password_hasher import password_hasher
+from app.services.resource_manager import resource_manager
+from app.services.knowledge_ingest import knowledge_ingestor
+from app.services.llm_pool import llm_pool
+from app.core.redis_client import redis_client
 from app.api import auth, predict, stats, admin, chat, reports, model, announcements
 import os
 import time
@@ -15,6 +24,14 @@ import time
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
 
+# create_all 不会为已存在的表补建索引，这里逐个检查补齐
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+# 反馈全文索引（SQLite FTS5）
+feedback_search.setup(engine)
+
 # 创建FastAPI应用
 app = FastAPI(
     title=settings.APP_NAME,
@@ -51,6 +68,9 @@ async def log_requests(request: Request, call_next):
         )
         raise
 
+# 限流（位于 CORS 之内，被拒绝的响应同样带跨域头）
+app.add_middleware(RateLimitMiddleware)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -87,6 +107,11 @@ async def startup_event():
     logger.info(f"调试模式: {settings.DEBUG}")
     logger.info(f"数据库: {settings.DATABASE_URL}")
     logger.info(f"模型路径: {settings.MODEL_PATH}")
+    logger.info(f"Token/缓存存储: {redis_client.backend}")
+    await report_cache.start()
+    await prediction_writer.start()
+    await resource_manager.start()
+    await knowledge_ingestor.start(engine)
     logger.info("=" * 50)
 
 
@@ -95,6 +120,13 @@ async def shutdown_event():
     """应用关闭事件"""
     logger.info("=" * 50)
     logger.info(f"{settings.APP_NAME} 正在关闭...")
+    await knowledge_ingestor.stop()
+    await resource_manager.stop()
+    await prediction_writer.stop()
+    await async_engine.dispose()
+    await redis_client.close()
+    password_hasher.shutdown()
+    llm_pool.shutdown()
     logger.info("=" * 50)
 
 
@@ -0,0 +1,38 @@
+"""
+识别记录归档脚本
+将超出保留期的整月识别记录迁移到按月分区，并写出压缩冷备份
+
+用法:
+    python scripts/archive_predictions.py [--months 6]
+"""
+import os
+import sys
+import argparse
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import engine
+from app.core.logger import logger
+from app.models.database import Base
+from app.services.partition_service import partition_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="识别记录归档")
+    parser.add_argument("--months", type=int, default=None, help="热表保留月数（含当月），默认读取 PREDICTION_HOT_MONTHS")
+    args = parser.parse_args()
+
+    # 确保分区登记表存在
+    Base.metadata.create_all(bind=engine)
+
+    logger.info("开始归档识别记录...")
+    total = partition_service.archive_expired(args.months)
+    logger.info(f"归档完成，共迁移 {total} 条记录")
+
+    for partition in partition_service.get_partitions():
+        print(f"{partition.month}  {partition.table_name:<28} {partition.row_count:>10} 条  {partition.archive_file}")
+
+
+if __name__ == "__main__":
+    main()
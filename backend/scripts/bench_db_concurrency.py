@@ -0,0 +1,155 @@
+"""
+数据库并发基准测试
+N 个写线程持续插入识别记录，同时 M 个读线程执行报表统计查询，
+对比 default 与 production 两种引擎配置档的吞吐量与延迟
+
+用法:
+    python scripts/bench_db_concurrency.py [--writers 4] [--readers 4] [--duration 10] [--rows 50000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+from app.core.database import create_db_engine
+from app.models.database import Base, Prediction
+
+
+def seed_database(engine, rows: int):
+    """创建表并写入历史数据"""
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Prediction), [
+            {
+                "user_id": random.randint(1, 100),
+                "image_path": f"uploads/{i}.jpg",
+                "predicted_class": f"类别_{i % 265}",
+                "predicted_class_id": i % 265,
+                "confidence": random.uniform(30, 100),
+                "top3_results": [],
+                "model_name": "best_model.pth",
+                "created_at": now - timedelta(minutes=i)
+            }
+            for i in range(rows)
+        ])
+
+
+def writer(SessionLocal, stop: threading.Event, result: dict):
+    """模拟 predict_single：每条记录一个事务"""
+    while not stop.is_set():
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            db.add(Prediction(
+                user_id=random.randint(1, 100),
+                image_path="uploads/bench.jpg",
+                predicted_class="类别_0",
+                predicted_class_id=0,
+                confidence=random.uniform(30, 100),
+                top3_results=[],
+                model_name="best_model.pth"
+            ))
+            db.commit()
+            result["latencies"].append(time.perf_counter() - start)
+        except Exception:
+            db.rollback()
+            result["errors"] += 1
+        finally:
+            db.close()
+
+
+def reader(SessionLocal, stop: threading.Event, result: dict):
+    """模拟管理员周报查询"""
+    while not stop.is_set():
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            since = datetime.utcnow() - timedelta(days=7)
+            db.query(func.count(Prediction.id)).filter(Prediction.created_at >= since).scalar()
+            db.query(
+                func.date(Prediction.created_at),
+                func.count(Prediction.id)
+            ).filter(
+                Prediction.created_at >= since
+            ).group_by(func.date(Prediction.created_at)).all()
+            db.query(
+                Prediction.predicted_class,
+                func.count(Prediction.id)
+            ).filter(
+                Prediction.created_at >= since
+            ).group_by(Prediction.predicted_class).all()
+            result["latencies"].append(time.perf_counter() - start)
+        except Exception:
+            result["errors"] += 1
+        finally:
+            db.close()
+
+
+def percentile(values: list, p: float) -> float:
+    """计算百分位数（毫秒）"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def run_profile(profile: str, args):
+    """在独立的临时数据库上运行一个配置档"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        engine = create_db_engine(url, profile=profile)
+        seed_database(engine, args.rows)
+        SessionLocal = sessionmaker(bind=engine)
+
+        stop = threading.Event()
+        write_result = {"latencies": [], "errors": 0}
+        read_result = {"latencies": [], "errors": 0}
+        threads = [
+            threading.Thread(target=writer, args=(SessionLocal, stop, write_result))
+            for _ in range(args.writers)
+        ] + [
+            threading.Thread(target=reader, args=(SessionLocal, stop, read_result))
+            for _ in range(args.readers)
+        ]
+
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    for name, result in (("写入", write_result), ("报表", read_result)):
+        print(
+            f"[{profile:<10}] {name}: {len(result['latencies']) / args.duration:.1f} ops/s "
+            f"p50={percentile(result['latencies'], 0.5):.1f}ms "
+            f"p99={percentile(result['latencies'], 0.99):.1f}ms "
+            f"错误={result['errors']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库并发基准测试")
+    parser.add_argument("--writers", type=int, default=4, help="写线程数")
+    parser.add_argument("--readers", type=int, default=4, help="报表读线程数")
+    parser.add_argument("--duration", type=float, default=10, help="每个配置档的运行秒数")
+    parser.add_argument("--rows", type=int, default=50000, help="预置识别记录数量")
+    args = parser.parse_args()
+
+    for profile in ("default", "production"):
+        run_profile(profile, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+事件循环延迟基准测试
+对比在 async 路由中使用同步会话与异步会话时，混合负载下事件循环的阻塞程度
+
+用法:
+    python scripts/bench_event_loop.py [--rows 50000] [--concurrency 50] [--requests 500]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, func, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.core.database import get_async_database_url
+from app.models.database import Base, User, Prediction
+
+
+def seed_database(url: str, rows: int):
+    """创建表并写入测试数据"""
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"bench_{i}", "password_hash": "x", "role": "user"}
+            for i in range(1, 101)
+        ])
+        now = datetime.utcnow()
+        conn.execute(insert(Prediction), [
+            {
+                "user_id": random.randint(1, 100),
+                "image_path": f"uploads/{i}.jpg",
+                "predicted_class": f"类别_{i % 265}",
+                "predicted_class_id": i % 265,
+                "confidence": random.uniform(30, 100),
+                "top3_results": [],
+                "model_name": "best_model.pth",
+                "created_at": now - timedelta(minutes=i)
+            }
+            for i in range(rows)
+        ])
+    engine.dispose()
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.005):
+    """定时唤醒并记录实际唤醒延迟，用于衡量事件循环被阻塞的程度"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+def history_query(user_id: int):
+    """模拟 /api/predict/history 的查询"""
+    return (
+        select(Prediction)
+        .where(Prediction.user_id == user_id)
+        .order_by(Prediction.created_at.desc())
+        .limit(20)
+    )
+
+
+def count_query(user_id: int):
+    """模拟历史记录总数查询"""
+    return select(func.count()).select_from(Prediction).where(Prediction.user_id == user_id)
+
+
+async def run_sync_workload(url: str, concurrency: int, requests: int) -> float:
+    """在协程中直接使用同步会话（原实现方式）"""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(bind=engine)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle():
+        async with semaphore:
+            db = SessionLocal()
+            try:
+                user_id = random.randint(1, 100)
+                db.execute(count_query(user_id)).scalar()
+                db.execute(history_query(user_id)).scalars().all()
+            finally:
+                db.close()
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+async def run_async_workload(url: str, concurrency: int, requests: int) -> float:
+    """使用异步会话"""
+    engine = create_async_engine(get_async_database_url(url))
+    SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle():
+        async with semaphore:
+            async with SessionLocal() as db:
+                user_id = random.randint(1, 100)
+                await db.scalar(count_query(user_id))
+                (await db.execute(history_query(user_id))).scalars().all()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+
+async def run_case(name: str, workload, url: str, concurrency: int, requests: int):
+    """运行单个场景并输出结果"""
+    stop = asyncio.Event()
+    samples = []
+    ticker = asyncio.create_task(measure_loop_lag(stop, samples))
+    elapsed = await workload(url, concurrency, requests)
+    stop.set()
+    await ticker
+
+    samples.sort()
+    p50 = statistics.median(samples) if samples else 0
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0
+    worst = samples[-1] if samples else 0
+    print(
+        f"{name:<10} 总耗时={elapsed:.2f}s 吞吐={requests / elapsed:.0f} req/s "
+        f"循环延迟 p50={p50:.1f}ms p99={p99:.1f}ms max={worst:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环延迟基准测试")
+    parser.add_argument("--rows", type=int, default=50000, help="预置识别记录数量")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=500, help="总请求数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        print(f"写入 {args.rows} 条测试数据...")
+        seed_database(url, args.rows)
+
+        asyncio.run(run_case("同步会话", run_sync_workload, url, args.concurrency, args.requests))
+        asyncio.run(run_case("异步会话", run_async_workload, url, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
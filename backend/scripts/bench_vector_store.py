@@ -0,0 +1,149 @@
+"""
+向量库后端基准测试
+对比 ChromaDB 与内置 NumPy 索引（float32 / float16 / float16 + IVF）的写入耗时、打开耗时、检索延迟和召回率
+
+召回率以 float32 精确余弦检索的 top-k 为基准。默认使用合成的聚类向量（不需要嵌入模型），
+--real 时改用项目知识库文档经嵌入模型编码后的真实向量。
+
+用法:
+    python scripts/bench_vector_store.py [--docs 5000] [--queries 200] [--k 5] [--real]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import importlib.util
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from app.services.numpy_index import NumpyIndex, normalize_rows
+
+# 每批写入的文档数
+WRITE_BATCH = 512
+
+
+def synthetic_vectors(docs: int, queries: int, dim: int, seed: int = 0):
+    """生成聚类分布的文档向量和查询向量（比均匀随机向量更接近真实嵌入）"""
+    rng = np.random.default_rng(seed)
+    clusters = max(8, docs // 100)
+    centers = rng.normal(size=(clusters, dim))
+    doc_vectors = centers[rng.integers(clusters, size=docs)] + 0.6 * rng.normal(size=(docs, dim))
+    query_vectors = centers[rng.integers(clusters, size=queries)] + 0.6 * rng.normal(size=(queries, dim))
+    return doc_vectors.astype(np.float32), query_vectors.astype(np.float32)
+
+
+def real_vectors(queries: int, seed: int = 0):
+    """用嵌入模型编码项目知识库文档，查询为随机抽取的文档块开头"""
+    from app.services.document_loader import iter_knowledge_base
+    from app.services.vector_store import vector_store
+
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    texts = [chunk["content"] for chunk in iter_knowledge_base(project_root)]
+    if not texts:
+        raise SystemExit("没有找到知识库文档")
+    rng = np.random.default_rng(seed)
+    query_texts = [texts[i][:60] for i in rng.integers(len(texts), size=queries)]
+    print(f"编码 {len(texts)} 个文档块和 {queries} 个查询...")
+    return vector_store.encode(texts).astype(np.float32), vector_store.encode(query_texts).astype(np.float32)
+
+
+def exact_top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int):
+    """float32 精确余弦检索结果（基准）"""
+    scores = normalize_rows(query_vectors) @ normalize_rows(doc_vectors).T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def open_numpy(directory: str, dtype: str, ivf_threshold: int):
+    return NumpyIndex(directory, dtype=dtype, ivf_threshold=ivf_threshold)
+
+
+def open_chroma(directory: str):
+    import chromadb
+    client = chromadb.PersistentClient(path=directory)
+    return client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+
+
+def run_case(name: str, open_collection, doc_vectors, query_vectors, truth, k: int):
+    """写入、重新打开并检索，输出结果"""
+    ids = [str(i) for i in range(len(doc_vectors))]
+    documents = [f"doc {i}" for i in range(len(doc_vectors))]
+
+    start = time.perf_counter()
+    collection = open_collection()
+    for begin in range(0, len(ids), WRITE_BATCH):
+        end = begin + WRITE_BATCH
+        collection.upsert(
+            ids=ids[begin:end],
+            embeddings=doc_vectors[begin:end].tolist(),
+            documents=documents[begin:end],
+            metadatas=[{"n": i} for i in range(begin, min(end, len(ids)))]
+        )
+    write_seconds = time.perf_counter() - start
+    del collection
+
+    # 重新打开，模拟服务冷启动
+    start = time.perf_counter()
+    collection = open_collection()
+    open_ms = (time.perf_counter() - start) * 1000
+
+    # 第一次检索可能触发建立 IVF 分区等准备工作，单独计时
+    start = time.perf_counter()
+    collection.query(query_embeddings=[query_vectors[0].tolist()], n_results=k)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(query_vectors, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & {int(doc_id) for doc_id in result["ids"][0]})
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    recall = hits / (len(truth) * k)
+    print(
+        f"{name:<18} 写入={write_seconds:.2f}s 打开={open_ms:.0f}ms 首次检索={first_ms:.1f}ms "
+        f"检索 p50={p50:.2f}ms p95={p95:.2f}ms recall@{k}={recall:.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量库后端基准测试")
+    parser.add_argument("--docs", type=int, default=5000, help="合成文档数量")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--dim", type=int, default=384, help="合成向量维度（与默认嵌入模型一致）")
+    parser.add_argument("--k", type=int, default=5, help="每次检索返回的文档数")
+    parser.add_argument("--real", action="store_true", help="使用嵌入模型编码的项目知识库文档")
+    args = parser.parse_args()
+
+    if args.real:
+        doc_vectors, query_vectors = real_vectors(args.queries)
+    else:
+        doc_vectors, query_vectors = synthetic_vectors(args.docs, args.queries, args.dim)
+    k = min(args.k, len(doc_vectors))
+    truth = exact_top_k(doc_vectors, query_vectors, k)
+    print(f"{len(doc_vectors)} 个文档，{len(query_vectors)} 个查询，维度 {doc_vectors.shape[1]}\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cases = [
+            ("numpy float32", lambda: open_numpy(os.path.join(tmp_dir, "f32"), "float32", 0)),
+            ("numpy float16", lambda: open_numpy(os.path.join(tmp_dir, "f16"), "float16", 0)),
+            ("numpy float16+IVF", lambda: open_numpy(os.path.join(tmp_dir, "ivf"), "float16", 1)),
+        ]
+        if importlib.util.find_spec("chromadb") is not None:
+            cases.append(("chroma (hnsw)", lambda: open_chroma(os.path.join(tmp_dir, "chroma"))))
+        else:
+            print("未安装 chromadb，跳过 ChromaDB 对比")
+
+        for name, open_collection in cases:
+            run_case(name, open_collection, doc_vectors, query_vectors, truth, k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+识别记录分区自检脚本
+在临时 SQLite 数据库中写入热数据和过期数据，执行归档后检查各接口的统计口径在归档前后保持一致
+
+用法:
+    python scripts/check_partitions.py [--hot 4] [--archived 2]
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+import warnings
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用临时数据库和归档目录，必须在导入 app 之前设置
+WORK_DIR = tempfile.mkdtemp(prefix="check_partitions_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'check.db')}"
+os.environ["PREDICTION_ARCHIVE_DIR"] = os.path.join(WORK_DIR, "archive")
+os.environ["REDIS_BACKEND"] = "memory"
+
+from sqlalchemy.exc import SAWarning
+from app.core.database import engine, SessionLocal, AsyncSessionLocal
+from app.models.database import Base, User, Prediction
+from app.services.partition_service import partition_service
+from app.api.predict import get_prediction_history
+from app.api.stats import get_user_stats, build_global_stats
+from app.api.admin import get_all_predictions
+
+
+def seed(hot: int, archived: int) -> User:
+    """写入一个用户的热数据和一年前的数据"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(username="partition_check", email="partition_check@example.com", password_hash="-")
+        db.add(user)
+        db.flush()
+        now = datetime.utcnow()
+        old = now - timedelta(days=400)
+        for i in range(hot + archived):
+            db.add(Prediction(
+                user_id=user.id,
+                image_path=os.path.join(WORK_DIR, f"{i}.jpg"),
+                predicted_class="塑料瓶",
+                predicted_class_id=1,
+                confidence=90.0,
+                top3_results=[],
+                model_name="check",
+                created_at=now if i < hot else old + timedelta(minutes=i)
+            ))
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+async def history_total(user: User) -> int:
+    async with AsyncSessionLocal() as db:
+        result = await get_prediction_history(
+            skip=0, limit=100, predicted_class=None, start_date=None, end_date=None,
+            db=db, current_user=user
+        )
+    assert len(result["items"]) == result["total"], "分页记录数与总数不一致"
+    return result["total"]
+
+
+def collect(user: User) -> dict:
+    """各接口统计到的记录数"""
+    db = SessionLocal()
+    try:
+        return {
+            "history": asyncio.run(history_total(user)),
+            "user_stats": get_user_stats(db=db, current_user=user)["total_predictions"],
+            "global_stats": build_global_stats(db)["total_predictions"],
+            "admin_predictions": get_all_predictions(
+                skip=0, limit=100, user_id=None, predicted_class=None, start_date=None, end_date=None,
+                db=db, current_user=user
+            )["total"]
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="识别记录分区自检")
+    parser.add_argument("--hot", type=int, default=4, help="热数据条数")
+    parser.add_argument("--archived", type=int, default=2, help="会被归档的过期数据条数")
+    args = parser.parse_args()
+
+    # 漏掉关联条件的查询会产生笛卡尔积警告，视为失败
+    warnings.simplefilter("error", SAWarning)
+
+    user = seed(args.hot, args.archived)
+    expected = args.hot + args.archived
+    before = collect(user)
+    moved = partition_service.archive_expired()
+    after = collect(user)
+
+    print(f"归档 {moved} 条（期望 {args.archived}），数据目录: {WORK_DIR}")
+    failed = moved != args.archived
+    for name in before:
+        ok = before[name] == after[name] == expected
+        failed |= not ok
+        print(f"  {name:<18} 归档前 {before[name]:>4}  归档后 {after[name]:>4}  期望 {expected:>4}  {'OK' if ok else 'FAIL'}")
+
+    if failed:
+        sys.exit(1)
+    print("[SUCCESS] Partition check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,94 @@
 """
 初始化 RAG 知识库
-将项目文档加载到向量数据库中
+将项目文档加载到向量数据库中（增量同步：未变化的文档块不会重新生成向量）
+
+用法:
+    python scripts/init_rag.py            # 增量同步
+    python scripts/init_rag.py --rebuild  # 清空后全量重建
+    python scripts/init_rag.py --workers 4 --batch-size 256  # 大规模语料：多进程编码、分批写入
 """
 import os
 import sys
+import argparse
+import itertools
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.core.database import engine
 from app.services.vector_store import vector_store
-from app.services.document_loader import prepare_knowledge_base
+from app.core.config import settings
+from app.services.document_loader import iter_knowledge_base
+from app.services.knowledge_ingest import knowledge_ingestor, PROJECT_ROOT
 from app.core.logger import logger
 
 
-def init_knowledge_base():
-    """初始化知识库"""
+def init_knowledge_base(
+    rebuild: bool = False,
+    batch_size: int = settings.VECTOR_UPSERT_BATCH_SIZE,
+    workers: int = settings.EMBEDDING_WORKERS
+):
+    """
+    初始化/增量更新知识库
+
+    Args:
+        rebuild: 是否清空后全量重建（默认只处理新增、修改和删除的文档块）
+        batch_size: 每批编码和写入的文档块数
+        workers: 并行编码的进程数
+    """
     try:
         logger.info("=" * 50)
-        logger.info("开始初始化 RAG 知识库...")
+        logger.info("开始同步 RAG 知识库...")
         logger.info("=" * 50)
 
-        # 获取项目根目录
-        backend_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(backend_dir)
-
-        logger.info(f"项目根目录: {project_root}")
+        logger.info(f"项目根目录: {PROJECT_ROOT}")
 
-        # 清空现有知识库
-        logger.info("清空现有知识库...")
-        vector_store.clear()
-
-        # 准备文档
+        # 流式读取和分割文档（README.md、docs/*.md、开启 RAG_INCLUDE_KNOWLEDGE_TABLE 时的知识文章）
         logger.info("加载和分割文档...")
-        chunks = prepare_knowledge_base(project_root)
+        chunks = iter_knowledge_base(PROJECT_ROOT, engine=engine)
 
-        if not chunks:
+        first = next(chunks, None)
+        if first is None:
             logger.error("没有找到任何文档，初始化失败")
             return False
 
-        logger.info(f"共准备了 {len(chunks)} 个文档块")
-
-        # 添加到向量数据库
-        logger.info("将文档添加到向量数据库...")
-        documents = [chunk['content'] for chunk in chunks]
-        metadatas = [chunk['metadata'] for chunk in chunks]
-        ids = [f"chunk_{i}" for i in range(len(chunks))]
-
-        vector_store.add_documents(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # 与向量数据库对比，只为新增/修改的块分批生成向量（与服务启动检查互斥）
+        with knowledge_ingestor.exclusive() as acquired:
+            if not acquired:
+                logger.error("服务进程正在检查或重建知识库，请稍后再运行")
+                return False
+            result = knowledge_ingestor.sync(
+                itertools.chain([first], chunks),
+                rebuild=rebuild,
+                batch_size=batch_size,
+                workers=workers
+            )
 
         # 验证
         count = vector_store.get_count()
         logger.info(f"知识库中现有 {count} 个文档块")
 
         logger.info("=" * 50)
-        logger.info("✅ RAG 知识库初始化完成！")
+        logger.info(
+            f"✅ RAG 知识库同步完成！新增 {result['added']}，删除 {result['deleted']}，未变化 {result['unchanged']}"
+        )
         logger.info("=" * 50)
 
-        # 测试搜索
-        logger.info("\n测试搜索功能...")
-        test_queries = [
-            "如何使用识别功能？",
-            "平台有哪些功能？",
-            "如何注册账号？"
-        ]
-
-        for query in test_queries:
-            results = vector_store.search(query, n_results=2)
-            logger.info(f"\n查询: {query}")
-            logger.info(f"找到 {len(results)} 个相关文档")
-            if results:
-                logger.info(f"最相关文档预览: {results[0]['content'][:100]}...")
+        # 有变化时测试搜索
+        if result["added"] or result["deleted"]:
+            logger.info("\n测试搜索功能...")
+            test_queries = [
+                "如何使用识别功能？",
+                "平台有哪些功能？",
+                "如何注册账号？"
+            ]
+
+            for query in test_queries:
+                results = vector_store.search(query, n_results=2)
+                logger.info(f"\n查询: {query}")
+                logger.info(f"找到 {len(results)} 个相关文档")
+                if results:
+                    logger.info(f"最相关文档预览: {results[0]['content'][:100]}...")
 
         return True
 
@@ -83,22 +98,33 @@ def init_knowledge_base():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG 知识库初始化工具")
+    parser.add_argument("--rebuild", action="store_true", help="清空现有向量数据库后全量重建")
+    parser.add_argument("-y", "--yes", action="store_true", help="全量重建时跳过确认")
+    parser.add_argument("--batch-size", type=int, default=settings.VECTOR_UPSERT_BATCH_SIZE, help="每批编码和写入的文档块数")
+    parser.add_argument("--workers", type=int, default=settings.EMBEDDING_WORKERS, help="并行编码的进程数（0 为单进程）")
+    args = parser.parse_args()
+
     print("\n" + "=" * 60)
     print("RAG 知识库初始化工具")
     print("=" * 60)
     print("\n这将：")
-    print("1. 清空现有的向量数据库")
-    print("2. 加载项目文档（README.md 等）")
-    print("3. 将文档分割成小块")
-    print("4. 生成向量嵌入并存储到数据库")
+    print("1. 加载项目文档（README.md、docs/*.md），开启 RAG_INCLUDE_KNOWLEDGE_TABLE 时还有 knowledge 表中的文章")
+    print("2. 将文档分割成小块，按来源和内容哈希生成块ID")
+    if args.rebuild:
+        print("3. 清空现有的向量数据库，为全部文档块生成向量嵌入")
+    else:
+        print("3. 只为新增或修改的文档块生成向量嵌入，删除已不存在的块")
     print("\n注意：首次运行会下载嵌入模型，可能需要几分钟时间\n")
 
-    confirm = input("确认执行？(y/n): ")
-    if confirm.lower() == 'y':
-        success = init_knowledge_base()
-        if success:
-            print("\n✅ 初始化成功！AI 助手现在可以基于项目文档回答问题了。")
-        else:
-            print("\n❌ 初始化失败，请查看日志了解详情。")
+    if args.rebuild and not args.yes:
+        confirm = input("确认清空并重建？(y/n): ")
+        if confirm.lower() != 'y':
+            print("已取消操作")
+            sys.exit(0)
+
+    success = init_knowledge_base(rebuild=args.rebuild, batch_size=args.batch_size, workers=args.workers)
+    if success:
+        print("\n✅ 同步成功！AI 助手现在可以基于项目文档回答问题了。")
     else:
-        print("已取消操作")
+        print("\n❌ 初始化失败，请查看日志了解详情。")
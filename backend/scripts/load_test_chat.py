@@ -0,0 +1,195 @@
+"""
+AI 聊天接口压测
+对运行中的服务并发发送聊天请求，统计吞吐量、端到端延迟、首字延迟（流式）和各阶段耗时
+
+各阶段耗时来自服务端的 Server-Timing 响应头和流式 done 事件：
+retrieval（检索参考文档）、cache（答案缓存查询）、prompt（构建提示词）、llm（模型生成）、persist（保存对话）。
+压测前请用本地模拟大模型启动服务，避免消耗 DashScope 额度，并按需放宽聊天接口的限流：
+
+    LLM_PROVIDER=stub RATE_LIMITS='{}' uvicorn main:app
+
+用法:
+    python scripts/load_test_chat.py [--url http://localhost:8000] [--concurrency 20] [--requests 200]
+    python scripts/load_test_chat.py --stream --persist --username test --password 123456
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import defaultdict
+import aiohttp
+
+# 压测问题（每次请求随机附加编号，避免全部命中答案缓存；--repeat 时原样发送以测试缓存命中）
+QUESTIONS = [
+    "废电池属于什么垃圾？",
+    "塑料瓶应该怎么投放？",
+    "剩饭剩菜是厨余垃圾吗？",
+    "用过的纸巾属于哪一类？",
+    "如何使用图片识别功能？",
+    "平台有哪些功能？",
+    "过期药品应该怎么处理？",
+    "外卖餐盒属于可回收物吗？",
+]
+
+
+def parse_server_timing(header: str) -> dict:
+    """解析 Server-Timing 响应头为 {阶段: 毫秒}"""
+    timings = {}
+    for item in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, _, params = item.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                timings[name.strip()] = float(value)
+    return timings
+
+
+def make_messages(index: int, repeat: bool) -> list:
+    question = QUESTIONS[index % len(QUESTIONS)]
+    if not repeat:
+        question = f"{question}（{index}）"
+    return [{"role": "user", "content": question}]
+
+
+async def login(session: aiohttp.ClientSession, url: str, username: str, password: str) -> str:
+    """登录获取 token（保存对话需要登录）"""
+    async with session.post(f"{url}/api/auth/login", json={"username": username, "password": password}) as response:
+        if response.status != 200:
+            raise SystemExit(f"登录失败: HTTP {response.status} {await response.text()}")
+        return (await response.json())["access_token"]
+
+
+async def chat_once(session: aiohttp.ClientSession, url: str, messages: list, headers: dict) -> dict:
+    """调用 /api/chat/"""
+    start = time.perf_counter()
+    async with session.post(f"{url}/api/chat/", json={"messages": messages}, headers=headers) as response:
+        body = await response.json(content_type=None)
+        ok = response.status == 200 and body.get("success", False)
+        timings = parse_server_timing(response.headers.get("Server-Timing"))
+        error = None if ok else (body.get("error") or body.get("detail") or f"HTTP {response.status}")
+    return {"ok": ok, "latency": (time.perf_counter() - start) * 1000, "ttft": None, "timings": timings, "error": error}
+
+
+async def stream_once(session: aiohttp.ClientSession, url: str, messages: list, headers: dict, persist: bool) -> dict:
+    """调用 /api/chat/stream，记录首段输出时间"""
+    start = time.perf_counter()
+    ttft = None
+    timings = {}
+    error = None
+    payload = {"messages": messages, "persist": persist}
+    async with session.post(f"{url}/api/chat/stream", json=payload, headers=headers) as response:
+        if response.status != 200:
+            error = f"HTTP {response.status}"
+        else:
+            async for line in response.content:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if event["type"] == "delta" and ttft is None:
+                    ttft = (time.perf_counter() - start) * 1000
+                elif event["type"] == "done":
+                    timings = event.get("timings", {})
+                elif event["type"] == "error":
+                    error = event["message"]
+    return {
+        "ok": error is None and bool(timings),
+        "latency": (time.perf_counter() - start) * 1000,
+        "ttft": ttft,
+        "timings": timings,
+        "error": error
+    }
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * p) - 1))]
+
+
+def report(results: list, elapsed: float):
+    """输出统计结果"""
+    ok = [result for result in results if result["ok"]]
+    errors = defaultdict(int)
+    for result in results:
+        if not result["ok"]:
+            errors[result["error"]] += 1
+
+    print(f"\n请求 {len(results)}，成功 {len(ok)}，失败 {len(results) - len(ok)}，总耗时 {elapsed:.2f}s")
+    print(f"吞吐量: {len(ok) / elapsed:.2f} 请求/秒")
+    if ok:
+        latencies = [result["latency"] for result in ok]
+        print(
+            f"端到端延迟: p50={statistics.median(latencies):.0f}ms "
+            f"p95={percentile(latencies, 0.95):.0f}ms p99={percentile(latencies, 0.99):.0f}ms"
+        )
+        ttfts = [result["ttft"] for result in ok if result["ttft"] is not None]
+        if ttfts:
+            print(f"首字延迟: p50={statistics.median(ttfts):.0f}ms p95={percentile(ttfts, 0.95):.0f}ms")
+
+        stages = defaultdict(list)
+        for result in ok:
+            for stage, duration in result["timings"].items():
+                stages[stage].append(duration)
+        if stages:
+            print("服务端各阶段平均耗时:")
+            for stage, durations in stages.items():
+                print(f"  {stage:<12} {statistics.mean(durations):8.1f}ms（{len(durations)} 次）")
+    for error, count in errors.items():
+        print(f"错误 {count} 次: {error}")
+
+
+async def run(args):
+    headers = {}
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        if args.username:
+            token = await login(session, args.url, args.username, args.password)
+            headers["Authorization"] = f"Bearer {token}"
+
+        queue = asyncio.Queue()
+        for index in random.sample(range(args.requests), args.requests):
+            queue.put_nowait(index)
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                messages = make_messages(queue.get_nowait(), args.repeat)
+                try:
+                    if args.stream:
+                        result = await stream_once(session, args.url, messages, headers, args.persist)
+                    else:
+                        result = await chat_once(session, args.url, messages, headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    result = {"ok": False, "latency": 0.0, "ttft": None, "timings": {}, "error": type(e).__name__}
+                results.append(result)
+
+        mode = "流式" if args.stream else "非流式"
+        print(f"{mode}压测 {args.url}：{args.requests} 个请求，并发 {args.concurrency}")
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        report(results, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI 聊天接口压测")
+    parser.add_argument("--url", default="http://localhost:8000", help="服务地址")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--stream", action="store_true", help="压测流式接口 /api/chat/stream")
+    parser.add_argument("--persist", action="store_true", help="流式接口保存对话（需要 --username）")
+    parser.add_argument("--repeat", action="store_true", help="原样重复问题（测试答案缓存命中）")
+    parser.add_argument("--username", help="登录用户名")
+    parser.add_argument("--password", default="", help="登录密码")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求超时秒数")
+    args = parser.parse_args()
+
+    if args.persist and not (args.stream and args.username):
+        parser.error("--persist 需要同时指定 --stream 和 --username")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+对话消息迁移脚本
+把 chat_conversations.messages 中的 JSON 消息列表拆分到 chat_messages 表（每条消息一行），
+并为对话表添加 message_count、last_message 字段。可重复执行，已迁移的对话会被跳过。
+
+用法:
+    python scripts/migrate_chat_messages.py
+"""
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, insert, select, text, update
+from app.core.database import engine
+from app.models.database import ChatConversation, ChatMessage
+
+# 对话列表中最后一条消息预览的长度（与 app/api/chat.py 一致）
+PREVIEW_LENGTH = 100
+
+
+def add_columns():
+    """为对话表添加新字段"""
+    existing_columns = {column["name"] for column in inspect(engine).get_columns("chat_conversations")}
+    new_columns = {
+        "message_count": "ALTER TABLE chat_conversations ADD COLUMN message_count INTEGER DEFAULT 0",
+        "last_message": "ALTER TABLE chat_conversations ADD COLUMN last_message VARCHAR(200)"
+    }
+    with engine.begin() as conn:
+        for col_name, sql in new_columns.items():
+            if col_name not in existing_columns:
+                print(f"添加列: {col_name}")
+                conn.execute(text(sql))
+
+
+def migrate_messages() -> int:
+    """逐个对话拆分消息，返回迁移的对话数"""
+    conversations = ChatConversation.__table__
+    with engine.connect() as conn:
+        pending = conn.execute(
+            select(conversations.c.id)
+            .where((conversations.c.message_count == 0) | (conversations.c.message_count.is_(None)))
+            .order_by(conversations.c.id)
+        ).scalars().all()
+
+    migrated = 0
+    for conversation_id in pending:
+        # 每个对话一个事务，中断后重新执行会从未迁移的对话继续
+        with engine.begin() as conn:
+            row = conn.execute(
+                select(conversations.c.messages, conversations.c.updated_at)
+                .where(conversations.c.id == conversation_id)
+            ).one()
+            messages = row.messages or []
+            if messages:
+                conn.execute(insert(ChatMessage), [
+                    {
+                        "conversation_id": conversation_id,
+                        "role": msg["role"],
+                        "content": msg["content"],
+                        "created_at": row.updated_at
+                    }
+                    for msg in messages
+                ])
+            conn.execute(
+                update(conversations)
+                .where(conversations.c.id == conversation_id)
+                .values(
+                    messages=[],
+                    message_count=len(messages),
+                    last_message=messages[-1]["content"][:PREVIEW_LENGTH] if messages else None,
+                    updated_at=row.updated_at
+                )
+            )
+        if messages:
+            migrated += 1
+    return migrated
+
+
+def migrate_chat_messages():
+    if not inspect(engine).has_table("chat_conversations"):
+        print("chat_conversations 表不存在，无需迁移（启动服务时会按新结构建表）")
+        return
+
+    add_columns()
+    ChatMessage.__table__.create(bind=engine, checkfirst=True)
+    migrated = migrate_messages()
+
+    print(f"[SUCCESS] Chat messages migration completed, {migrated} conversations migrated")
+
+
+if __name__ == "__main__":
+    migrate_chat_messages()
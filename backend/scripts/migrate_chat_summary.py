@@ -0,0 +1,42 @@
+"""
+对话表结构迁移脚本
+为 chat_conversations 添加历史摘要字段: summary, summary_message_count
+
+用法:
+    python scripts/migrate_chat_summary.py
+"""
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from app.core.database import engine
+
+
+def migrate_chat_conversations():
+    inspector = inspect(engine)
+    if not inspector.has_table("chat_conversations"):
+        print("chat_conversations 表不存在，无需迁移（启动服务时会按新结构建表）")
+        return
+
+    existing_columns = {column["name"] for column in inspector.get_columns("chat_conversations")}
+
+    # 需要添加的新列
+    new_columns = {
+        "summary": "ALTER TABLE chat_conversations ADD COLUMN summary TEXT",
+        "summary_message_count": "ALTER TABLE chat_conversations ADD COLUMN summary_message_count INTEGER DEFAULT 0"
+    }
+
+    with engine.begin() as conn:
+        for col_name, sql in new_columns.items():
+            if col_name not in existing_columns:
+                print(f"添加列: {col_name}")
+                conn.execute(text(sql))
+
+    print("[SUCCESS] Chat conversations migration completed")
+
+
+if __name__ == "__main__":
+    migrate_chat_conversations()
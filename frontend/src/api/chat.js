@@ -5,18 +5,72 @@ import request from '../utils/request'
 
 /**
  * 发送聊天消息
- * @param {Array} messages - 对话历史 [{role: 'user', content: '...'}, ...]
+ * @param {Array} messages - 对话历史 [{role: 'user', content: '...'}, ...]；已保存的对话只需传新问题
+ * @param {Number} conversationId - 已保存的对话ID（可选，后端从数据库读取历史）
  */
-export function sendMessage(messages) {
+export function sendMessage(messages, conversationId = null) {
   return request({
     url: '/chat/',
     method: 'post',
     data: {
-      messages
+      messages,
+      conversation_id: conversationId
     }
   })
 }
 
+/**
+ * 流式发送聊天消息（Server-Sent Events），回复逐段通过 onDelta 回调返回
+ * @param {Array} messages - 对话历史 [{role: 'user', content: '...'}, ...]
+ * @param {Object} options - { onDelta(text), persist, conversationId, signal }
+ * @returns {Promise<Object>} 结束事件 { type: 'done', conversation_id }
+ */
+export async function streamMessage(messages, { onDelta, persist = false, conversationId = null, signal } = {}) {
+  const headers = { 'Content-Type': 'application/json' }
+  const token = localStorage.getItem('token')
+  if (token) {
+    headers.Authorization = `Bearer ${token}`
+  }
+
+  const response = await fetch('/api/chat/stream', {
+    method: 'POST',
+    headers,
+    body: JSON.stringify({ messages, persist, conversation_id: conversationId }),
+    signal
+  })
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}))
+    throw new Error(typeof data.detail === 'string' ? data.detail : '请求失败')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // 事件之间以空行分隔
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const line = buffer.slice(0, boundary).trim()
+      buffer = buffer.slice(boundary + 2)
+      if (!line.startsWith('data:')) continue
+
+      const event = JSON.parse(line.slice(5))
+      if (event.type === 'delta') {
+        onDelta?.(event.content)
+      } else if (event.type === 'error') {
+        throw new Error(event.message)
+      } else if (event.type === 'done') {
+        return event
+      }
+    }
+  }
+  throw new Error('连接已中断')
+}
+
 /**
  * 检查AI服务健康状态
  */
@@ -30,12 +84,41 @@ export function checkHealth() {
 // ==================== 对话历史管理 API ====================
 
 /**
- * 获取所有对话历史
+ * 获取对话列表（只含标题、消息数和最后一条消息预览）
+ * @param {Object} params - {skip, limit}
  */
-export function getConversations() {
+export function getConversations(params) {
   return request({
     url: '/chat/conversations',
-    method: 'get'
+    method: 'get',
+    params
+  })
+}
+
+/**
+ * 分页获取对话消息（默认最近的一页）
+ * @param {Number} conversationId - 对话ID
+ * @param {Object} params - {before_id, limit}，before_id 为当前最早一条消息的ID时加载更早的消息
+ * @returns {Promise<Object>} { messages, has_more }
+ */
+export function getConversationMessages(conversationId, params) {
+  return request({
+    url: `/chat/conversations/${conversationId}/messages`,
+    method: 'get',
+    params
+  })
+}
+
+/**
+ * 向对话追加消息
+ * @param {Number} conversationId - 对话ID
+ * @param {Array} messages - 本轮新增的消息
+ */
+export function appendMessages(conversationId, messages) {
+  return request({
+    url: `/chat/conversations/${conversationId}/messages`,
+    method: 'post',
+    data: { messages }
   })
 }
 
@@ -63,7 +146,7 @@ export function createConversation(data) {
 }
 
 /**
- * 更新对话
+ * 更新对话（messages 会替换全部消息，仅用于清空对话；每轮对话使用 appendMessages）
  * @param {Number} conversationId - 对话ID
  * @param {Object} data - {title?: string, messages?: Array}
  */
@@ -42,7 +42,23 @@ export function deleteConversation(conversationId) {
 }
 
 /**
- * 更新对话
+ * 分页获取对话消息（默认最近的一页）
+ * @param {Number} conversationId - 对话ID
+ * @param {Object} params - { before_id, limit }，before_id 为当前最早一条消息的ID时加载更早的消息
+ */
+export function getConversationMessages(conversationId, params = {}) {
+  return request.get(`/chat/conversations/${conversationId}/messages`, params)
+}
+
+/**
+ * 向对话追加本轮消息
+ */
+export function appendMessages(conversationId, messages) {
+  return request.post(`/chat/conversations/${conversationId}/messages`, { messages })
+}
+
+/**
+ * 更新对话（messages 会替换全部消息，仅用于清空对话；每轮对话使用 appendMessages）
  */
 export function updateConversation(conversationId, data) {
   return request.request({